@@ -16,7 +16,7 @@ import functools
 import sys
 
 from newrelic.api.application import application_instance
-from newrelic.api.html_insertion import insert_html_snippet, verify_body_exists
+from newrelic.api.html_insertion import HTMLInsertionScanner
 from newrelic.api.transaction import current_transaction
 from newrelic.api.web_transaction import WebTransaction
 from newrelic.common.async_proxy import CoroutineProxy, LoopContext
@@ -53,10 +53,11 @@ class ASGIBrowserMiddleware(object):
     def __init__(self, app, transaction=None, search_maximum=64 * 1024):
         self.app = app
         self.send = None
-        self.messages = []
         self.initial_message = None
-        self.body = b""
-        self.more_body = True
+        self.start_sent = False
+        self.content_length_index = None
+        self.scanner = None
+        self.body = []
         self.transaction = transaction
         self.search_maximum = search_maximum
         self.pass_through = not (transaction and transaction.enabled)
@@ -68,25 +69,43 @@ class ASGIBrowserMiddleware(object):
         self.send = send
         return await self.app(scope, receive, self.send_inject_browser_agent)
 
-    async def send_buffered(self):
-        self.pass_through = True
+    def html_to_be_inserted(self):
+        header = self.transaction.browser_timing_header()
+
+        if not header:
+            return b""
+
+        footer = self.transaction.browser_timing_footer()
+
+        return six.b(header) + six.b(footer)
+
+    async def send_start(self):
+        self.start_sent = True
+
+        # Adjust any content length for the inserted HTML. The headers
+        # are only held back until this is known where one was given.
+        if self.content_length_index is not None and self.scanner.inserted:
+            headers = self.initial_message["headers"]
+            content_length = int(headers[self.content_length_index][1]) + self.scanner.inserted
+            headers[self.content_length_index] = (b"content-length", str(content_length).encode("utf-8"))
+
         await self.send(self.initial_message)
-        await self.send(
-            {
-                "type": "http.response.body",
-                "body": self.body,
-                "more_body": self.more_body,
-            }
-        )
-        # Clear any saved messages
-        self.messages = None
 
-    async def abort(self):
+    async def abort(self, message):
         self.pass_through = True
-        for message in self.messages:
-            await self.send(message)
-        # Clear any saved messages
-        self.messages = None
+
+        # Send on anything held back, unmodified, before the message.
+        if self.initial_message is not None:
+            body = b"".join(self.body) + self.scanner.close()
+            self.body = []
+
+            if not self.start_sent:
+                await self.send_start()
+
+            if body:
+                await self.send({"type": "http.response.body", "body": body, "more_body": True})
+
+        await self.send(message)
 
     def should_insert_html(self, headers):
         if self.transaction.autorum_disabled or self.transaction.rum_header_generated:
@@ -135,83 +154,63 @@ class ASGIBrowserMiddleware(object):
         if self.pass_through:
             return await self.send(message)
 
-        # Store messages in case of an abort
-        self.messages.append(message)
-
         message_type = message["type"]
         if message_type == "http.response.start" and not self.initial_message:
             headers = list(message.get("headers", ()))
             if not self.should_insert_html(headers):
-                await self.abort()
-                return
+                self.pass_through = True
+                return await self.send(message)
+
+            for header_index, (header_name, header_value) in enumerate(headers):
+                if header_name.lower() == b"content-length":
+                    # Invalid content length results in an abort
+                    try:
+                        int(header_value)
+                    except ValueError:
+                        self.pass_through = True
+                        return await self.send(message)
+
+                    self.content_length_index = header_index
+                    break
+
             message["headers"] = headers
             self.initial_message = message
+            self.scanner = HTMLInsertionScanner(self.html_to_be_inserted, self.search_maximum)
+
+            # Without a content length the headers don't depend on
+            # whether the HTML is inserted, so are sent straight away.
+            if self.content_length_index is None:
+                await self.send_start()
+
         elif message_type == "http.response.body" and self.initial_message:
-            body = message.get("body", b"")
-            self.more_body = message.get("more_body", False)
-
-            # Add this message to the current body
-            self.body += body
-
-            # if there's a valid body string, attempt to insert the HTML
-            if verify_body_exists(self.body):
-                header = self.transaction.browser_timing_header()
-                if not header:
-                    # If there's no header, abort browser monitoring injection
-                    await self.send_buffered()
-                    return
+            more_body = message.get("more_body", False)
 
-                footer = self.transaction.browser_timing_footer()
-                browser_agent_data = six.b(header) + six.b(footer)
+            body = self.scanner.feed(message.get("body", b""))
+            if not more_body:
+                body += self.scanner.close()
 
-                body = insert_html_snippet(self.body, lambda: browser_agent_data, self.search_maximum)
+            if self.scanner.done:
+                self.pass_through = True
 
-                # If we have inserted the browser agent
-                if len(body) != len(self.body):
-                    # check to see if we have to modify the content-length
-                    # header
-                    headers = self.initial_message["headers"]
-                    for header_index, header_data in enumerate(headers):
-                        header_name, header_value = header_data
-                        if header_name.lower() == b"content-length":
-                            break
-                    else:
-                        header_value, header_index = None, None
+            if not self.start_sent:
+                # Hold back the body until the content length is known.
+                if body:
+                    self.body.append(body)
 
-                    try:
-                        content_length = int(header_value)
-                    except ValueError:
-                        # Invalid content length results in an abort
-                        await self.send_buffered()
-                        return
-
-                    if content_length is not None:
-                        delta = len(body) - len(self.body)
-                        headers[header_index] = (
-                            b"content-length",
-                            str(content_length + delta).encode("utf-8"),
-                        )
-
-                    # Body is found and modified so we can now send the
-                    # modified data and stop searching
-                    self.body = body
-                    await self.send_buffered()
+                if not self.scanner.done:
                     return
 
-            # 1. Body is found but not modified
-            # 2. Body is not found
+                body = b"".join(self.body)
+                self.body = []
 
-            # No more body
-            if not self.more_body:
-                await self.send_buffered()
+                await self.send_start()
 
-            # We have hit our search limit
-            elif len(self.body) >= self.search_maximum:
-                await self.send_buffered()
+            if body or not more_body:
+                await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
 
         # Protocol error, unexpected message: abort
         else:
-            await self.abort()
+            await self.abort(message)
 
 
 class ASGIWebTransaction(WebTransaction):
@@ -15,7 +15,7 @@
 import functools
 import logging
 
-from newrelic.api.time_trace import TimeTrace, current_trace
+from newrelic.api.time_trace import EMPTY_ATTRIBUTES, TimeTrace, current_trace
 from newrelic.common.async_wrapper import async_wrapper
 from newrelic.common.object_wrapper import FunctionWrapper, wrap_object
 from newrelic.core.database_node import DatabaseNode
@@ -52,6 +52,19 @@ def enable_datastore_instance_feature(dbapi2_module):
 
 
 class DatabaseTrace(TimeTrace):
+    __slots__ = (
+        "sql",
+        "dbapi2_module",
+        "connect_params",
+        "cursor_params",
+        "sql_parameters",
+        "execute_params",
+        "host",
+        "port_path_or_id",
+        "database_name",
+        "stack_trace",
+        "sql_format",
+    )
 
     __async_explain_plan_logged = False
 
@@ -238,9 +251,9 @@ class DatabaseTrace(TimeTrace):
             host=self.host,
             port_path_or_id=self.port_path_or_id,
             database_name=self.database_name,
-            guid=self.guid,
+            guid=self._guid,
             agent_attributes=self.agent_attributes,
-            user_attributes=self.user_attributes,
+            user_attributes=self._user_attributes or EMPTY_ATTRIBUTES,
         )
 
 
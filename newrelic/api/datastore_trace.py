@@ -14,7 +14,7 @@
 
 import functools
 
-from newrelic.api.time_trace import TimeTrace, current_trace
+from newrelic.api.time_trace import EMPTY_ATTRIBUTES, TimeTrace, current_trace
 from newrelic.common.async_wrapper import async_wrapper
 from newrelic.common.object_wrapper import FunctionWrapper, wrap_object
 from newrelic.core.datastore_node import DatastoreNode
@@ -55,6 +55,17 @@ class DatastoreTrace(TimeTrace):
 
     """
 
+    __slots__ = (
+        "instance_reporting_enabled",
+        "database_name_enabled",
+        "product",
+        "target",
+        "operation",
+        "host",
+        "port_path_or_id",
+        "database_name",
+    )
+
     def __init__(self, product, target, operation, host=None, port_path_or_id=None, database_name=None, **kwargs):
         parent = kwargs.pop("parent", None)
         source = kwargs.pop("source", None)
@@ -119,9 +130,9 @@ class DatastoreTrace(TimeTrace):
             host=self.host,
             port_path_or_id=self.port_path_or_id,
             database_name=self.database_name,
-            guid=self.guid,
+            guid=self._guid,
             agent_attributes=self.agent_attributes,
-            user_attributes=self.user_attributes,
+            user_attributes=self._user_attributes or EMPTY_ATTRIBUTES,
         )
 
 
@@ -15,13 +15,15 @@
 import functools
 
 from newrelic.api.cat_header_mixin import CatHeaderMixin
-from newrelic.api.time_trace import TimeTrace, current_trace
+from newrelic.api.time_trace import EMPTY_ATTRIBUTES, TimeTrace, current_trace
 from newrelic.common.async_wrapper import async_wrapper
 from newrelic.common.object_wrapper import FunctionWrapper, wrap_object
 from newrelic.core.external_node import ExternalNode
 
 
 class ExternalTrace(CatHeaderMixin, TimeTrace):
+    __slots__ = ("library", "url", "method", "params", "settings")
+
     def __init__(self, library, url, method=None, **kwargs):
         parent = kwargs.pop("parent", None)
         source = kwargs.pop("source", None)
@@ -30,6 +32,8 @@ class ExternalTrace(CatHeaderMixin, TimeTrace):
 
         super(ExternalTrace, self).__init__(parent=parent, source=source)
 
+        self.settings = None
+
         self.library = library
         self.url = url
         self.method = method
@@ -60,9 +64,9 @@ class ExternalTrace(CatHeaderMixin, TimeTrace):
             duration=self.duration,
             exclusive=self.exclusive,
             params=self.params,
-            guid=self.guid,
+            guid=self._guid,
             agent_attributes=self.agent_attributes,
-            user_attributes=self.user_attributes,
+            user_attributes=self._user_attributes or EMPTY_ATTRIBUTES,
         )
 
 
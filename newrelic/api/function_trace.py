@@ -14,7 +14,7 @@
 
 import functools
 
-from newrelic.api.time_trace import TimeTrace, current_trace
+from newrelic.api.time_trace import EMPTY_ATTRIBUTES, TimeTrace, current_trace
 from newrelic.common.async_wrapper import async_wrapper
 from newrelic.common.object_names import callable_name
 from newrelic.common.object_wrapper import FunctionWrapper, wrap_object
@@ -22,6 +22,8 @@ from newrelic.core.function_node import FunctionNode
 
 
 class FunctionTrace(TimeTrace):
+    __slots__ = ("name", "group", "label", "params", "terminal", "rollup")
+
     def __init__(self, name, group=None, label=None, params=None, terminal=False, rollup=None, **kwargs):
         parent = kwargs.pop("parent", None)
         source = kwargs.pop("source", None)
@@ -83,9 +85,9 @@ class FunctionTrace(TimeTrace):
             label=self.label,
             params=self.params,
             rollup=self.rollup,
-            guid=self.guid,
-            agent_attributes=self.agent_attributes,
-            user_attributes=self.user_attributes,
+            guid=self._guid,
+            agent_attributes=self._agent_attributes or EMPTY_ATTRIBUTES,
+            user_attributes=self._user_attributes or EMPTY_ATTRIBUTES,
         )
 
 
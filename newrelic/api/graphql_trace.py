@@ -14,7 +14,7 @@
 
 import functools
 
-from newrelic.api.time_trace import TimeTrace, current_trace
+from newrelic.api.time_trace import EMPTY_ATTRIBUTES, TimeTrace, current_trace
 from newrelic.api.transaction import current_transaction
 from newrelic.common.async_wrapper import async_wrapper
 from newrelic.common.object_wrapper import FunctionWrapper, wrap_object
@@ -22,6 +22,16 @@ from newrelic.core.graphql_node import GraphQLOperationNode, GraphQLResolverNode
 
 
 class GraphQLOperationTrace(TimeTrace):
+    __slots__ = (
+        "operation_name",
+        "operation_type",
+        "deepest_path",
+        "graphql",
+        "graphql_format",
+        "statement",
+        "product",
+    )
+
     def __init__(self, **kwargs):
         parent = kwargs.pop("parent", None)
         source = kwargs.pop("source", None)
@@ -88,9 +98,9 @@ class GraphQLOperationTrace(TimeTrace):
             end_time=self.end_time,
             duration=self.duration,
             exclusive=self.exclusive,
-            guid=self.guid,
-            agent_attributes=self.agent_attributes,
-            user_attributes=self.user_attributes,
+            guid=self._guid,
+            agent_attributes=self._agent_attributes or EMPTY_ATTRIBUTES,
+            user_attributes=self._user_attributes or EMPTY_ATTRIBUTES,
             operation_name=self.operation_name,
             operation_type=self.operation_type,
             deepest_path=self.deepest_path,
@@ -139,6 +149,8 @@ def wrap_graphql_operation_trace(module, object_path):
 
 
 class GraphQLResolverTrace(TimeTrace):
+    __slots__ = ("field_name", "_product")
+
     def __init__(self, field_name=None, **kwargs):
         parent = kwargs.pop("parent", None)
         source = kwargs.pop("source", None)
@@ -186,9 +198,9 @@ class GraphQLResolverTrace(TimeTrace):
             end_time=self.end_time,
             duration=self.duration,
             exclusive=self.exclusive,
-            guid=self.guid,
-            agent_attributes=self.agent_attributes,
-            user_attributes=self.user_attributes,
+            guid=self._guid,
+            agent_attributes=self._agent_attributes or EMPTY_ATTRIBUTES,
+            user_attributes=self._user_attributes or EMPTY_ATTRIBUTES,
             product=self.product,
         )
 
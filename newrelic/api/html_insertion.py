@@ -102,3 +102,133 @@ def insert_html_snippet(data, html_to_be_inserted, search_limit=64 * 1024):
 
 def verify_body_exists(data):
     return _body_re.search(data)
+
+
+class HTMLInsertionScanner(object):
+    """Incrementally performs the same insertion as insert_html_snippet()
+    on a response which is being streamed in chunks. Each chunk passed to
+    feed() returns the data which can be sent on straight away, with only
+    the part of the response which could still precede the insertion
+    point being held back, up to when the start of the body is found or
+    the search limit is reached. Any data held back at the end of the
+    response is returned by close().
+
+    Once done is set, the insertion has been performed or abandoned and
+    all further data is passed straight through. The number of bytes
+    inserted is available as inserted.
+
+    """
+
+    def __init__(self, html_to_be_inserted, search_limit=64 * 1024):
+        self.html_to_be_inserted = html_to_be_inserted
+        self.search_limit = search_limit
+
+        self.done = False
+        self.inserted = 0
+
+        # Positions are offsets from the start of the response. Data
+        # held back starts at _offset, and everything up to _scanned has
+        # been searched for the tags which affect the insertion point.
+
+        self._data = b""
+        self._offset = 0
+        self._scanned = 0
+
+        self._xua_meta = None
+        self._charset_meta = None
+        self._head = None
+        self._attachment = False
+
+    def feed(self, data):
+        if self.done:
+            return data
+
+        if self._data:
+            data = self._data + data
+
+        # None of the tags can contain a '>' before their end, so only up
+        # to the last '>' is searched. A match can then never span what
+        # is searched now and what is searched later.
+
+        end = min(data.rfind(b">") + 1, self.search_limit - self._offset)
+        start = self._scanned - self._offset
+
+        if end > start:
+            region = data[start:end]
+
+            body = _body_re.search(region)
+            if body:
+                region = region[: body.start()]
+
+            if self._xua_meta is None:
+                match = _xua_meta_re.search(region)
+                if match:
+                    self._xua_meta = self._scanned + match.end()
+
+            if self._charset_meta is None:
+                match = _charset_meta_re.search(region)
+                if match:
+                    self._charset_meta = self._scanned + match.end()
+
+            if self._head is None:
+                match = _head_re.search(region)
+                if match:
+                    self._head = self._scanned + match.end()
+
+            if not self._attachment and _attachment_meta_re.search(region):
+                self._attachment = True
+
+            if body:
+                return self._insert(data, self._scanned + body.start())
+
+            self._scanned = self._offset + end
+
+        if self._offset + len(data) >= self.search_limit:
+            return self._finish(data)
+
+        # Data can be sent on if it can't precede where the insertion
+        # will be made. That can't be before the end of any meta tag or
+        # the head tag found so far, or else before the end of the data
+        # which has been searched.
+
+        if self._xua_meta or self._charset_meta:
+            index = max(self._xua_meta or 0, self._charset_meta or 0)
+        elif self._head:
+            index = self._head
+        else:
+            index = self._scanned
+
+        index -= self._offset
+
+        self._data = data[index:]
+        self._offset += index
+
+        return data[:index]
+
+    def close(self):
+        # Returns any data held back at the end of the response, without
+        # the insertion having been performed.
+
+        if self.done:
+            return b""
+
+        return self._finish(self._data)
+
+    def _finish(self, data):
+        self.done = True
+        self._data = b""
+
+        return data
+
+    def _insert(self, data, body):
+        text = self.html_to_be_inserted()
+
+        if not text or self._attachment:
+            return self._finish(data)
+
+        index = max(self._xua_meta or 0, self._charset_meta or 0) or self._head or body
+        index -= self._offset
+
+        self.inserted = len(text)
+
+        return self._finish(b"".join((data[:index], text, data[index:])))
@@ -14,13 +14,15 @@
 
 import functools
 
-from newrelic.api.time_trace import TimeTrace, current_trace
+from newrelic.api.time_trace import EMPTY_ATTRIBUTES, TimeTrace, current_trace
 from newrelic.common.async_wrapper import async_wrapper
 from newrelic.common.object_wrapper import FunctionWrapper, wrap_object
 from newrelic.core.memcache_node import MemcacheNode
 
 
 class MemcacheTrace(TimeTrace):
+    __slots__ = ("command",)
+
     def __init__(self, command, **kwargs):
         parent = kwargs.pop("parent", None)
         source = kwargs.pop("source", None)
@@ -45,9 +47,9 @@ class MemcacheTrace(TimeTrace):
             end_time=self.end_time,
             duration=self.duration,
             exclusive=self.exclusive,
-            guid=self.guid,
-            agent_attributes=self.agent_attributes,
-            user_attributes=self.user_attributes,
+            guid=self._guid,
+            agent_attributes=self._agent_attributes or EMPTY_ATTRIBUTES,
+            user_attributes=self._user_attributes or EMPTY_ATTRIBUTES,
         )
 
 
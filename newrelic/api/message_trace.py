@@ -15,13 +15,22 @@
 import functools
 
 from newrelic.api.cat_header_mixin import CatHeaderMixin
-from newrelic.api.time_trace import TimeTrace, current_trace
+from newrelic.api.time_trace import EMPTY_ATTRIBUTES, TimeTrace, current_trace
 from newrelic.common.async_wrapper import async_wrapper
 from newrelic.common.object_wrapper import FunctionWrapper, wrap_object
 from newrelic.core.message_node import MessageNode
 
 
 class MessageTrace(CatHeaderMixin, TimeTrace):
+    __slots__ = (
+        "terminal",
+        "library",
+        "operation",
+        "params",
+        "destination_type",
+        "destination_name",
+        "settings",
+    )
 
     cat_id_key = "NewRelicID"
     cat_transaction_key = "NewRelicTransaction"
@@ -36,6 +45,8 @@ class MessageTrace(CatHeaderMixin, TimeTrace):
 
         super(MessageTrace, self).__init__(parent=parent, source=source)
 
+        self.settings = None
+
         self.terminal = terminal
 
         self.library = library
@@ -85,9 +96,9 @@ class MessageTrace(CatHeaderMixin, TimeTrace):
             destination_name=self.destination_name,
             destination_type=self.destination_type,
             params=self.params,
-            guid=self.guid,
-            agent_attributes=self.agent_attributes,
-            user_attributes=self.user_attributes,
+            guid=self._guid,
+            agent_attributes=self._agent_attributes or EMPTY_ATTRIBUTES,
+            user_attributes=self._user_attributes or EMPTY_ATTRIBUTES,
         )
 
 
@@ -18,6 +18,8 @@ import newrelic.core.solr_node
 
 
 class SolrTrace(newrelic.api.time_trace.TimeTrace):
+    __slots__ = ("library", "command")
+
     def __init__(self, library, command, **kwargs):
         parent = kwargs.pop("parent", None)
         source = kwargs.pop("source", None)
@@ -48,9 +50,9 @@ class SolrTrace(newrelic.api.time_trace.TimeTrace):
             end_time=self.end_time,
             duration=self.duration,
             exclusive=self.exclusive,
-            guid=self.guid,
-            agent_attributes=self.agent_attributes,
-            user_attributes=self.user_attributes,
+            guid=self._guid,
+            agent_attributes=self._agent_attributes or newrelic.api.time_trace.EMPTY_ATTRIBUTES,
+            user_attributes=self._user_attributes or newrelic.api.time_trace.EMPTY_ATTRIBUTES,
         )
 
 
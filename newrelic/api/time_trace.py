@@ -32,10 +32,53 @@ from newrelic.core.trace_cache import trace_cache
 
 from newrelic.packages import six
 
+try:
+    from types import MappingProxyType
+except ImportError:
+    MappingProxyType = dict
+
 _logger = logging.getLogger(__name__)
 
+# Passed to nodes in place of the attributes of a trace which had none
+# added, so that a dictionary doesn't need to be created for each node.
+# Nodes must not update the attributes passed to them in this case.
+
+EMPTY_ATTRIBUTES = MappingProxyType({})
+
 
 class TimeTrace(object):
+    # Traces are created for every instrumented call, so the per-instance
+    # attribute dictionary is replaced by slots. __dict__ is retained so
+    # that instrumentation setting ad hoc attributes on a trace continues
+    # to work, it is only allocated when such an attribute is assigned.
+
+    __slots__ = (
+        "parent",
+        "root",
+        "child_count",
+        "children",
+        "start_time",
+        "end_time",
+        "duration",
+        "exclusive",
+        "thread_id",
+        "activated",
+        "exited",
+        "is_async",
+        "has_async_children",
+        "min_child_start_time",
+        "exc_data",
+        "should_record_segment_params",
+        "_guid",
+        "_agent_attributes",
+        "_user_attributes",
+        "_source",
+        "_greenlet",
+        "_task",
+        "__dict__",
+        "__weakref__",
+    )
+
     def __init__(self, parent=None, source=None):
         self.parent = parent
         self.root = None
@@ -53,13 +96,49 @@ class TimeTrace(object):
         self.min_child_start_time = float("inf")
         self.exc_data = (None, None, None)
         self.should_record_segment_params = False
-        # 16-digit random hex. Padded with zeros in the front.
-        self.guid = "%016x" % random.getrandbits(64)
-        self.agent_attributes = {}
-        self.user_attributes = {}
+
+        # The guid and attribute dictionaries are created on first use
+        # as most traces never have attributes added to them.
+        self._guid = None
+        self._agent_attributes = None
+        self._user_attributes = None
 
         self._source = source
 
+    @property
+    def guid(self):
+        guid = self._guid
+        if guid is None:
+            # 16-digit random hex. Padded with zeros in the front.
+            guid = self._guid = "%016x" % random.getrandbits(64)
+        return guid
+
+    @guid.setter
+    def guid(self, value):
+        self._guid = value
+
+    @property
+    def agent_attributes(self):
+        attributes = self._agent_attributes
+        if attributes is None:
+            attributes = self._agent_attributes = {}
+        return attributes
+
+    @agent_attributes.setter
+    def agent_attributes(self, value):
+        self._agent_attributes = value
+
+    @property
+    def user_attributes(self):
+        attributes = self._user_attributes
+        if attributes is None:
+            attributes = self._user_attributes = {}
+        return attributes
+
+    @user_attributes.setter
+    def user_attributes(self, value):
+        self._user_attributes = value
+
     @property
     def transaction(self):
         return self.root and self.root.transaction
@@ -200,7 +279,7 @@ class TimeTrace(object):
             _logger.debug("Cannot add custom parameter in High Security Mode.")
             return
 
-        if len(self.user_attributes) >= MAX_NUM_USER_ATTRIBUTES:
+        if self._user_attributes and len(self._user_attributes) >= MAX_NUM_USER_ATTRIBUTES:
             _logger.debug("Maximum number of custom attributes already added. Dropping attribute: %r=%r", key, value)
             return
 
@@ -349,7 +428,7 @@ class TimeTrace(object):
 
         # Record a supportability metric if error attributes are being
         # overridden.
-        if "error.class" in self.agent_attributes:
+        if self._agent_attributes and "error.class" in self._agent_attributes:
             transaction._record_supportability("Supportability/SpanEvent/Errors/Dropped")
 
         # Add error details as agent attributes to span event.
@@ -520,7 +599,7 @@ class TimeTrace(object):
 
         # Observe errors on the span only if record_exception hasn't been
         # called already
-        if exc_data[0] and "error.class" not in self.agent_attributes:
+        if exc_data[0] and not (self._agent_attributes and "error.class" in self._agent_attributes):
             self._observe_exception(exc_data)
 
         # Wipe out root reference as well
@@ -665,14 +744,10 @@ def get_trace_linking_metadata():
         return {}
 
 
-def get_service_linking_metadata(application=None, settings=None):
-    metadata = {
-        "entity.type": "SERVICE",
-    }
-
-    trace = current_trace()
-    if settings is None and trace:
-        txn = trace.transaction
+def _service_linking_settings(application=None, settings=None):
+    if settings is None:
+        trace = current_trace()
+        txn = trace and trace.transaction
         if txn:
             settings = txn.settings
 
@@ -685,22 +760,59 @@ def get_service_linking_metadata(application=None, settings=None):
         if application is not None:
             settings = application.settings
 
-    if settings:
-        metadata["entity.name"] = settings.app_name
-        entity_guid = settings.entity_guid
-        if entity_guid:
-            metadata["entity.guid"] = entity_guid
-        metadata["hostname"] = platform.uname()[1]
+    return settings
+
+
+# The service linking metadata last generated, along with the settings
+# and the values from them it was generated from. The settings are
+# replaced when an application reconnects, but may also be modified.
+
+_service_linking_metadata = (None, None, None, None)
+
+
+def _cached_service_linking_metadata(settings):
+    """Returns the service linking metadata for the settings. The same
+    dictionary is returned while the settings are unchanged, so must not
+    be modified.
+
+    """
+
+    global _service_linking_metadata
+
+    app_name = settings.app_name
+    entity_guid = settings.entity_guid
+
+    cached_settings, cached_app_name, cached_entity_guid, metadata = _service_linking_metadata
+    if cached_settings is settings and cached_app_name == app_name and cached_entity_guid == entity_guid:
+        return metadata
+
+    metadata = {
+        "entity.type": "SERVICE",
+        "entity.name": app_name,
+    }
+    if entity_guid:
+        metadata["entity.guid"] = entity_guid
+    metadata["hostname"] = platform.uname()[1]
+
+    _service_linking_metadata = (settings, app_name, entity_guid, metadata)
 
     return metadata
 
 
+def get_service_linking_metadata(application=None, settings=None):
+    settings = _service_linking_settings(application, settings)
+
+    if settings:
+        return dict(_cached_service_linking_metadata(settings))
+
+    return {"entity.type": "SERVICE"}
+
+
 def get_linking_metadata(application=None):
-    metadata = get_service_linking_metadata()
     trace = current_trace()
     if trace:
-        metadata.update(trace._get_trace_linking_metadata())
-    return metadata
+        return trace.get_linking_metadata()
+    return get_service_linking_metadata()
 
 
 def record_exception(exc=None, value=None, tb=None, params=None, ignore_errors=None, application=None):
@@ -19,7 +19,7 @@ import time
 
 from newrelic.api.application import application_instance
 from newrelic.api.function_trace import FunctionTrace, FunctionTraceWrapper
-from newrelic.api.html_insertion import insert_html_snippet, verify_body_exists
+from newrelic.api.html_insertion import HTMLInsertionScanner
 from newrelic.api.time_trace import notice_error
 from newrelic.api.transaction import current_transaction
 from newrelic.api.web_transaction import WSGIWebTransaction
@@ -157,16 +157,15 @@ class _WSGIApplicationMiddleware(object):
     # This is a WSGI middleware for automatically inserting RUM into
     # HTML responses. It only works for where a WSGI application is
     # returning response content via a iterable/generator. It does not
-    # work if the WSGI application write() callable is being used. It
-    # will buffer response content up to the start of <body>. This is
-    # technically in violation of the WSGI specification if one is
-    # strict, but will still work with all known WSGI servers. Because
-    # it does buffer, then technically it may cause a problem with
-    # streamed responses. For that to occur then it would have to be a
-    # HTML response that doesn't actually use <body> and so technically
-    # is not a valid HTML response. It is assumed though that in
-    # streaming a response, the <head> itself isn't streamed out only
-    # gradually.
+    # work if the WSGI application write() callable is being used. The
+    # response content is passed through an incremental scanner which
+    # holds back only the part of the response which could still come
+    # before the insertion point, up to the start of <body> or the
+    # search limit. Where a content length was given the headers, and so
+    # also the response content, can't be sent until it is known whether
+    # an insertion was made. This is technically in violation of the
+    # WSGI specification if one is strict, but will still work with all
+    # known WSGI servers.
 
     search_maximum = 64 * 1024
 
@@ -187,9 +186,10 @@ class _WSGIApplicationMiddleware(object):
 
         self.content_length = None
 
-        self.response_length = 0
         self.response_data = []
 
+        self.scanner = None
+
         settings = transaction.settings
 
         self.debug = settings and settings.debug.log_autorum_middleware
@@ -198,93 +198,57 @@ class _WSGIApplicationMiddleware(object):
         # application.
         self.iterable = self.application(self.request_environ, self.start_response)
 
-    def process_data(self, data):
-        # If this is the first data block, then immediately try
-        # for an insertion using full set of criteria. If this
-        # works then we are done, else we move to next phase of
-        # buffering up content until we find the body element.
+    def html_to_be_inserted(self):
+        header = self.transaction.browser_timing_header()
 
-        def html_to_be_inserted():
-            header = self.transaction.browser_timing_header()
+        if not header:
+            return b""
 
-            if not header:
-                return b""
+        footer = self.transaction.browser_timing_footer()
 
-            footer = self.transaction.browser_timing_footer()
+        return six.b(header) + six.b(footer)
+
+    def process_data(self, data):
+        # Pass the data through the scanner, returning a list of the
+        # data which can now be yielded, or None if it all needs to be
+        # held back.
 
-            return six.b(header) + six.b(footer)
+        data = self.scanner.feed(data)
 
-        if not self.response_data:
-            modified = insert_html_snippet(data, html_to_be_inserted)
+        if self.scanner.done:
+            self.pass_through = True
 
-            if modified is not None:
+            if self.scanner.inserted:
                 if self.debug:
                     _logger.debug(
-                        "RUM insertion from WSGI middleware "
-                        "triggered on first yielded string from "
-                        "response. Bytes added was %r.",
-                        len(modified) - len(data),
+                        "RUM insertion from WSGI middleware triggered. Bytes added was %r.",
+                        self.scanner.inserted,
                     )
 
                 if self.content_length is not None:
-                    length = len(modified) - len(data)
-                    self.content_length += length
-
-                return [modified]
-
-        # Buffer up the data. If we haven't found the start of
-        # the body element, that is all we do. If we have reached
-        # the limit of buffering allowed, then give up and return
-        # the buffered data.
-
-        if not self.response_data or not verify_body_exists(data):
-            self.response_length += len(data)
-            self.response_data.append(data)
+                    self.content_length += self.scanner.inserted
 
-            if self.response_length >= self.search_maximum:
-                buffered_data = self.response_data
-                self.response_data = []
-                return buffered_data
+        if self.outer_write is None:
+            # The headers can't be sent while the content length may
+            # still need to be adjusted, so the data is held back.
 
-            return
+            if self.content_length is not None and not self.scanner.done:
+                if data:
+                    self.response_data.append(data)
+                return
 
-        # Now join back together any buffered data into a single
-        # string. This makes it easier to process, but there is a
-        # risk that we could temporarily double memory use for
-        # the response content if had small data blocks followed
-        # by very large data block. Expect that the risk of this
-        # occurring is very small.
+            self.flush_headers()
 
         if self.response_data:
-            self.response_data.append(data)
-            data = b"".join(self.response_data)
+            buffered_data = self.response_data
             self.response_data = []
 
-        # Perform the insertion of the HTML. This should always
-        # succeed as we would only have got here if we had found
-        # the body element, which is the fallback point for
-        # insertion.
-
-        modified = insert_html_snippet(data, html_to_be_inserted)
-
-        if modified is not None:
-            if self.debug:
-                _logger.debug(
-                    "RUM insertion from WSGI middleware "
-                    "triggered on subsequent string yielded from "
-                    "response. Bytes added was %r.",
-                    len(modified) - len(data),
-                )
-
-            if self.content_length is not None:
-                length = len(modified) - len(data)
-                self.content_length += length
-
-            return [modified]
+            if data:
+                buffered_data.append(data)
 
-        # Something went very wrong as we should never get here.
+            return buffered_data
 
-        return [data]
+        return data and [data] or None
 
     def flush_headers(self):
         # Add back in any response content length header. It will
@@ -314,9 +278,13 @@ class _WSGIApplicationMiddleware(object):
         # is used, it is supposed to be before any attempt to
         # yield a string. When done switch to pass through mode.
 
+        if self.scanner is not None:
+            self.response_data.append(self.scanner.close())
+
         if self.response_data:
             for buffered_data in self.response_data:
-                self.outer_write(buffered_data)
+                if buffered_data:
+                    self.outer_write(buffered_data)
             self.response_data = []
 
         return self.outer_write(data)
@@ -421,6 +389,8 @@ class _WSGIApplicationMiddleware(object):
             self.content_length = content_length
             self.response_headers = headers
 
+            self.scanner = HTMLInsertionScanner(self.html_to_be_inserted, self.search_maximum)
+
         # If in pass through mode at this point, we need to flush
         # out the headers. We technically might do this again
         # later if start_response() was called more than once.
@@ -450,46 +420,32 @@ class _WSGIApplicationMiddleware(object):
 
                 continue
 
-            # If the headers haven't been flushed we need to
-            # check for the potential insertion point and
-            # buffer up data as necessary if we can't find it.
-
-            if self.outer_write is None:
-                # Ignore any empty strings.
-
-                if not data:
-                    continue
+            # Ignore any empty strings.
 
-                # Check for the insertion point. Will return
-                # None if data was buffered.
+            if not data:
+                continue
 
-                buffered_data = self.process_data(data)
+            # Check for the potential insertion point. Will return
+            # None if all the data was held back.
 
-                if buffered_data is None:
-                    continue
+            buffered_data = self.process_data(data)
 
-                # The data was returned, with it being
-                # potentially modified. It would not have
-                # been modified if we had reached maximum to
-                # be buffer. Flush out the headers, switch to
-                # pass through mode and yield the data.
+            if buffered_data is None:
+                continue
 
-                self.flush_headers()
-                self.pass_through = True
+            for data in buffered_data:
+                yield data
 
-                for data in buffered_data:
-                    yield data
+        # Ensure that any data still held back by the scanner, as the
+        # response ended before the insertion point was found, is also
+        # written.
 
-            else:
-                # Depending on how the WSGI specification is
-                # interpreted, this shouldn't occur. That is,
-                # nothing should be yielded prior to the
-                # start_response() function being called. The
-                # CGI/WSGI example in the WSGI specification
-                # does allow that though as do various WSGI
-                # servers that followed that example.
+        if not self.pass_through and self.scanner is not None:
+            self.pass_through = True
 
-                yield data
+            data = self.scanner.close()
+            if data:
+                self.response_data.append(data)
 
         # Ensure that headers have been written if the
         # response was actually empty.
@@ -498,12 +454,11 @@ class _WSGIApplicationMiddleware(object):
             self.flush_headers()
             self.pass_through = True
 
-        # Ensure that any remaining buffered data is also
-        # written. Technically this should never be able
-        # to occur at this point, but do it just in case.
-
         if self.response_data:
-            for data in self.response_data:
+            buffered_data = self.response_data
+            self.response_data = []
+
+            for data in buffered_data:
                 yield data
 
 
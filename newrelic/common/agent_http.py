@@ -16,6 +16,7 @@ from __future__ import print_function
 
 import os
 import sys
+import threading
 import time
 import zlib
 from pprint import pprint
@@ -92,6 +93,7 @@ class BaseClient(object):
         compression_method="gzip",
         max_payload_size_in_bytes=1000000,
         audit_log_fp=None,
+        max_connections=1,
     ):
         self._audit_log_fp = audit_log_fp
 
@@ -108,14 +110,35 @@ class BaseClient(object):
         pass
 
     @staticmethod
-    def _supportability_request(params, payload, body, compression_time):
+    def _join_payload(payload):
+        # Payloads may be given as an iterable of byte strings so that
+        # they can be compressed as they are produced. Clients which need
+        # the whole payload join the chunks together first.
+        if payload is None or isinstance(payload, (bytes, bytearray)):
+            return payload
+        return b"".join(payload)
+
+    @staticmethod
+    def _supportability_request(params, payload_size, body, compression_time):
         pass
 
     @classmethod
     def log_request(
-        cls, fp, method, url, params, payload, headers, body=None, compression_time=None
+        cls,
+        fp,
+        method,
+        url,
+        params,
+        payload,
+        headers,
+        body=None,
+        compression_time=None,
+        payload_size=None,
     ):
-        cls._supportability_request(params, payload, body, compression_time)
+        if payload_size is None and payload is not None:
+            payload_size = len(payload)
+
+        cls._supportability_request(params, payload_size, body, compression_time)
 
         if not fp:
             return
@@ -222,6 +245,7 @@ class HttpClient(BaseClient):
     BASE_HEADERS = urllib3.make_headers(
         keep_alive=True, accept_encoding=True, user_agent=USER_AGENT
     )
+    COMPRESSION_BATCH_SIZE = 64 * 1024
 
     def __init__(
         self,
@@ -240,6 +264,7 @@ class HttpClient(BaseClient):
         compression_method="gzip",
         max_payload_size_in_bytes=1000000,
         audit_log_fp=None,
+        max_connections=1,
     ):
         self._host = host
         port = self._port = port
@@ -254,6 +279,7 @@ class HttpClient(BaseClient):
         self._headers = dict(self.BASE_HEADERS)
         self._connection_kwargs = connection_kwargs = {
             "timeout": timeout,
+            "maxsize": max_connections,
         }
         self._urlopen_kwargs = urlopen_kwargs = {}
 
@@ -301,6 +327,7 @@ class HttpClient(BaseClient):
         self._proxy = proxy
 
         self._connection_attr = None
+        self._connection_lock = threading.Lock()
 
     @staticmethod
     def _parse_proxy(scheme, host, port, username, password):
@@ -343,17 +370,25 @@ class HttpClient(BaseClient):
         if self._connection_attr:
             return self._connection_attr
 
-        retries = urllib3.Retry(
-            total=False, connect=None, read=None, redirect=0, status=None
-        )
-        self._connection_attr = self.CONNECTION_CLS(
-            self._host,
-            self._port,
-            strict=True,
-            retries=retries,
-            **self._connection_kwargs
-        )
-        return self._connection_attr
+        # Requests may be made from multiple threads when data is being
+        # sent concurrently during a harvest, so ensure only a single
+        # connection pool is created and shared between them.
+
+        with self._connection_lock:
+            if self._connection_attr:
+                return self._connection_attr
+
+            retries = urllib3.Retry(
+                total=False, connect=None, read=None, redirect=0, status=None
+            )
+            self._connection_attr = self.CONNECTION_CLS(
+                self._host,
+                self._port,
+                strict=True,
+                retries=retries,
+                **self._connection_kwargs
+            )
+            return self._connection_attr
 
     def close_connection(self):
         if self._connection_attr:
@@ -370,12 +405,21 @@ class HttpClient(BaseClient):
         headers,
         body=None,
         compression_time=None,
+        payload_size=None,
     ):
         if not self._prefix:
             url = self.CONNECTION_CLS.scheme + "://" + self._host + url
 
         return super(HttpClient, self).log_request(
-            fp, method, url, params, payload, headers, body, compression_time
+            fp,
+            method,
+            url,
+            params,
+            payload,
+            headers,
+            body,
+            compression_time,
+            payload_size,
         )
 
     @staticmethod
@@ -392,6 +436,59 @@ class HttpClient(BaseClient):
 
         return data, compression_time
 
+    def _encode_chunks(self, chunks):
+        # Chunks are collected until the payload is known to exceed the
+        # compression threshold. From then on they are fed through the
+        # compressor in batches, so the whole uncompressed payload is only
+        # held in memory when it is needed for the audit log. Returns the
+        # payload (or None), its uncompressed size, the body to send and
+        # the compression time (None if the body was not compressed).
+
+        chunks = iter(chunks)
+        batch = []
+        size = 0
+
+        for chunk in chunks:
+            batch.append(chunk)
+            size += len(chunk)
+            if size > self._compression_threshold:
+                break
+        else:
+            payload = b"".join(batch)
+            return payload, size, payload, None
+
+        level = self._compression_level or zlib.Z_DEFAULT_COMPRESSION
+        wbits = 31 if self._compression_method == "gzip" else 15
+        compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+        payload = bytearray() if self._audit_log_fp else None
+        body = []
+        compression_time = 0.0
+
+        while batch:
+            data = b"".join(batch)
+            if payload is not None:
+                payload += data
+
+            compression_start = time.time()
+            body.append(compressor.compress(data))
+            compression_time += max(time.time(), compression_start) - compression_start
+
+            batch = []
+            batch_size = 0
+            for chunk in chunks:
+                batch.append(chunk)
+                size += len(chunk)
+                batch_size += len(chunk)
+                if batch_size >= self.COMPRESSION_BATCH_SIZE:
+                    break
+
+        compression_start = time.time()
+        body.append(compressor.flush())
+        compression_time += max(time.time(), compression_start) - compression_start
+
+        return payload, size, b"".join(body), compression_time
+
     def send_request(
         self,
         method="POST",
@@ -412,7 +509,19 @@ class HttpClient(BaseClient):
         path = self._prefix + path
         body = payload
         compression_time = None
-        if payload is not None:
+        payload_size = None
+        if payload is not None and not isinstance(payload, (bytes, bytearray)):
+            payload, payload_size, body, compression_time = self._encode_chunks(
+                payload
+            )
+            if compression_time is not None:
+                content_encoding = self._compression_method
+            else:
+                content_encoding = "Identity"
+
+            merged_headers["Content-Encoding"] = content_encoding
+
+        elif payload is not None:
             if len(payload) > self._compression_threshold:
                 body, compression_time = self._compress(
                     payload,
@@ -434,6 +543,7 @@ class HttpClient(BaseClient):
             merged_headers,
             body,
             compression_time,
+            payload_size,
         )
 
         if body and len(body) > self._max_payload_size_in_bytes:
@@ -489,6 +599,7 @@ class InsecureHttpClient(HttpClient):
         compression_method="gzip",
         max_payload_size_in_bytes=1000000,
         audit_log_fp=None,
+        max_connections=1,
     ):
         proxy = self._parse_proxy(proxy_scheme, proxy_host, None, None, None)
         if proxy and proxy.scheme == "https":
@@ -515,21 +626,22 @@ class InsecureHttpClient(HttpClient):
             compression_method,
             max_payload_size_in_bytes,
             audit_log_fp,
+            max_connections,
         )
 
 
 class SupportabilityMixin(object):
     @staticmethod
-    def _supportability_request(params, payload, body, compression_time):
+    def _supportability_request(params, payload_size, body, compression_time):
         # *********
         # Used only for supportability metrics. Do not use to drive business
         # logic!
-        # payload: uncompressed
+        # payload_size: uncompressed length
         # body: compressed
         agent_method = params and params.get("method")
         # *********
 
-        if agent_method and payload:
+        if agent_method and payload_size:
             # Compression was applied
             if compression_time is not None:
                 internal_metric(
@@ -545,11 +657,11 @@ class SupportabilityMixin(object):
                 )
             internal_metric(
                 "Supportability/Python/Collector/%s/Output/Bytes" % agent_method,
-                len(payload),
+                payload_size,
             )
             # Top level metric to aggregate overall bytes being sent
             internal_metric(
-                "Supportability/Python/Collector/Output/Bytes", len(payload)
+                "Supportability/Python/Collector/Output/Bytes", payload_size
             )
 
     @staticmethod
@@ -629,6 +741,7 @@ class DeveloperModeClient(SupportabilityMixin, BaseClient):
         headers=None,
         payload=None,
     ):
+        payload = self._join_payload(payload)
         request_id = self.log_request(
             self._audit_log_fp,
             "POST",
@@ -666,6 +779,7 @@ class ServerlessModeClient(DeveloperModeClient):
         headers=None,
         payload=None,
     ):
+        payload = self._join_payload(payload)
         result = super(ServerlessModeClient, self).send_request(
             method=method, path=path, params=params, headers=headers, payload=payload
         )
@@ -49,6 +49,10 @@ BASE64_DECODE_STR = getattr(base64, 'decodestring', None)
 # defaults.
 
 def json_encode(obj, **kwargs):
+    return json.dumps(obj, **_json_encode_kwargs(kwargs))
+
+
+def _json_encode_kwargs(kwargs):
     _kwargs = {}
 
     # This wrapper function needs to deal with a few issues.
@@ -102,7 +106,132 @@ def json_encode(obj, **kwargs):
 
     _kwargs.update(kwargs)
 
-    return json.dumps(obj, **_kwargs)
+    return _kwargs
+
+
+def json_encode_chunks(obj, batch_size=256, expand=None, **kwargs):
+    """Generator yielding the same JSON encoding as json_encode() but in
+    chunks, so a large payload never has to be held as a single string.
+
+    Sequences are expanded element by element, with runs of up to
+    batch_size elements being encoded together in a single call so the
+    bulk of the work is still done by the native JSON encoder. Nested
+    sequences longer than batch_size are themselves expanded, which
+    covers payloads such as a list of many events within a tuple. The
+    optional expand predicate can force expansion of further nested
+    sequences, such as the nodes of a deep transaction trace tree.
+
+    """
+
+    if not _is_json_sequence(obj):
+        yield json_encode(obj, **kwargs)
+        return
+
+    # A single encoder is reused for all the chunks as constructing one
+    # on each call dominates the cost of encoding small batches.
+
+    encode = json.JSONEncoder(**_json_encode_kwargs(kwargs)).encode
+
+    # Nested sequences are walked with an explicit stack rather than by
+    # recursion so that the cost of passing a chunk up doesn't grow with
+    # the depth of the tree. Each entry holds the iterator over a
+    # sequence and the separator to emit before its next element.
+
+    stack = [[iter(obj), ""]]
+    batch = []
+
+    yield "["
+
+    while stack:
+        frame = stack[-1]
+        nested = None
+
+        for item in frame[0]:
+            if isinstance(item, (list, tuple)) and (len(item) > batch_size or (expand is not None and expand(item))):
+                nested = item
+                break
+
+            batch.append(item)
+
+            if len(batch) >= batch_size:
+                yield frame[1] + encode(batch)[1:-1]
+                frame[1] = ","
+                batch = []
+
+        if batch:
+            yield frame[1] + encode(batch)[1:-1]
+            frame[1] = ","
+            batch = []
+
+        if nested is not None:
+            yield frame[1] + "["
+            frame[1] = ","
+            stack.append([iter(nested), ""])
+
+        else:
+            yield "]"
+            stack.pop()
+
+
+def json_encode_compressed(obj, level=zlib.Z_DEFAULT_COMPRESSION, expand=None, chunk_size=65536, **kwargs):
+    """Returns the JSON encoding of obj compressed with zlib and then
+    base64 encoded, as is required for transaction trace and slow SQL
+    data. The result is identical to chaining json_encode(),
+    zlib.compress() and base64.standard_b64encode(), but the JSON text
+    is produced with json_encode_chunks() and fed through the compressor
+    and base64 encoder incrementally. Only the final base64 output is
+    ever held in full, which avoids the several whole payload copies the
+    chained calls would make.
+
+    """
+
+    compressor = zlib.compressobj(level)
+
+    # Compressed output is base64 encoded in whole groups of three bytes
+    # as it is produced, with any remainder carried into the next round.
+
+    result = bytearray()
+    pending = bytearray()
+
+    def _encode(data):
+        pending.extend(data)
+        length = len(pending) - len(pending) % 3
+        if length:
+            result.extend(base64.standard_b64encode(bytes(pending[:length])))
+            del pending[:length]
+
+    chunks = []
+    size = 0
+
+    for chunk in json_encode_chunks(obj, expand=expand, **kwargs):
+        chunks.append(chunk)
+        size += len(chunk)
+
+        if size >= chunk_size:
+            _encode(compressor.compress(six.b(''.join(chunks))))
+            chunks = []
+            size = 0
+
+    if chunks:
+        _encode(compressor.compress(six.b(''.join(chunks))))
+
+    pending.extend(compressor.flush())
+    result.extend(base64.standard_b64encode(bytes(pending)))
+
+    return result.decode('Latin-1') if six.PY3 else bytes(result)
+
+
+def _is_json_sequence(obj):
+    # Mirrors the handling in json_encode() where anything iterable which
+    # isn't natively understood by the JSON encoder is encoded as a list.
+
+    if isinstance(obj, (list, tuple, types.GeneratorType)):
+        return True
+
+    if isinstance(obj, (six.string_types, bytes, dict)):
+        return False
+
+    return hasattr(obj, '__iter__')
 
 
 def json_decode(s, **kwargs):
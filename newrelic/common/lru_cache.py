@@ -0,0 +1,119 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""This module implements a bounded cache with least recently used
+eviction, for memoizing the results of computations over values which
+can be unbounded in number, such as attribute names or SQL statements.
+
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+
+    """A bounded mapping which evicts the least recently used entry once
+    the maximum size is reached. Counts of hits, misses and evictions are
+    kept so they can be reported as supportability metrics.
+
+    The cache may be shared between threads. Reordering an OrderedDict
+    while it is being updated from another thread is not safe where it is
+    implemented in pure Python, so all access is guarded by a lock. The
+    lock is not held while the value being cached is computed.
+
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getstate__(self):
+        # The cache is copied along with the settings holding it, which
+        # requires that the lock be left out of the copy.
+
+        with self._lock:
+            state = self.__dict__.copy()
+            state["_data"] = OrderedDict(self._data)
+
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self._move_to_end(key)
+
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = value
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self, reset=True):
+        """Returns the counts of hits, misses and evictions, by default
+        resetting them back to zero so the next call returns the counts
+        since this one. Caches shared by several consumers should pass
+        reset=False and have each track the change in the running totals.
+
+        """
+
+        with self._lock:
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+            if reset:
+                self.hits, self.misses, self.evictions = 0, 0, 0
+
+        return hits, misses, evictions
+
+    if hasattr(OrderedDict, "move_to_end"):
+
+        def _move_to_end(self, key):
+            self._data.move_to_end(key)
+
+    else:
+
+        def _move_to_end(self, key):
+            self._data[key] = self._data.pop(key)
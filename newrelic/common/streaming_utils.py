@@ -15,6 +15,10 @@
 import collections
 import logging
 import threading
+import time
+
+from newrelic.common.lru_cache import LRUCache
+from newrelic.packages import six
 
 try:
     from newrelic.core.infinite_tracing_pb2 import AttributeValue, SpanBatch
@@ -26,15 +30,17 @@ _logger = logging.getLogger(__name__)
 
 
 class StreamBuffer(object):
-    def __init__(self, maxlen, batching=False):
+    def __init__(self, maxlen, batching=False, batch_timeout=0.0):
         self._queue = collections.deque(maxlen=maxlen)
         self._notify = self.condition()
         self._shutdown = False
         self._seen = 0
         self._dropped = 0
+        self._waiting = 0
         self._settings = None
 
         self.batching = batching
+        self.batch_timeout = batch_timeout
 
     @staticmethod
     def condition(*args, **kwargs):
@@ -46,22 +52,47 @@ class StreamBuffer(object):
             self._notify.notify_all()
 
     def put(self, item):
+        self.put_many((item,))
+
+    def put_many(self, items):
+        """Adds a group of items, such as all the spans of a transaction,
+        to the buffer. The items are gathered before the lock is taken
+        so that it is only acquired once for the whole group.
+
+        """
+
+        items = list(items)
+
+        if not items:
+            return
+
         with self._notify:
             if self._shutdown:
                 return
 
-            self._seen += 1
+            self._seen += len(items)
 
-            # NOTE: dropped can be over-counted as the queue approaches
-            # capacity while data is still being transmitted.
-            #
-            # This is because the length of the queue can be changing as it's
-            # being measured.
-            if len(self._queue) >= self._queue.maxlen:
-                self._dropped += 1
+            # Items are only ever removed from the queue while holding
+            # the lock, so the number of items pushed out of a full
+            # queue by adding these is exact.
+            if self._queue.maxlen is not None:
+                overflow = len(self._queue) + len(items) - self._queue.maxlen
+                if overflow > 0:
+                    self._dropped += overflow
 
-            self._queue.append(item)
-            self._notify.notify_all()
+            self._queue.extend(items)
+
+            # Only wake the iterators if any are waiting for data.
+            if self._waiting:
+                self._notify.notify_all()
+
+    def wait(self, timeout=None):
+        # Must be called with the lock held.
+        self._waiting += 1
+        try:
+            return self._notify.wait(timeout)
+        finally:
+            self._waiting -= 1
 
     def stats(self):
         with self._notify:
@@ -81,12 +112,22 @@ class StreamBuffer(object):
 
 
 class StreamBufferIterator(object):
+    # Batches start at the maximum size and are halved, down to the
+    # minimum, whenever sending the previous batch took longer than
+    # MAX_BATCH_SEND_TIME. This keeps the age of spans well below the 10
+    # second limit after which the trace observer rejects them. The size
+    # is increased again step by step while batches are sent quickly.
     MAX_BATCH_SIZE = 100
+    MIN_BATCH_SIZE = 10
+    MAX_BATCH_SEND_TIME = 1.0
 
     def __init__(self, stream_buffer):
         self.stream_buffer = stream_buffer
         self._notify = self.stream_buffer._notify
         self.batching = self.stream_buffer.batching
+        self.batch_size = self.MAX_BATCH_SIZE
+        self.sent = 0
+        self._batch_time = None
         self._shutdown = False
         self._stream = None
 
@@ -98,7 +139,28 @@ class StreamBufferIterator(object):
     def stream_closed(self):
         return self._shutdown or self.stream_buffer._shutdown or (self._stream and self._stream.done())
 
+    def _adjust_batch_size(self):
+        # The next batch is only requested once the previous one has been
+        # serialized and written to the stream, so the time in between is
+        # how long it took to send.
+        if self._batch_time is None:
+            return
+
+        elapsed = time.time() - self._batch_time
+        self._batch_time = None
+
+        if elapsed > self.MAX_BATCH_SEND_TIME:
+            self.batch_size = max(self.batch_size // 2, self.MIN_BATCH_SIZE)
+        elif self.batch_size < self.MAX_BATCH_SIZE:
+            self.batch_size = min(self.batch_size + self.MIN_BATCH_SIZE, self.MAX_BATCH_SIZE)
+
     def __next__(self):
+        if self.batching:
+            self._adjust_batch_size()
+
+        queue = self.stream_buffer._queue
+        deadline = None
+
         with self._notify:
             while True:
                 # When a gRPC stream receives a server side disconnect (usually in the form of an OK code)
@@ -113,31 +175,49 @@ class StreamBufferIterator(object):
                         self.shutdown()
                     raise StopIteration
 
+                timeout = None
+
                 if self.batching:
-                    stream_buffer_len = len(self.stream_buffer)
-                    if stream_buffer_len > self.MAX_BATCH_SIZE:
-                        # Ensure batch size is never more than 100 to prevent issues with serializing large numbers
-                        # of spans causing their age to exceed 10 seconds. That would cause them to be rejected
-                        # by the trace observer.
-                        batch = [self.stream_buffer._queue.popleft() for _ in range(self.MAX_BATCH_SIZE)]
-                        return SpanBatch(spans=batch)
+                    stream_buffer_len = len(queue)
+                    if stream_buffer_len > self.batch_size:
+                        batch = [queue.popleft() for _ in range(self.batch_size)]
+                        break
                     elif stream_buffer_len:
-                        # For small span batches empty stream buffer into list and clear queue.
-                        # This is only safe to do under lock which prevents items being added to the queue.
-                        batch = list(self.stream_buffer._queue)
-                        self.stream_buffer._queue.clear()
-                        return SpanBatch(spans=batch)
+                        # A partial batch is held back for up to the batch
+                        # timeout, measured from when the iterator first saw
+                        # it, to give it a chance to fill up.
+                        if stream_buffer_len < self.batch_size and self.stream_buffer.batch_timeout > 0:
+                            now = time.time()
+                            if deadline is None:
+                                deadline = now + self.stream_buffer.batch_timeout
+                            timeout = deadline - now
+
+                        if timeout is None or timeout <= 0:
+                            # For small span batches empty stream buffer into list and clear queue.
+                            # This is only safe to do under lock which prevents items being added to the queue.
+                            batch = list(queue)
+                            queue.clear()
+                            break
 
                 else:
                     # Send items from stream buffer one at a time.
                     try:
-                        return self.stream_buffer._queue.popleft()
+                        item = queue.popleft()
                     except IndexError:
                         pass
+                    else:
+                        self.sent += 1
+                        return item
 
                 # Wait until items are added to the stream buffer.
-                if not self.stream_closed() and not self.stream_buffer:
-                    self._notify.wait()
+                if not self.stream_closed() and (timeout is not None or not queue):
+                    self.stream_buffer.wait(timeout)
+
+        # The batch is built outside of the lock so as not to hold up
+        # threads adding spans to the buffer.
+        self.sent += len(batch)
+        self._batch_time = time.time()
+        return SpanBatch(spans=batch)
 
     next = __next__
 
@@ -180,3 +260,34 @@ class SpanProtoAttrs(dict):
             return AttributeValue(int_value=value)
         else:
             return AttributeValue(string_value=str(value))
+
+
+# Intrinsics which take string values repeated across many spans, such as
+# span names and categories. The AttributeValue for each distinct string is
+# created once and then reused, as the Span constructor copies it in.
+CACHED_SPAN_INTRINSICS = frozenset(("type", "name", "category", "component", "span.kind", "transaction.name"))
+
+_attribute_values = LRUCache(maxsize=1000)
+
+
+def span_proto_attrs(attrs, cached=()):
+    """Converts a dict of span event attributes into a dict of
+    AttributeValue objects, reusing those for any string values of the
+    attributes named in cached.
+
+    """
+
+    get_attribute_value = SpanProtoAttrs.get_attribute_value
+    result = {}
+
+    for key, value in six.iteritems(attrs):
+        if key in cached and isinstance(value, six.string_types):
+            attribute_value = _attribute_values.get(value)
+            if attribute_value is None:
+                attribute_value = get_attribute_value(value)
+                _attribute_values.put(value, attribute_value)
+            result[key] = attribute_value
+        else:
+            result[key] = get_attribute_value(value)
+
+    return result
@@ -337,6 +337,7 @@ def _process_configuration(section):
     _process_setting(section, "include_environ", "get", _map_split_strings)
     _process_setting(section, "max_stack_trace_lines", "getint", None)
     _process_setting(section, "startup_timeout", "getfloat", None)
+    _process_setting(section, "trace_cache_mode", "get", None)
     _process_setting(section, "shutdown_timeout", "getfloat", None)
     _process_setting(section, "compressed_content_encoding", "get", _map_compressed_content_encoding)
     _process_setting(section, "attributes.enabled", "getboolean", None)
@@ -357,6 +358,8 @@ def _process_configuration(section):
     _process_setting(section, "transaction_tracer.stack_trace_threshold", "getfloat", None)
     _process_setting(section, "transaction_tracer.explain_enabled", "getboolean", None)
     _process_setting(section, "transaction_tracer.explain_threshold", "getfloat", None)
+    _process_setting(section, "transaction_tracer.explain_plan_cache_ttl", "getfloat", None)
+    _process_setting(section, "transaction_tracer.explain_plan_async", "getboolean", None)
     _process_setting(section, "transaction_tracer.function_trace", "get", _map_split_strings)
     _process_setting(section, "transaction_tracer.generator_trace", "get", _map_split_strings)
     _process_setting(section, "transaction_tracer.top_n", "getint", None)
@@ -459,8 +462,10 @@ def _process_configuration(section):
     _process_setting(section, "agent_limits.sql_query_length_maximum", "getint", None)
     _process_setting(section, "agent_limits.slow_sql_stack_trace", "getint", None)
     _process_setting(section, "agent_limits.max_sql_connections", "getint", None)
+    _process_setting(section, "agent_limits.sql_connection_idle_timeout", "getfloat", None)
     _process_setting(section, "agent_limits.sql_explain_plans", "getint", None)
     _process_setting(section, "agent_limits.sql_explain_plans_per_harvest", "getint", None)
+    _process_setting(section, "agent_limits.sql_explain_plan_cache_size", "getint", None)
     _process_setting(section, "agent_limits.slow_sql_data", "getint", None)
     _process_setting(section, "agent_limits.merge_stats_maximum", "getint", None)
     _process_setting(section, "agent_limits.errors_per_transaction", "getint", None)
@@ -471,6 +476,10 @@ def _process_configuration(section):
     _process_setting(section, "agent_limits.synthetics_transactions", "getint", None)
     _process_setting(section, "agent_limits.data_compression_threshold", "getint", None)
     _process_setting(section, "agent_limits.data_compression_level", "getint", None)
+    _process_setting(section, "agent_limits.stats_engine_shards", "getint", None)
+    _process_setting(section, "agent_limits.attribute_filter_cache_size", "getint", None)
+    _process_setting(section, "agent_limits.sql_statement_cache_size", "getint", None)
+    _process_setting(section, "agent_limits.harvest_threads", "getint", None)
     _process_setting(section, "console.listener_socket", "get", _map_console_listener_socket)
     _process_setting(section, "console.allow_interpreter_cmd", "getboolean", None)
     _process_setting(section, "debug.disable_api_supportability_metrics", "getboolean", None)
@@ -489,6 +498,7 @@ def _process_configuration(section):
     _process_setting(section, "debug.enable_coroutine_profiling", "getboolean", None)
     _process_setting(section, "debug.record_transaction_failure", "getboolean", None)
     _process_setting(section, "debug.explain_plan_obfuscation", "get", None)
+    _process_setting(section, "debug.sql_lexer", "get", None)
     _process_setting(section, "debug.disable_certificate_validation", "getboolean", None)
     _process_setting(section, "debug.disable_harvest_until_shutdown", "getboolean", None)
     _process_setting(section, "debug.connect_span_stream_in_developer_mode", "getboolean", None)
@@ -519,6 +529,10 @@ def _process_configuration(section):
     _process_setting(section, "apdex_t", "getfloat", None)
     _process_setting(section, "event_loop_visibility.enabled", "getboolean", None)
     _process_setting(section, "event_loop_visibility.blocking_threshold", "getfloat", None)
+    _process_setting(section, "harvest_spool.enabled", "getboolean", None)
+    _process_setting(section, "harvest_spool.directory", "get", None)
+    _process_setting(section, "harvest_spool.max_size", "getint", None)
+    _process_setting(section, "harvest_spool.max_age", "getint", None)
     _process_setting(
         section,
         "event_harvest_config.harvest_limits.analytic_event_data",
@@ -534,11 +548,14 @@ def _process_configuration(section):
     _process_setting(section, "infinite_tracing.compression", "getboolean", None)
     _process_setting(section, "infinite_tracing.batching", "getboolean", None)
     _process_setting(section, "infinite_tracing.span_queue_size", "getint", None)
+    _process_setting(section, "infinite_tracing.batch_timeout", "getfloat", None)
+    _process_setting(section, "infinite_tracing.streams", "getint", None)
     _process_setting(section, "code_level_metrics.enabled", "getboolean", None)
 
     _process_setting(section, "application_logging.enabled", "getboolean", None)
     _process_setting(section, "application_logging.forwarding.max_samples_stored", "getint", None)
     _process_setting(section, "application_logging.forwarding.enabled", "getboolean", None)
+    _process_setting(section, "application_logging.forwarding.log_level", "get", _map_log_level)
     _process_setting(section, "application_logging.metrics.enabled", "getboolean", None)
     _process_setting(section, "application_logging.local_decorating.enabled", "getboolean", None)
 
@@ -1992,6 +2009,18 @@ ASYNCIO_HOOK = ("asyncio", "newrelic.core.trace_cache", "asyncio_loaded")
 GREENLET_HOOK = ("greenlet", "newrelic.core.trace_cache", "greenlet_loaded")
 
 
+def _process_trace_cache_mode():
+    mode = _settings.trace_cache_mode
+
+    if mode == "contextvars":
+        if not trace_cache.use_context_var_trace_cache():
+            _logger.warning(
+                "The contextvars trace cache mode requires Python 3.7 or later. Falling back to the thread trace cache mode."
+            )
+    elif mode != "thread":
+        _logger.warning("Ignoring unknown trace cache mode %r. Valid modes are 'thread' and 'contextvars'.", mode)
+
+
 def _process_trace_cache_import_hooks():
     _process_module_definition(*GREENLET_HOOK)
 
@@ -3116,6 +3145,7 @@ def _setup_instrumentation():
 
     _process_module_configuration()
     _process_module_entry_points()
+    _process_trace_cache_mode()
     _process_trace_cache_import_hooks()
     _process_module_builtin_defaults()
 
@@ -28,12 +28,15 @@ import threading
 import time
 import traceback
 import warnings
+from functools import partial
 
 import newrelic
 import newrelic.core.application
 import newrelic.core.config
 import newrelic.packages.six as six
 from newrelic.common.log_file import initialize_logging
+from newrelic.core.database_utils import shutdown_explain_plan_worker
+from newrelic.core.harvest_pool import HarvestPool
 from newrelic.core.thread_utilization import thread_utilization_data_source
 from newrelic.samplers.cpu_usage import cpu_usage_data_source
 from newrelic.samplers.gc_data import garbage_collector_data_source
@@ -219,6 +222,13 @@ class Agent(object):
         self._flexible_harvest_duration = 0.0
         self._scheduler = sched.scheduler(self._harvest_timer, self._harvest_shutdown.wait)
 
+        # When enabled, the harvest pool is used to harvest multiple
+        # applications, and the independent data sets of each, in
+        # parallel so a slow response for one doesn't delay the others.
+
+        harvest_threads = config.agent_limits.harvest_threads
+        self._harvest_pool = harvest_threads > 0 and HarvestPool(harvest_threads) or None
+
         self._process_shutdown = False
 
         self._lock = threading.Lock()
@@ -587,11 +597,7 @@ class Agent(object):
         self._flexible_harvest_count += 1
         self._last_flexible_harvest = time.time()
 
-        for application in list(six.itervalues(self._applications)):
-            try:
-                application.harvest(shutdown=False, flexible=True)
-            except Exception:
-                _logger.exception("Failed to harvest data for %s." % application.name)
+        self._harvest_applications(shutdown=False, flexible=True)
 
         self._flexible_harvest_duration = time.time() - self._last_flexible_harvest
 
@@ -611,16 +617,32 @@ class Agent(object):
         self._default_harvest_count += 1
         self._last_default_harvest = time.time()
 
-        for application in list(six.itervalues(self._applications)):
-            try:
-                application.harvest(shutdown, flexible=False)
-            except Exception:
-                _logger.exception("Failed to harvest data for %s." % application.name)
+        self._harvest_applications(shutdown, flexible=False)
 
         self._default_harvest_duration = time.time() - self._last_default_harvest
 
         _logger.debug("Completed harvest[default] of application data in %.2f seconds.", self._default_harvest_duration)
 
+    def _harvest_application(self, application, shutdown, flexible):
+        try:
+            if self._harvest_pool is None:
+                application.harvest(shutdown, flexible=flexible)
+            else:
+                application.harvest(shutdown, flexible=flexible, pool=self._harvest_pool)
+        except Exception:
+            _logger.exception("Failed to harvest data for %s." % application.name)
+
+    def _harvest_applications(self, shutdown, flexible):
+        applications = list(six.itervalues(self._applications))
+
+        if self._harvest_pool is None:
+            for application in applications:
+                self._harvest_application(application, shutdown, flexible)
+        else:
+            self._harvest_pool.run(
+                [partial(self._harvest_application, application, shutdown, flexible) for application in applications]
+            )
+
     def _harvest_timer(self):
         if self._harvest_shutdown_is_set():
             return float("inf")
@@ -637,6 +659,12 @@ class Agent(object):
 
         try:
             self._scheduler.run()
+
+            if self._harvest_pool is not None:
+                self._harvest_pool.shutdown()
+
+            shutdown_explain_plan_worker()
+
         except Exception:
             # An unexpected error, possibly some sort of internal agent
             # implementation issue or more likely due to modules being
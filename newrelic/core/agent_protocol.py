@@ -21,6 +21,7 @@ from newrelic.common.agent_http import ApplicationModeClient, ServerlessModeClie
 from newrelic.common.encoding_utils import (
     json_decode,
     json_encode,
+    json_encode_chunks,
     serverless_payload_encode,
 )
 from newrelic.common.utilization import (
@@ -175,6 +176,7 @@ class AgentProtocol(object):
             compression_method=settings.compressed_content_encoding,
             max_payload_size_in_bytes=settings.max_payload_size_in_bytes,
             audit_log_fp=audit_log_fp,
+            max_connections=settings.agent_limits.harvest_threads + 1,
         )
 
         self._params = {
@@ -258,7 +260,14 @@ class AgentProtocol(object):
         params["method"] = method
         if self._run_token:
             params["run_id"] = self._run_token
-        return params, self._headers, json_encode(payload).encode("utf-8")
+
+        # The payload is passed to the client as UTF-8 encoded chunks so
+        # that a large payload can be compressed as it is encoded, rather
+        # than first being held in memory in full.
+
+        data = (chunk.encode("utf-8") for chunk in json_encode_chunks(payload))
+
+        return params, self._headers, data
 
     @staticmethod
     def _connect_payload(app_name, linked_applications, environment, settings):
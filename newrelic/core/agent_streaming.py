@@ -30,7 +30,9 @@ class StreamingRpc(object):
 
     This class keeps a stream_stream RPC alive, retrying after a timeout when
     errors are encountered. If grpc.StatusCode.UNIMPLEMENTED is encountered, a
-    retry will not occur.
+    retry will not occur. Several instances may share the one stream buffer,
+    each taking spans from it over its own channel, with the stream_id
+    telling them apart in metrics.
     """
 
     RETRY_POLICY = (
@@ -43,19 +45,22 @@ class StreamingRpc(object):
     )
     OPTIONS = [("grpc.enable_retries", 0)]
 
-    def __init__(self, endpoint, stream_buffer, metadata, record_metric, ssl=True, compression=None):
+    def __init__(self, endpoint, stream_buffer, metadata, record_metric, ssl=True, compression=None, stream_id=0):
         self._endpoint = endpoint
         self._ssl = ssl
         self.metadata = metadata
+        self.stream_id = stream_id
         self.stream_buffer = stream_buffer
         self.request_iterator = iter(stream_buffer)
         self.response_processing_thread = threading.Thread(
-            target=self.process_responses, name="NR-StreamingRpc-process-responses"
+            target=self.process_responses, name="NR-StreamingRpc-process-responses-%d" % stream_id
         )
         self.response_processing_thread.daemon = True
         self.notify = self.condition()
         self.record_metric = record_metric
         self.closed = False
+        self._sent = 0
+        self._sent_reported = 0
         # If this is not set, None is still a falsy value.
         self.compression_setting = grpc.Compression.Gzip if compression else grpc.Compression.NoCompression
 
@@ -88,6 +93,7 @@ class StreamingRpc(object):
 
     def create_response_iterator(self):
         with self.stream_buffer._notify:
+            self._sent += self.request_iterator.sent
             self.request_iterator = iter(self.stream_buffer)
             self.request_iterator._stream = reponse_iterator = self.rpc(self.request_iterator, metadata=self.metadata)
             return reponse_iterator
@@ -96,6 +102,18 @@ class StreamingRpc(object):
     def condition(*args, **kwargs):
         return threading.Condition(*args, **kwargs)
 
+    def stats(self):
+        """Returns the number of spans taken from the stream buffer by this
+        stream since the last call.
+
+        """
+
+        with self.stream_buffer._notify:
+            sent = self._sent + self.request_iterator.sent
+            sent, self._sent_reported = sent - self._sent_reported, sent
+
+        return sent
+
     def close(self):
         channel = None
         with self.notify:
@@ -25,20 +25,30 @@ import threading
 import time
 import traceback
 import warnings
+from collections import deque
 from functools import partial
+from itertools import count
 
+from newrelic.api.time_trace import get_linking_metadata
 from newrelic.common.object_names import callable_name
 from newrelic.core.adaptive_sampler import AdaptiveSampler
 from newrelic.core.config import global_settings
 from newrelic.core.custom_event import create_custom_event
 from newrelic.core.data_collector import create_session
-from newrelic.core.database_utils import SQLConnections
+from newrelic.core.database_utils import (
+    SQLConnections,
+    explain_plan_cache_stats,
+    sql_connection_pool,
+    sql_connection_pool_stats,
+    sql_statement_cache_stats,
+)
 from newrelic.core.environment import environment_settings
 from newrelic.core.internal_metrics import (
     InternalTrace,
     InternalTraceContext,
     internal_count_metric,
     internal_metric,
+    merge_internal_metrics,
 )
 from newrelic.core.profile_sessions import profile_session_manager
 from newrelic.core.rules_engine import RulesEngine, SegmentCollapseEngine
@@ -55,6 +65,44 @@ from newrelic.samplers.data_sampler import DataSampler
 
 _logger = logging.getLogger(__name__)
 
+# Number of buffered log events at which the thread recording a log event
+# will add them to the stats engine, rather than waiting for the harvest.
+
+LOG_EVENT_BATCH_SIZE = 1000
+
+
+class _StatsEngineShard(object):
+
+    """Holds one of the partial stats engines that transactions are merged
+    into when sharded accumulation is enabled. Each shard has its own lock
+    so threads recording into different shards do not contend with each
+    other. The shards are only folded into the main stats engine of the
+    application when a harvest is performed.
+
+    """
+
+    def __init__(self, stats_engine):
+        self.lock = threading.Lock()
+        self.reset(stats_engine)
+
+    def reset(self, stats_engine):
+        self.stats_engine = stats_engine.create_workarea()
+        self.transaction_count = 0
+        self.last_transaction = 0.0
+
+
+def _harvest_exception_priority(exc_type):
+    # Exceptions requiring the session to be shutdown take precedence
+    # over those only affecting the data for the current harvest.
+
+    if issubclass(exc_type, (ForceAgentRestart, ForceAgentDisconnect)):
+        return 0
+    elif issubclass(exc_type, RetryDataForRequest):
+        return 1
+    elif issubclass(exc_type, DiscardDataForRequest):
+        return 2
+    return 3
+
 
 class Application(object):
 
@@ -102,10 +150,36 @@ class Application(object):
 
         self._stats_lock = threading.RLock()
         self._stats_engine = StatsEngine()
+        self._stats_shards = []
+
+        # Each thread recording transactions is assigned the next shard
+        # in turn the first time it records one. Thread idents can't be
+        # used to pick the shard directly as they are often addresses
+        # with the low bits all the same.
+
+        self._stats_shard_local = threading.local()
+        self._stats_shard_counter = count()
 
         self._stats_custom_lock = threading.RLock()
         self._stats_custom_engine = StatsEngine()
 
+        # Log events recorded outside of a transaction are buffered and
+        # added to the stats engine in bulk. Appending to a deque is
+        # thread safe, so the stats lock isn't taken for each log line.
+
+        self._log_event_buffer = deque()
+
+        # Counts for caches and pools shared by all applications in the
+        # process are running totals. Those last seen are kept so that
+        # each harvest reports only the change since this application's
+        # last harvest.
+
+        self._process_stats = {
+            "sql_statement_cache": sql_statement_cache_stats(),
+            "explain_plan_cache": explain_plan_cache_stats(),
+            "sql_connection_pool": sql_connection_pool_stats(),
+        }
+
         self._agent_commands_lock = threading.Lock()
         self._data_samplers_lock = threading.Lock()
         self._data_samplers_started = False
@@ -499,6 +573,13 @@ class Application(object):
         with self._stats_lock:
             self._stats_engine.reset_stats(configuration, reset_stream=True)
 
+            # Create the stats engine shards if sharded accumulation of
+            # transaction data is enabled. These must be created after
+            # the main stats engine is reset as they are derived from it.
+
+            shards = configuration.agent_limits.stats_engine_shards or 0
+            self._stats_shards = [_StatsEngineShard(self._stats_engine) for _ in range(shards)]
+
             if configuration.serverless_mode.enabled:
                 sampling_target_period = 60.0
             else:
@@ -509,6 +590,7 @@ class Application(object):
 
         with self._stats_custom_lock:
             self._stats_custom_engine.reset_stats(configuration)
+            self._log_event_buffer.clear()
 
         # Record an initial start time for the reporting period and
         # clear record of last transaction processed.
@@ -607,6 +689,20 @@ class Application(object):
 
         self.start_data_samplers()
 
+        # Send any data which was spooled after failing to be sent,
+        # which may include data from a previous run of the process.
+
+        internal_metrics = CustomMetrics()
+
+        with InternalTraceContext(internal_metrics):
+            try:
+                self._active_session.replay_spool()
+            except Exception:
+                _logger.exception("Unable to replay spooled data for %r.", self._app_name)
+
+        with self._stats_lock:
+            self._stats_engine.merge_custom_metrics(internal_metrics.metrics())
+
         try:
             self._active_session.close_connection()
         except:
@@ -880,9 +976,47 @@ class Application(object):
         if not self._active_session:
             return
 
+        settings = self._stats_engine.settings
+        application_logging = settings and settings.application_logging
+
+        if not (application_logging and application_logging.enabled and application_logging.forwarding.enabled):
+            return
+
         if message:
-            with self._stats_custom_lock:
-                event = self._stats_engine.record_log_event(message, level, timestamp, priority=priority)
+            # The time and linking metadata must be captured now, but
+            # building the log event and sampling it is deferred.
+
+            if timestamp is None:
+                timestamp = time.time()
+
+            buffer = self._log_event_buffer
+            buffer.append((message, level, timestamp, priority, get_linking_metadata()))
+
+            if len(buffer) >= LOG_EVENT_BATCH_SIZE:
+                self._record_buffered_log_events()
+
+    def _record_buffered_log_events(self):
+        """Adds the log events buffered by record_log_event() to the stats
+        engine. Only those already buffered when called are added, so a
+        thread recording log events can't hold it here indefinitely.
+
+        """
+
+        buffer = self._log_event_buffer
+
+        if not buffer:
+            return
+
+        with self._stats_custom_lock:
+            record_log_event = self._stats_engine.record_log_event
+
+            for _ in range(len(buffer)):
+                try:
+                    message, level, timestamp, priority, attributes = buffer.popleft()
+                except IndexError:
+                    break
+
+                event = record_log_event(message, level, timestamp, priority=priority, attributes=attributes)
                 if event:
                     self._global_events_account += 1
 
@@ -943,12 +1077,42 @@ class Application(object):
                     if settings.debug.record_transaction_failure:
                         raise
 
-            with self._stats_lock:
+            # When sharded accumulation is enabled we merge into the shard
+            # for the current thread rather than the main stats engine.
+            # The shards are only folded into the main stats engine when
+            # a harvest is performed, so threads recording transactions
+            # do not all contend on the single main stats lock.
+
+            shards = self._stats_shards
+
+            if shards:
+                local = self._stats_shard_local
                 try:
-                    self._transaction_count += 1
-                    self._last_transaction = data.end_time
+                    index = local.index
+                except AttributeError:
+                    index = local.index = next(self._stats_shard_counter)
 
-                    self._stats_engine.merge(stats)
+                shard = shards[index % len(shards)]
+                lock = shard.lock
+            else:
+                shard = None
+                lock = self._stats_lock
+
+            with lock:
+                try:
+                    if shard is not None:
+                        shard.transaction_count += 1
+                        shard.last_transaction = data.end_time
+
+                        stats_engine = shard.stats_engine
+
+                    else:
+                        self._transaction_count += 1
+                        self._last_transaction = data.end_time
+
+                        stats_engine = self._stats_engine
+
+                    stats_engine.merge(stats)
 
                     # We merge the internal statistics here as well even
                     # though have popped out of the context where we are
@@ -956,7 +1120,7 @@ class Application(object):
                     # anything else after this point. If we do then that
                     # data will not be recorded.
 
-                    self._stats_engine.merge_custom_metrics(internal_metrics.metrics())
+                    stats_engine.merge_custom_metrics(internal_metrics.metrics())
 
                 except Exception:
                     _logger.exception(
@@ -1075,9 +1239,10 @@ class Application(object):
 
         return {command_id: {}}
 
-    def harvest(self, shutdown=False, flexible=False):
+    def harvest(self, shutdown=False, flexible=False, pool=None):
         """Performs a harvest, reporting aggregated data for the current
-        reporting period to the data collector.
+        reporting period to the data collector. If a harvest pool is
+        supplied, independent data sets are sent concurrently using it.
 
         """
 
@@ -1112,9 +1277,13 @@ class Application(object):
                 _logger.debug("Snapshotting for harvest[%s] of %r.", call_metric, self._app_name)
 
                 configuration = self._active_session.configuration
-                transaction_count = self._transaction_count
+
+                self._record_buffered_log_events()
 
                 with self._stats_lock:
+                    self._merge_stats_shards()
+
+                    transaction_count = self._transaction_count
                     self._transaction_count = 0
 
                     self._last_transaction = 0.0
@@ -1187,6 +1356,43 @@ class Application(object):
 
                     stats.record_custom_metric("Instance/Reporting", 0)
 
+                    # Report on the effectiveness of the cache of attribute
+                    # filter results over the harvest period.
+
+                    hits, misses, evictions = configuration.attribute_filter.cache.stats()
+
+                    internal_count_metric("Supportability/Python/AttributeFilter/Cache/Hits", hits)
+                    internal_count_metric("Supportability/Python/AttributeFilter/Cache/Misses", misses)
+                    internal_count_metric("Supportability/Python/AttributeFilter/Cache/Evictions", evictions)
+
+                    # Likewise for the cache of parsed SQL statements.
+
+                    hits, misses, evictions = self._process_stats_delta(
+                        "sql_statement_cache", sql_statement_cache_stats()
+                    )
+
+                    internal_count_metric("Supportability/Python/SQLStatement/Cache/Hits", hits)
+                    internal_count_metric("Supportability/Python/SQLStatement/Cache/Misses", misses)
+                    internal_count_metric("Supportability/Python/SQLStatement/Cache/Evictions", evictions)
+
+                    hits, misses, evictions, dropped = self._process_stats_delta(
+                        "explain_plan_cache", explain_plan_cache_stats()
+                    )
+
+                    internal_count_metric("Supportability/Python/ExplainPlan/Cache/Hits", hits)
+                    internal_count_metric("Supportability/Python/ExplainPlan/Cache/Misses", misses)
+                    internal_count_metric("Supportability/Python/ExplainPlan/Cache/Evictions", evictions)
+                    internal_count_metric("Supportability/Python/ExplainPlan/Worker/Dropped", dropped)
+
+                    created, reused, expired, unhealthy = self._process_stats_delta(
+                        "sql_connection_pool", sql_connection_pool_stats()
+                    )
+
+                    internal_count_metric("Supportability/Python/ExplainPlan/Connections/Created", created)
+                    internal_count_metric("Supportability/Python/ExplainPlan/Connections/Reused", reused)
+                    internal_count_metric("Supportability/Python/ExplainPlan/Connections/Expired", expired)
+                    internal_count_metric("Supportability/Python/ExplainPlan/Connections/Unhealthy", unhealthy)
+
                     # If an import order issue was detected, send a metric for
                     # each uninstrumented module
 
@@ -1217,7 +1423,19 @@ class Application(object):
                         period_end = self._period_start + 1.001
 
                 try:
-                    # Send the transaction and custom metric data.
+                    # Send the data sets which are independent of each
+                    # other. Each is sent by a separate task so that when
+                    # a harvest pool is available they can be sent
+                    # concurrently. The metric data is only sent once
+                    # these have completed, so that it includes the
+                    # internal metrics recorded while sending them.
+
+                    harvest_tasks = []
+
+                    # Send any data held in the harvest spool from prior
+                    # harvests first, so data is received in order.
+
+                    self._active_session.replay_spool()
 
                     # Send data set for analytics, which is Synthetic analytic
                     # events, and the sampled data set of regular requests sent
@@ -1225,35 +1443,43 @@ class Application(object):
 
                     synthetics_events = stats.synthetics_events
                     if synthetics_events:
-                        if synthetics_events.num_samples:
-                            _logger.debug("Sending synthetics event data for harvest of %r.", self._app_name)
 
-                            self._active_session.send_transaction_events(
-                                synthetics_events.sampling_info, synthetics_events
-                            )
+                        def send_synthetics_events():
+                            if synthetics_events.num_samples:
+                                _logger.debug("Sending synthetics event data for harvest of %r.", self._app_name)
 
-                        stats.reset_synthetics_events()
+                                self._active_session.send_transaction_events(
+                                    synthetics_events.sampling_info, synthetics_events
+                                )
+
+                            stats.reset_synthetics_events()
+
+                        harvest_tasks.append(("synthetics_event_data", send_synthetics_events))
 
                     if configuration.collect_analytics_events and configuration.transaction_events.enabled:
                         transaction_events = stats.transaction_events
 
                         if transaction_events:
-                            # As per spec
-                            internal_metric(
-                                "Supportability/Python/RequestSampler/requests", transaction_events.num_seen
-                            )
-                            internal_metric(
-                                "Supportability/Python/RequestSampler/samples", transaction_events.num_samples
-                            )
 
-                            if transaction_events.num_samples:
-                                _logger.debug("Sending analytics event data for harvest of %r.", self._app_name)
-
-                                self._active_session.send_transaction_events(
-                                    transaction_events.sampling_info, transaction_events
+                            def send_transaction_events():
+                                # As per spec
+                                internal_metric(
+                                    "Supportability/Python/RequestSampler/requests", transaction_events.num_seen
+                                )
+                                internal_metric(
+                                    "Supportability/Python/RequestSampler/samples", transaction_events.num_samples
                                 )
 
-                            stats.reset_transaction_events()
+                                if transaction_events.num_samples:
+                                    _logger.debug("Sending analytics event data for harvest of %r.", self._app_name)
+
+                                    self._active_session.send_transaction_events(
+                                        transaction_events.sampling_info, transaction_events
+                                    )
+
+                                stats.reset_transaction_events()
+
+                            harvest_tasks.append(("analytic_event_data", send_transaction_events))
 
                     # Send span events
 
@@ -1271,24 +1497,33 @@ class Application(object):
 
                                 internal_count_metric("Supportability/InfiniteTracing/Span/Seen", spans_seen)
                                 internal_count_metric("Supportability/InfiniteTracing/Span/Sent", spans_sent)
+
+                                for stream_id, stream_sent in self._active_session.span_stream_stats():
+                                    internal_count_metric(
+                                        "Supportability/InfiniteTracing/Span/Stream/%d/Sent" % stream_id, stream_sent
+                                    )
                         else:
                             spans = stats.span_events
                             if spans:
-                                if spans.num_samples > 0:
-                                    span_samples = list(spans)
 
-                                    _logger.debug("Sending span event data for harvest of %r.", self._app_name)
+                                def send_span_events():
+                                    if spans.num_samples > 0:
+                                        span_samples = list(spans)
 
-                                    self._active_session.send_span_events(spans.sampling_info, span_samples)
-                                    span_samples = None
+                                        _logger.debug("Sending span event data for harvest of %r.", self._app_name)
 
-                                # As per spec
-                                spans_seen = spans.num_seen
-                                spans_sampled = spans.num_samples
-                                internal_count_metric("Supportability/SpanEvent/TotalEventsSeen", spans_seen)
-                                internal_count_metric("Supportability/SpanEvent/TotalEventsSent", spans_sampled)
+                                        self._active_session.send_span_events(spans.sampling_info, span_samples)
+                                        span_samples = None
 
-                                stats.reset_span_events()
+                                    # As per spec
+                                    spans_seen = spans.num_seen
+                                    spans_sampled = spans.num_samples
+                                    internal_count_metric("Supportability/SpanEvent/TotalEventsSeen", spans_seen)
+                                    internal_count_metric("Supportability/SpanEvent/TotalEventsSent", spans_sampled)
+
+                                    stats.reset_span_events()
+
+                                harvest_tasks.append(("span_event_data", send_span_events))
 
                     # Send error events
 
@@ -1299,21 +1534,27 @@ class Application(object):
                     ):
                         error_events = stats.error_events
                         if error_events:
-                            num_error_samples = error_events.num_samples
-                            if num_error_samples > 0:
-                                error_event_samples = list(error_events)
 
-                                _logger.debug("Sending error event data for harvest of %r.", self._app_name)
+                            def send_error_events():
+                                num_error_samples = error_events.num_samples
+                                if num_error_samples > 0:
+                                    error_event_samples = list(error_events)
+
+                                    _logger.debug("Sending error event data for harvest of %r.", self._app_name)
+
+                                    samp_info = error_events.sampling_info
+                                    self._active_session.send_error_events(samp_info, error_event_samples)
+                                    error_event_samples = None
 
-                                samp_info = error_events.sampling_info
-                                self._active_session.send_error_events(samp_info, error_event_samples)
-                                error_event_samples = None
+                                # As per spec
+                                internal_count_metric(
+                                    "Supportability/Events/TransactionError/Seen", error_events.num_seen
+                                )
+                                internal_count_metric("Supportability/Events/TransactionError/Sent", num_error_samples)
 
-                            # As per spec
-                            internal_count_metric("Supportability/Events/TransactionError/Seen", error_events.num_seen)
-                            internal_count_metric("Supportability/Events/TransactionError/Sent", num_error_samples)
+                                stats.reset_error_events()
 
-                            stats.reset_error_events()
+                            harvest_tasks.append(("error_event_data", send_error_events))
 
                     # Send custom events
 
@@ -1321,19 +1562,23 @@ class Application(object):
                         customs = stats.custom_events
 
                         if customs:
-                            if customs.num_samples > 0:
-                                custom_samples = list(customs)
 
-                                _logger.debug("Sending custom event data for harvest of %r.", self._app_name)
+                            def send_custom_events():
+                                if customs.num_samples > 0:
+                                    custom_samples = list(customs)
+
+                                    _logger.debug("Sending custom event data for harvest of %r.", self._app_name)
+
+                                    self._active_session.send_custom_events(customs.sampling_info, custom_samples)
+                                    custom_samples = None
 
-                                self._active_session.send_custom_events(customs.sampling_info, custom_samples)
-                                custom_samples = None
+                                # As per spec
+                                internal_count_metric("Supportability/Events/Customer/Seen", customs.num_seen)
+                                internal_count_metric("Supportability/Events/Customer/Sent", customs.num_samples)
 
-                            # As per spec
-                            internal_count_metric("Supportability/Events/Customer/Seen", customs.num_seen)
-                            internal_count_metric("Supportability/Events/Customer/Sent", customs.num_samples)
+                                stats.reset_custom_events()
 
-                            stats.reset_custom_events()
+                            harvest_tasks.append(("custom_event_data", send_custom_events))
 
                     # Send log events
 
@@ -1347,20 +1592,24 @@ class Application(object):
                         logs = stats.log_events
 
                         if logs:
-                            if logs.num_samples > 0:
-                                log_samples = list(logs)
 
-                                _logger.debug("Sending log event data for harvest of %r.", self._app_name)
+                            def send_log_events():
+                                if logs.num_samples > 0:
+                                    log_samples = list(logs)
+
+                                    _logger.debug("Sending log event data for harvest of %r.", self._app_name)
 
-                                self._active_session.send_log_events(logs.sampling_info, log_samples)
-                                log_samples = None
+                                    self._active_session.send_log_events(logs.sampling_info, log_samples)
+                                    log_samples = None
 
-                            # As per spec
-                            internal_count_metric("Supportability/Logging/Forwarding/Seen", logs.num_seen)
-                            internal_count_metric("Supportability/Logging/Forwarding/Sent", logs.num_samples)
-                            internal_count_metric("Logging/Forwarding/Dropped", logs.num_seen - logs.num_samples)
+                                # As per spec
+                                internal_count_metric("Supportability/Logging/Forwarding/Seen", logs.num_seen)
+                                internal_count_metric("Supportability/Logging/Forwarding/Sent", logs.num_samples)
+                                internal_count_metric("Logging/Forwarding/Dropped", logs.num_seen - logs.num_samples)
 
-                            stats.reset_log_events()
+                                stats.reset_log_events()
+
+                            harvest_tasks.append(("log_event_data", send_log_events))
 
                     # Send the accumulated error data.
 
@@ -1368,13 +1617,21 @@ class Application(object):
                         error_data = stats.error_data()
 
                         if error_data:
-                            _logger.debug("Sending error data for harvest of %r.", self._app_name)
 
-                            self._active_session.send_errors(error_data)
+                            def send_errors():
+                                _logger.debug("Sending error data for harvest of %r.", self._app_name)
+
+                                self._active_session.send_errors(error_data)
+
+                            harvest_tasks.append(("error_data", send_errors))
+
+                    self._run_harvest_tasks(harvest_tasks, pool)
 
                     if not flexible:
                         if configuration.collect_traces:
-                            connections = SQLConnections(configuration.agent_limits.max_sql_connections)
+                            connections = SQLConnections(
+                                configuration.agent_limits.max_sql_connections, sql_connection_pool()
+                            )
 
                             with connections:
                                 if configuration.slow_sql.enabled:
@@ -1385,14 +1642,18 @@ class Application(object):
                                     if slow_sql_data:
                                         _logger.debug("Sending slow SQL data for harvest of %r.", self._app_name)
 
-                                        self._active_session.send_sql_traces(slow_sql_data)
+                                        with InternalTrace("Supportability/Python/Harvest/Endpoint/sql_trace_data"):
+                                            self._active_session.send_sql_traces(slow_sql_data)
 
                                 slow_transaction_data = stats.transaction_trace_data(connections)
 
                                 if slow_transaction_data:
                                     _logger.debug("Sending slow transaction data for harvest of %r.", self._app_name)
 
-                                    self._active_session.send_transaction_traces(slow_transaction_data)
+                                    with InternalTrace(
+                                        "Supportability/Python/Harvest/Endpoint/transaction_sample_data"
+                                    ):
+                                        self._active_session.send_transaction_traces(slow_transaction_data)
 
                         # Create a metric_normalizer based on normalize_name
                         # If metric rename rules are empty, set normalizer
@@ -1420,7 +1681,8 @@ class Application(object):
                         _logger.debug("Sending metric data for harvest of %r.", self._app_name)
 
                         # Send metrics
-                        self._active_session.send_metric_data(self._period_start, period_end, metric_data)
+                        with InternalTrace("Supportability/Python/Harvest/Endpoint/metric_data"):
+                            self._active_session.send_metric_data(self._period_start, period_end, metric_data)
 
                         _logger.debug("Done sending data for harvest of %r.", self._app_name)
 
@@ -1557,6 +1819,82 @@ class Application(object):
         with self._stats_lock:
             self._stats_engine.merge_custom_metrics(internal_metrics.metrics())
 
+    def _run_harvest_tasks(self, tasks, pool=None):
+        """Runs the tasks for sending independent data sets during a
+        harvest, recording the time taken by each. Where a harvest pool
+        is supplied the tasks are run concurrently, with any exception
+        being raised once all have completed. Where more than one task
+        fails, the exception which has the most impact on the session
+        is the one raised.
+
+        """
+
+        if pool is None or len(tasks) < 2:
+            for name, task in tasks:
+                with InternalTrace("Supportability/Python/Harvest/Endpoint/" + name):
+                    task()
+            return
+
+        # Internal metrics are tracked per thread, so each task records
+        # into its own set of metrics, which are then merged back into
+        # those for the harvest once all tasks have completed.
+
+        task_metrics = []
+
+        def wrap_task(name, task):
+            metrics = CustomMetrics()
+            task_metrics.append(metrics)
+
+            def _task():
+                with InternalTraceContext(metrics):
+                    with InternalTrace("Supportability/Python/Harvest/Endpoint/" + name, metrics):
+                        return task()
+
+            return _task
+
+        outcomes = pool.run([wrap_task(name, task) for name, task in tasks])
+
+        for metrics in task_metrics:
+            merge_internal_metrics(metrics.metrics())
+
+        failures = [exc_info for _, exc_info in outcomes if exc_info is not None]
+
+        if failures:
+            failures.sort(key=lambda exc_info: _harvest_exception_priority(exc_info[0]))
+            six.reraise(*failures[0])
+
+    def _merge_stats_shards(self):
+        """Folds the data accumulated in any stats engine shards into the
+        main stats engine, replacing each shard with a fresh one. This
+        must be called with the stats lock held.
+
+        """
+
+        for shard in self._stats_shards:
+            with shard.lock:
+                stats_engine = shard.stats_engine
+                transaction_count = shard.transaction_count
+                last_transaction = shard.last_transaction
+
+                shard.reset(self._stats_engine)
+
+            self._transaction_count += transaction_count
+            self._last_transaction = max(self._last_transaction, last_transaction)
+
+            self._stats_engine.merge_shard(stats_engine)
+
+    def _process_stats_delta(self, name, totals):
+        """Returns the change in the running totals of counts for a cache
+        or pool shared by all applications in the process, since the
+        totals were last seen by this application.
+
+        """
+
+        previous = self._process_stats.get(name) or (0,) * len(totals)
+        self._process_stats[name] = totals
+
+        return tuple(total - last for total, last in zip(totals, previous))
+
     def report_profile_data(self):
         """Report back any profile data."""
 
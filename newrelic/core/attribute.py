@@ -174,6 +174,37 @@ def resolve_agent_attributes(attr_dict, attribute_filter, target_destination, at
     return a_attrs
 
 
+def resolve_user_attribute_names(attr_names, attribute_filter, target_destination):
+    """Returns a tuple of those user attribute names which are sent to
+    the target destination, in the same order as supplied.
+
+    """
+
+    return tuple(
+        attr_name for attr_name in attr_names if attribute_filter.apply(attr_name, DST_ALL) & target_destination
+    )
+
+
+def resolve_agent_attribute_names(attr_names, attribute_filter, target_destination):
+    """Returns a tuple of those agent attribute names which are sent to
+    the target destination, in the same order as supplied.
+
+    """
+
+    resolved = []
+
+    for attr_name in attr_names:
+        if attr_name in _TRANSACTION_EVENT_DEFAULT_ATTRIBUTES:
+            dest = attribute_filter.apply(attr_name, _DESTINATIONS_WITH_EVENTS)
+        else:
+            dest = attribute_filter.apply(attr_name, _DESTINATIONS)
+
+        if dest & target_destination:
+            resolved.append(attr_name)
+
+    return tuple(resolved)
+
+
 def create_user_attributes(attr_dict, attribute_filter):
     destinations = DST_ALL
     return create_attributes(attr_dict, destinations, attribute_filter)
@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from newrelic.common.lru_cache import LRUCache
+
 # Attribute "destinations" represented as bitfields.
 
 DST_NONE = 0x0
@@ -23,6 +25,11 @@ DST_BROWSER_MONITORING   = 1 << 3
 DST_SPAN_EVENTS          = 1 << 4
 DST_TRANSACTION_SEGMENTS = 1 << 5
 
+# Default bound on the number of (name, default_destinations) results
+# memoized by an AttributeFilter.
+
+DEFAULT_CACHE_SIZE = 10000
+
 class AttributeFilter(object):
 
     # Apply filtering rules to attributes.
@@ -57,12 +64,29 @@ class AttributeFilter(object):
     #      the bitfield.
     #
     #   4. Return the resulting bitfield after all rules have been applied.
+    #
+    # Rather than testing every rule against the attribute name, the sorted
+    # rules are indexed by name, separately for exact and wildcard rules.
+    # The only rules which can match a name are the exact rules for that
+    # name and the wildcard rules whose name is a prefix of it. Since a
+    # prefix always sorts before a longer name, visiting the wildcard
+    # prefixes from shortest to longest and then the exact rules yields
+    # the matching rules in the same order as the sorted list.
+    #
+    # The results are memoized in a bounded LRU cache, as attribute names
+    # can be dynamic and so unbounded in number.
 
     def __init__(self, flattened_settings):
 
         self.enabled_destinations = self._set_enabled_destinations(flattened_settings)
         self.rules = self._build_rules(flattened_settings)
-        self.cache = {}
+        self._exact_rules, self._wildcard_rules, self._wildcard_lengths = self._compile_rules(self.rules)
+
+        cache_size = flattened_settings.get('agent_limits.attribute_filter_cache_size', None)
+        if cache_size is None:
+            cache_size = DEFAULT_CACHE_SIZE
+
+        self.cache = LRUCache(cache_size)
 
     def __repr__(self):
         return "<AttributeFilter: destinations: %s, rules: %s>" % (
@@ -135,26 +159,61 @@ class AttributeFilter(object):
 
         return tuple(rules)
 
+    def _compile_rules(self, rules):
+
+        # Index the sorted rules by name. The lists of rules for each name
+        # retain the order of the sorted rules.
+
+        exact_rules = {}
+        wildcard_rules = {}
+
+        for rule in rules:
+            if rule.is_wildcard:
+                wildcard_rules.setdefault(rule.name, []).append(rule)
+            else:
+                exact_rules.setdefault(rule.name, []).append(rule)
+
+        wildcard_lengths = tuple(sorted(set(len(name) for name in wildcard_rules)))
+
+        return exact_rules, wildcard_rules, wildcard_lengths
+
+    def _matching_rules(self, name):
+        name_length = len(name)
+
+        for length in self._wildcard_lengths:
+            if length > name_length:
+                break
+
+            rules = self._wildcard_rules.get(name[:length])
+            if rules:
+                for rule in rules:
+                    yield rule
+
+        rules = self._exact_rules.get(name)
+        if rules:
+            for rule in rules:
+                yield rule
+
     def apply(self, name, default_destinations):
         if self.enabled_destinations == DST_NONE:
             return DST_NONE
 
         cache_index = (name, default_destinations)
 
-        if cache_index in self.cache:
-            return self.cache[cache_index]
+        destinations = self.cache.get(cache_index)
+        if destinations is not None:
+            return destinations
 
         destinations = self.enabled_destinations & default_destinations
 
-        for rule in self.rules:
-            if rule.name_match(name):
-                if rule.is_include:
-                    inc_dest = rule.destinations & self.enabled_destinations
-                    destinations |= inc_dest
-                else:
-                    destinations &= ~rule.destinations
+        for rule in self._matching_rules(name):
+            if rule.is_include:
+                inc_dest = rule.destinations & self.enabled_destinations
+                destinations |= inc_dest
+            else:
+                destinations &= ~rule.destinations
 
-        self.cache[cache_index] = destinations
+        self.cache.put(cache_index, destinations)
         return destinations
 
 class AttributeFilterRule(object):
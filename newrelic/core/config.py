@@ -231,6 +231,10 @@ class DatastoreTracerDatabaseNameReportingSettings(Settings):
     pass
 
 
+class HarvestSpoolSettings(Settings):
+    pass
+
+
 class HerokuSettings(Settings):
     pass
 
@@ -388,6 +392,7 @@ _settings.event_harvest_config = EventHarvestConfigSettings()
 _settings.event_harvest_config.harvest_limits = EventHarvestConfigHarvestLimitSettings()
 _settings.event_loop_visibility = EventLoopVisibilitySettings()
 _settings.gc_runtime_metrics = GCRuntimeMetricsSettings()
+_settings.harvest_spool = HarvestSpoolSettings()
 _settings.heroku = HerokuSettings()
 _settings.infinite_tracing = InfiniteTracingSettings()
 _settings.instrumentation = InstrumentationSettings()
@@ -625,6 +630,7 @@ _settings.max_stack_trace_lines = 50
 _settings.sampling_rate = 0
 
 _settings.startup_timeout = float(os.environ.get("NEW_RELIC_STARTUP_TIMEOUT", "0.0"))
+_settings.trace_cache_mode = os.environ.get("NEW_RELIC_TRACE_CACHE_MODE", "thread")
 _settings.shutdown_timeout = float(os.environ.get("NEW_RELIC_SHUTDOWN_TIMEOUT", "2.5"))
 
 _settings.beacon = None
@@ -686,6 +692,8 @@ _settings.transaction_tracer.record_sql = "obfuscated"
 _settings.transaction_tracer.stack_trace_threshold = 0.5
 _settings.transaction_tracer.explain_enabled = True
 _settings.transaction_tracer.explain_threshold = 0.5
+_settings.transaction_tracer.explain_plan_cache_ttl = 300.0
+_settings.transaction_tracer.explain_plan_async = False
 _settings.transaction_tracer.function_trace = []
 _settings.transaction_tracer.generator_trace = []
 _settings.transaction_tracer.top_n = 20
@@ -728,8 +736,10 @@ _settings.agent_limits.transaction_traces_nodes = 2000
 _settings.agent_limits.sql_query_length_maximum = 16384
 _settings.agent_limits.slow_sql_stack_trace = 30
 _settings.agent_limits.max_sql_connections = 4
+_settings.agent_limits.sql_connection_idle_timeout = 0.0
 _settings.agent_limits.sql_explain_plans = 30
 _settings.agent_limits.sql_explain_plans_per_harvest = 60
+_settings.agent_limits.sql_explain_plan_cache_size = 100
 _settings.agent_limits.slow_sql_data = 10
 _settings.agent_limits.merge_stats_maximum = None
 _settings.agent_limits.errors_per_transaction = 5
@@ -740,6 +750,10 @@ _settings.agent_limits.synthetics_events = 200
 _settings.agent_limits.synthetics_transactions = 20
 _settings.agent_limits.data_compression_threshold = 64 * 1024
 _settings.agent_limits.data_compression_level = None
+_settings.agent_limits.stats_engine_shards = 0
+_settings.agent_limits.attribute_filter_cache_size = 10000
+_settings.agent_limits.sql_statement_cache_size = 1000
+_settings.agent_limits.harvest_threads = 0
 
 _settings.infinite_tracing.trace_observer_host = os.environ.get("NEW_RELIC_INFINITE_TRACING_TRACE_OBSERVER_HOST", None)
 _settings.infinite_tracing.trace_observer_port = _environ_as_int("NEW_RELIC_INFINITE_TRACING_TRACE_OBSERVER_PORT", 443)
@@ -747,6 +761,8 @@ _settings.infinite_tracing.compression = _environ_as_bool("NEW_RELIC_INFINITE_TR
 _settings.infinite_tracing.batching = _environ_as_bool("NEW_RELIC_INFINITE_TRACING_BATCHING", default=True)
 _settings.infinite_tracing.ssl = True
 _settings.infinite_tracing.span_queue_size = _environ_as_int("NEW_RELIC_INFINITE_TRACING_SPAN_QUEUE_SIZE", 10000)
+_settings.infinite_tracing.batch_timeout = _environ_as_float("NEW_RELIC_INFINITE_TRACING_BATCH_TIMEOUT", 0.0)
+_settings.infinite_tracing.streams = _environ_as_int("NEW_RELIC_INFINITE_TRACING_STREAMS", 1)
 
 _settings.instrumentation.graphql.capture_introspection_queries = os.environ.get(
     "NEW_RELIC_INSTRUMENTATION_GRAPHQL_CAPTURE_INTROSPECTION_QUERIES", False
@@ -793,6 +809,7 @@ _settings.debug.log_autorum_middleware = False
 _settings.debug.record_transaction_failure = False
 _settings.debug.enable_coroutine_profiling = False
 _settings.debug.explain_plan_obfuscation = "simple"
+_settings.debug.sql_lexer = "regex"
 _settings.debug.disable_certificate_validation = False
 _settings.debug.log_untrusted_distributed_trace_keys = False
 _settings.debug.disable_harvest_until_shutdown = False
@@ -827,12 +844,20 @@ _settings.aws_lambda_metadata = {}
 
 _settings.event_loop_visibility.enabled = True
 _settings.event_loop_visibility.blocking_threshold = 0.1
+
+_settings.harvest_spool.enabled = False
+_settings.harvest_spool.directory = None
+_settings.harvest_spool.max_size = 10 * 1024 * 1024
+_settings.harvest_spool.max_age = 24 * 60 * 60
 _settings.code_level_metrics.enabled = True
 
 _settings.application_logging.enabled = _environ_as_bool("NEW_RELIC_APPLICATION_LOGGING_ENABLED", default=True)
 _settings.application_logging.forwarding.enabled = _environ_as_bool(
     "NEW_RELIC_APPLICATION_LOGGING_FORWARDING_ENABLED", default=True
 )
+_settings.application_logging.forwarding.log_level = _LOG_LEVEL.get(
+    os.environ.get("NEW_RELIC_APPLICATION_LOGGING_FORWARDING_LOG_LEVEL", "").upper(), logging.NOTSET
+)
 _settings.application_logging.metrics.enabled = _environ_as_bool(
     "NEW_RELIC_APPLICATION_LOGGING_METRICS_ENABLED", default=True
 )
@@ -18,19 +18,42 @@
 
 from __future__ import print_function
 
+import hashlib
 import logging
+import os
+import tempfile
 
 from newrelic.common.agent_http import (
     ApplicationModeClient,
     DeveloperModeClient,
     ServerlessModeClient,
 )
+from newrelic.common.encoding_utils import json_decode, json_encode_chunks
 from newrelic.core.agent_protocol import AgentProtocol, ServerlessModeProtocol
 from newrelic.core.agent_streaming import StreamingRpc
 from newrelic.core.config import global_settings
+from newrelic.core.harvest_spool import HarvestSpool
+from newrelic.core.internal_metrics import internal_count_metric
+from newrelic.network.exceptions import DiscardDataForRequest, RetryDataForRequest
 
 _logger = logging.getLogger(__name__)
 
+# Methods for which data failing to be sent is written to the harvest
+# spool when enabled, mapped to whether the payload starts with the run
+# id of the agent, which must be replaced when the data is replayed.
+
+SPOOLED_METHODS = {
+    "analytic_event_data": True,
+    "custom_event_data": True,
+    "error_data": True,
+    "error_event_data": True,
+    "log_event_data": False,
+    "metric_data": True,
+    "span_event_data": True,
+    "sql_trace_data": False,
+    "transaction_sample_data": True,
+}
+
 
 class Session(object):
     PROTOCOL = AgentProtocol
@@ -41,6 +64,23 @@ class Session(object):
             app_name, linked_applications, environment, settings, client_cls=self.CLIENT
         )
         self._rpc = None
+        self._rpcs = []
+
+        self._spool = None
+        self._spooling = False
+
+        if settings.harvest_spool.enabled:
+            # Data is spooled separately for each distinct application
+            # so it is only ever replayed to the application it was
+            # recorded against.
+
+            directory = settings.harvest_spool.directory or os.path.join(
+                tempfile.gettempdir(), "newrelic-harvest-spool"
+            )
+            name = ";".join([app_name] + list(linked_applications or ()))
+            directory = os.path.join(directory, hashlib.sha1(name.encode("utf-8")).hexdigest())
+
+            self._spool = HarvestSpool(directory, settings.harvest_spool.max_size, settings.harvest_spool.max_age)
 
     @property
     def configuration(self):
@@ -74,15 +114,40 @@ class Session(object):
                     ("license_key", self.configuration.license_key),
                 )
 
-                rpc = self._rpc = StreamingRpc(
-                    endpoint, span_iterator, metadata, record_metric, ssl=ssl, compression=compression_setting
-                )
-                rpc.connect()
+                # Each stream has its own channel and reconnects with its
+                # own backoff, all of them taking spans from the one buffer.
+                streams = max(self.configuration.infinite_tracing.streams, 1)
+
+                self._rpcs = [
+                    StreamingRpc(
+                        endpoint,
+                        span_iterator,
+                        metadata,
+                        record_metric,
+                        ssl=ssl,
+                        compression=compression_setting,
+                        stream_id=stream_id,
+                    )
+                    for stream_id in range(streams)
+                ]
+
+                for rpc in self._rpcs:
+                    rpc.connect()
+
+                rpc = self._rpc = self._rpcs[0]
                 return rpc
 
     def shutdown_span_stream(self):
-        if self._rpc:
-            self._rpc.close()
+        for rpc in self._rpcs:
+            rpc.close()
+
+    def span_stream_stats(self):
+        """Returns the stream id and number of spans sent since the last
+        call for each of the span streams.
+
+        """
+
+        return [(rpc.stream_id, rpc.stats()) for rpc in self._rpcs]
 
     def send_transaction_traces(self, transaction_traces):
         """Called to submit transaction traces. The transaction traces
@@ -98,25 +163,25 @@ class Session(object):
             return
 
         payload = (self.agent_run_id, transaction_traces)
-        return self._protocol.send("transaction_sample_data", payload)
+        return self._send_data("transaction_sample_data", payload)
 
     def send_transaction_events(self, sampling_info, sample_set):
         """Called to submit sample set for analytics."""
 
         payload = (self.agent_run_id, sampling_info, sample_set)
-        return self._protocol.send("analytic_event_data", payload)
+        return self._send_data("analytic_event_data", payload)
 
     def send_custom_events(self, sampling_info, custom_event_data):
         """Called to submit sample set for custom events."""
 
         payload = (self.agent_run_id, sampling_info, custom_event_data)
-        return self._protocol.send("custom_event_data", payload)
+        return self._send_data("custom_event_data", payload)
 
     def send_span_events(self, sampling_info, span_event_data):
         """Called to submit sample set for span events."""
 
         payload = (self.agent_run_id, sampling_info, span_event_data)
-        return self._protocol.send("span_event_data", payload)
+        return self._send_data("span_event_data", payload)
 
     def send_metric_data(self, start_time, end_time, metric_data):
         """Called to submit metric data for specified period of time.
@@ -126,13 +191,13 @@ class Session(object):
         """
 
         payload = (self.agent_run_id, start_time, end_time, metric_data)
-        return self._protocol.send("metric_data", payload)
+        return self._send_data("metric_data", payload)
 
     def send_log_events(self, sampling_info, log_event_data):
         """Called to submit sample set for log events."""
 
         payload = ({"logs": tuple(log._asdict() for log in log_event_data)},)
-        return self._protocol.send("log_event_data", payload)
+        return self._send_data("log_event_data", payload)
 
     def get_agent_commands(self):
         """Receive agent commands from the data collector."""
@@ -150,13 +215,13 @@ class Session(object):
 
         """
         payload = (self.agent_run_id, errors)
-        return self._protocol.send("error_data", payload)
+        return self._send_data("error_data", payload)
 
     def send_error_events(self, sampling_info, error_data):
         """Called to submit sample set for error events."""
 
         payload = (self.agent_run_id, sampling_info, error_data)
-        return self._protocol.send("error_event_data", payload)
+        return self._send_data("error_event_data", payload)
 
     def send_sql_traces(self, sql_traces):
         """Called to sub SQL traces. The SQL traces should be an
@@ -168,7 +233,7 @@ class Session(object):
         """
 
         payload = (sql_traces,)
-        return self._protocol.send("sql_trace_data", payload)
+        return self._send_data("sql_trace_data", payload)
 
     def send_agent_command_results(self, cmd_results):
         """Acknowledge the receipt of an agent command."""
@@ -183,6 +248,61 @@ class Session(object):
         payload = (self.agent_run_id, profile_data)
         return self._protocol.send("profile_data", payload)
 
+    def _send_data(self, method, payload):
+        if self._spool is None:
+            return self._protocol.send(method, payload)
+
+        # Once data has failed to be sent, any further data is written
+        # directly to the spool until it has been successfully replayed.
+
+        if not self._spooling:
+            try:
+                return self._protocol.send(method, payload)
+            except RetryDataForRequest:
+                self._spooling = True
+
+        data = bytearray()
+        for chunk in json_encode_chunks(payload):
+            data += chunk.encode("utf-8")
+
+        if not self._spool.write(method, data):
+            raise RetryDataForRequest("Unable to write data for %r to the harvest spool." % method)
+
+    def _send_spooled(self, method, payload):
+        payload = json_decode(payload.decode("utf-8"))
+
+        if SPOOLED_METHODS.get(method):
+            payload[0] = self.agent_run_id
+
+        try:
+            self._protocol.send(method, payload)
+        except DiscardDataForRequest:
+            # The data collector won't accept this data if it is
+            # sent again, so move on to the remaining data.
+            pass
+
+    def replay_spool(self):
+        """Sends any data held in the harvest spool, including data
+        spooled by a previous run of the process. Data which still
+        can't be sent is kept in the spool.
+
+        """
+
+        if self._spool is None:
+            return
+
+        try:
+            self._spool.replay(self._send_spooled)
+            self._spooling = False
+        except RetryDataForRequest:
+            self._spooling = True
+        finally:
+            spooled, replayed, dropped = self._spool.stats()
+
+            internal_count_metric("Supportability/Python/HarvestSpool/Spooled", spooled)
+            internal_count_metric("Supportability/Python/HarvestSpool/Replayed", replayed)
+            internal_count_metric("Supportability/Python/HarvestSpool/Dropped", dropped)
+
     def shutdown_session(self):
         """Called to perform orderly deregistration of agent run against
         the data collector, rather than simply dropping the connection and
@@ -19,10 +19,14 @@ explain plans for SQL etc.
 
 import logging
 import re
-import weakref
+import threading
+import time
+
+from collections import deque
 
 import newrelic.packages.six as six
 
+from newrelic.common.lru_cache import LRUCache
 from newrelic.core.internal_metrics import internal_metric
 from newrelic.core.config import global_settings
 
@@ -215,6 +219,117 @@ _uncomment_sql_re = re.compile(_uncomment_sql_x, re.DOTALL)
 def _uncomment_sql(sql):
     return _uncomment_sql_re.sub('', sql)
 
+# Fused implementation of obfuscation and normalization, selected by setting
+# 'debug.sql_lexer' to 'fused'. It produces the same results as the routines
+# above, but with fewer scans of the SQL text, by fusing steps which were
+# each done with a separate scan. The text is still scanned more than once.
+#
+# Quoted strings and literals are replaced in one scan rather than two.
+# This is equivalent as none of the literal patterns can match a quote
+# character and the character either side of a quoted string is the same
+# kind of character, for the purposes of word boundaries, as the '?' it
+# would be replaced with. Each literal pattern is rewritten to start with
+# the character it matches first, with any word boundary or look behind
+# checks moved after it, and the whole preceded by a look ahead for those
+# characters, as the regular expression engine can then rule out most
+# positions without trying every alternative. Order of the alternatives
+# is preserved, so the longest expressions are still tried first.
+
+_hex_c = r'[0-9a-fA-F]'
+_number_p = r'[0-9]*(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?'
+_bool_words_p = r'(?:[tT][rR][uU][eE]|[fF][aA][lL][sS][eE]|[nN][uU][lL][lL])'
+
+
+def _fused_literals_p(word_end_p):
+    return '|'.join([
+        r'\{(?:%s-?){32}\}?' % _hex_c,
+        r'%s-?(?:%s-?){31}\}?' % (_hex_c, _hex_c),
+        r'0[xX]%s+' % _hex_c,
+        r'-(?<!:-)[0-9]' + _number_p,
+        r'[0-9](?<![\w:][0-9])' + _number_p,
+        r'(?<!\w)' + _bool_words_p + word_end_p,
+    ])
+
+
+_fused_literals_c = r'{\-0-9a-fA-FtTnN'
+
+# The dollar quotes pattern refers back to its opening tag by group
+# number, so needs a named group when combined with other patterns.
+
+_dollar_quotes_named_p = r'(?P<tag>\$(?!\d)[^$]*?\$).*?(?:(?P=tag)|$)'
+
+# Oracle quoted strings start with a word character, so where one follows
+# directly on from a boolean literal, the boolean would only have ended at
+# a word boundary once the quoted string had been replaced.
+
+_fused_quotes = {
+    'single': (_single_quotes_p, "'", r'\b'),
+    'single+double': (_any_quotes_p, '\'"', r'\b'),
+    'single+dollar': (_single_quotes_p + '|' + _dollar_quotes_named_p,
+            "'$", r'\b'),
+    'single+oracle': (_single_oracle_p, "'q",
+            r'(?:\b|(?=%s))' % _oracle_quotes_p),
+}
+
+
+def _fused_obfuscate_re(quotes_p, quotes_c, word_end_p):
+    return re.compile('(?=[%s%s])(?:%s|%s)' % (quotes_c,
+            _fused_literals_c, quotes_p,
+            _fused_literals_p(word_end_p)))
+
+
+_fused_table = {}
+
+for _quoting_style, _args in _fused_quotes.items():
+    _fused_table[_quoting_style] = (_fused_obfuscate_re(*_args),
+            _quotes_table[_quoting_style][1])
+
+del _quoting_style, _args
+
+
+def _obfuscate_sql_fused(sql, database):
+    obfuscate_re, quotes_cleanup_re = _fused_table.get(
+            database.quoting_style, _fused_table['single'])
+
+    sql = obfuscate_re.sub('?', sql)
+
+    if quotes_cleanup_re.search(sql):
+        sql = '?'
+
+    return sql
+
+# Comments can only be removed where one of the delimiters is present, which
+# can be checked for far more quickly than running the regular expression.
+
+
+def _uncomment_sql_fused(sql):
+    if '--' in sql or '#' in sql or '/*' in sql:
+        return _uncomment_sql_re.sub('', sql)
+    return sql
+
+# For normalization, the param styles can all be replaced at once prior to
+# collapsing sets of values, as none can span a parenthesis other than the
+# '%(name)s' style, which is given precedence. Whitespace is then dropped
+# wherever it is not between two identifiers, with what remains collapsed
+# to a single space, which covers stripping the ends as well.
+
+
+_normalize_params_p = r'%s|%s|%s' % (_normalize_params_1_p,
+        _normalize_params_2_p, _normalize_params_3_p)
+_normalize_params_re = re.compile(_normalize_params_p)
+
+_normalize_whitespace_drop_p = r'(?<![\w\s])\s+|\s+(?![\w\s])'
+_normalize_whitespace_drop_re = re.compile(_normalize_whitespace_drop_p)
+
+
+def _normalize_sql_fused(sql):
+    sql = _normalize_params_re.sub('?', sql)
+    sql = _normalize_values_re.sub('(?)', sql)
+    sql = _normalize_whitespace_drop_re.sub('', sql)
+    sql = _normalize_whitespace_1_re.sub(' ', sql)
+
+    return sql
+
 # Parser routines for the different SQL statement operation types.
 #
 # Picking out the name of the target identifier for the specific
@@ -562,11 +677,186 @@ class SQLConnection(object):
         self.connection.close()
 
 
+class SQLConnectionPool(object):
+
+    """Pool of database connections for running explain plans, which
+    are held open between harvests so that they don't need to be made
+    again on every harvest. A connection is only reused for the same
+    database client and connect params. Connections left idle for longer
+    than the 'agent_limits.sql_connection_idle_timeout' setting are
+    closed, as are the least recently used once the number held open
+    exceeds 'agent_limits.max_sql_connections'. Where the idle timeout
+    is not greater than zero, connections are closed as soon as they are
+    released back to the pool.
+
+    Before an idle connection is reused it is checked by rolling back
+    any transaction on it, with it being closed and a new connection
+    made if that fails.
+
+    """
+
+    def __init__(self):
+        self._idle = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self.created = 0
+        self.reused = 0
+        self.expired = 0
+        self.unhealthy = 0
+
+    @staticmethod
+    def _healthy(connection):
+        try:
+            connection.connection.rollback()
+        except (AttributeError, connection.database.NotSupportedError):
+            pass
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.connection.close()
+        except Exception:
+            pass
+
+    def _remove_expired(self, now):
+        # Must be called with the lock held. Returns the connections
+        # removed so they can be closed after the lock is released.
+
+        settings = global_settings()
+
+        timeout = settings.agent_limits.sql_connection_idle_timeout
+        maximum = settings.agent_limits.max_sql_connections
+
+        removed = []
+
+        if timeout > 0:
+            expired = [item for item in self._idle if now - item[2] >= timeout]
+            if expired:
+                self._idle = [item for item in self._idle if now - item[2] < timeout]
+                self.expired += len(expired)
+                removed.extend(expired)
+        else:
+            removed.extend(self._idle)
+            self._idle = []
+
+        if len(self._idle) > maximum:
+            count = len(self._idle) - maximum
+            removed.extend(self._idle[:count])
+            self._idle = self._idle[count:]
+
+            internal_metric('Supportability/Python/DatabaseUtils/Counts/'
+                            'drop_database_connection', count)
+
+        return [item[1] for item in removed]
+
+    def acquire(self, database, args, kwargs):
+        key = (database.client, args, kwargs)
+
+        settings = global_settings()
+
+        while True:
+            with self._lock:
+                removed = self._remove_expired(time.time())
+
+                connection = None
+
+                # Take the most recently used connection for the key, as
+                # the one least likely to have been closed by the server.
+
+                for i in range(len(self._idle) - 1, -1, -1):
+                    if self._idle[i][0] == key:
+                        connection = self._idle.pop(i)[1]
+                        break
+
+            for item in removed:
+                self._close(item)
+
+            if connection is None:
+                break
+
+            if self._healthy(connection):
+                with self._lock:
+                    self.reused += 1
+
+                if settings.debug.log_explain_plan_queries:
+                    _logger.debug('Reusing pooled database connection '
+                            'for %r.', database.client)
+
+                return connection
+
+            with self._lock:
+                self.unhealthy += 1
+
+            if settings.debug.log_explain_plan_queries:
+                _logger.debug('Discarding unhealthy pooled database '
+                        'connection for %r.', database.client)
+
+            self._close(connection)
+
+        connection = SQLConnection(database, database.connect(*args, **kwargs))
+
+        with self._lock:
+            self.created += 1
+
+        return connection
+
+    def release(self, key, connection):
+        settings = global_settings()
+
+        if (self._closed
+                or settings.agent_limits.sql_connection_idle_timeout <= 0
+                or not self._healthy(connection)):
+            connection.cleanup()
+            return
+
+        with self._lock:
+            now = time.time()
+            self._idle.append((key, connection, now))
+            removed = self._remove_expired(now)
+
+        for item in removed:
+            self._close(item)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            removed, self._idle = [item[1] for item in self._idle], []
+
+        for item in removed:
+            self._close(item)
+
+    def __len__(self):
+        return len(self._idle)
+
+    def stats(self):
+        """Closes any connections which have been idle for longer than
+        the timeout, and returns the counts of connections created,
+        reused, expired and found to be unhealthy since the pool was
+        created.
+
+        """
+
+        with self._lock:
+            removed = self._remove_expired(time.time())
+
+            result = (self.created, self.reused, self.expired,
+                    self.unhealthy)
+
+        for item in removed:
+            self._close(item)
+
+        return result
+
+
 class SQLConnections(object):
 
-    def __init__(self, maximum=4):
+    def __init__(self, maximum=4, pool=None):
         self.connections = []
         self.maximum = maximum
+        self.pool = pool
 
         settings = global_settings()
 
@@ -598,7 +888,7 @@ class SQLConnections(object):
             # longest amount of time.
 
             if len(self.connections) == self.maximum:
-                connection = self.connections.pop(0)[1]
+                dropped_key, connection = self.connections.pop(0)
 
                 internal_metric('Supportability/Python/DatabaseUtils/Counts/'
                                 'drop_database_connection', 1)
@@ -608,10 +898,13 @@ class SQLConnections(object):
                             'reached maximum of %r.',
                             connection.database.client, self.maximum)
 
-                connection.cleanup()
+                self._release(dropped_key, connection)
 
-            connection = SQLConnection(database,
-                    database.connect(*args, **kwargs))
+            if self.pool is not None:
+                connection = self.pool.acquire(database, args, kwargs)
+            else:
+                connection = SQLConnection(database,
+                        database.connect(*args, **kwargs))
 
             self.connections.append((key, connection))
 
@@ -628,10 +921,16 @@ class SQLConnections(object):
             _logger.debug('Cleaning up SQL connections cache %r.', self)
 
         for key, connection in self.connections:
-            connection.cleanup()
+            self._release(key, connection)
 
         self.connections = []
 
+    def _release(self, key, connection):
+        if self.pool is not None:
+            self.pool.release(key, connection)
+        else:
+            connection.cleanup()
+
     def __enter__(self):
         return self
 
@@ -757,14 +1056,290 @@ def explain_plan(connections, sql_statement, connect_params, cursor_params,
     if sql_statement.operation not in database.explain_stmts:
         return
 
-    details = _explain_plan(connections, sql_statement.sql, database,
-            connect_params, cursor_params, sql_parameters, execute_params)
+    # Explain plans are cached for a period, so that the same statement
+    # isn't explained against the database on every harvest. Where the
+    # background worker is enabled, a plan which isn't already cached
+    # is obtained off the harvest thread, to be used on a later harvest.
+
+    settings = global_settings()
+
+    key = _explain_plan_key(sql_statement, connect_params)
+
+    found, details = _explain_plans.get(key)
+
+    if not found:
+        job = (sql_statement.sql, database, connect_params, cursor_params,
+                sql_parameters, execute_params)
+
+        if (key is not None and settings.transaction_tracer.explain_plan_async
+                and settings.transaction_tracer.explain_plan_cache_ttl > 0):
+            _explain_plan_worker.submit(key, job)
+            return
+
+        details = _explain_plan(connections, *job)
+
+        _explain_plans.put(key, details)
 
     if details is not None and sql_format != 'raw':
         return _obfuscate_explain_plan(database, *details)
 
     return details
 
+
+def _explain_plan_key(sql_statement, connect_params):
+    args, kwargs = connect_params
+
+    # Connection parameters can be anything the database client accepts,
+    # so results can't be cached where they aren't hashable.
+
+    try:
+        key = (sql_statement.database.client, sql_statement.identifier,
+                args, frozenset(six.iteritems(kwargs or {})))
+        hash(key)
+    except TypeError:
+        return None
+
+    return key
+
+
+class ExplainPlanCache(object):
+
+    """Cache of explain plans keyed on the statement identifier and the
+    parameters used to connect to the database. The explain plan details
+    are held prior to any obfuscation, with a plan of None indicating the
+    explain plan could not be obtained. Plans are expired once older than
+    the 'transaction_tracer.explain_plan_cache_ttl' setting.
+
+    """
+
+    def __init__(self):
+        settings = global_settings()
+
+        self._plans = LRUCache(settings.agent_limits.sql_explain_plan_cache_size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns a tuple of whether a current plan was found for the
+        key, and the plan.
+
+        """
+
+        if key is None:
+            return False, None
+
+        with self._lock:
+            entry = self._plans.get(key)
+
+            if entry is not None and entry[0] > time.time():
+                self.hits += 1
+                return True, entry[1]
+
+            self.misses += 1
+
+        return False, None
+
+    def put(self, key, details):
+        if key is None:
+            return
+
+        settings = global_settings()
+
+        ttl = settings.transaction_tracer.explain_plan_cache_ttl
+
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            self._plans.maxsize = settings.agent_limits.sql_explain_plan_cache_size
+            self._plans.put(key, (time.time() + ttl, details))
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+    def stats(self):
+        """Returns the counts of hits, misses and evictions since the
+        cache was created.
+
+        """
+
+        with self._lock:
+            return self.hits, self.misses, self._plans.stats(reset=False)[2]
+
+
+class ExplainPlanWorker(object):
+
+    """Runs explain plans on a background daemon thread, storing the
+    results in the explain plan cache. Requests for an explain plan
+    already waiting to be run are ignored, and once the number waiting
+    reaches the size of the explain plan cache, further requests are
+    dropped. Database connections are held only for as long as there
+    are requests waiting.
+
+    """
+
+    def __init__(self, name='NR-Explain-Plan-Worker'):
+        self._name = name
+        self._thread = None
+        self._queue = deque()
+        self._pending = set()
+        self._condition = threading.Condition(threading.Lock())
+        self._shutdown = False
+        self.dropped = 0
+
+    def submit(self, key, job):
+        settings = global_settings()
+
+        with self._condition:
+            if self._shutdown:
+                return
+
+            # The worker thread does not survive a fork, so requests left
+            # waiting for it in a child process would never be run. They
+            # are discarded and a new worker thread is started.
+
+            if self._thread is not None and not self._thread.is_alive():
+                self._thread = None
+                self._queue.clear()
+                self._pending.clear()
+
+            if key in self._pending:
+                return
+
+            if len(self._queue) >= settings.agent_limits.sql_explain_plan_cache_size:
+                self.dropped += 1
+                return
+
+            self._queue.append((key, job))
+            self._pending.add(key)
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker,
+                        name=self._name)
+                self._thread.daemon = True
+                self._thread.start()
+
+            self._condition.notify()
+
+    def _next(self):
+        with self._condition:
+            if self._shutdown or not self._queue:
+                return None
+            return self._queue.popleft()
+
+    def _done(self, key):
+        with self._condition:
+            self._pending.discard(key)
+            self._condition.notify_all()
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._shutdown:
+                    self._condition.wait()
+
+                if self._shutdown:
+                    return
+
+            settings = global_settings()
+
+            try:
+                with SQLConnections(settings.agent_limits.max_sql_connections,
+                        _sql_connection_pool) as connections:
+                    item = self._next()
+
+                    while item is not None:
+                        key, job = item
+
+                        try:
+                            _explain_plans.put(key, _explain_plan(connections, *job))
+                        finally:
+                            self._done(key)
+
+                        item = self._next()
+
+            except Exception:
+                _logger.exception('Unexpected exception in explain plan '
+                        'worker thread.')
+
+    def wait(self, timeout=None):
+        """Waits until there are no explain plans waiting to be run,
+        returning whether that was the case before the timeout expired.
+
+        """
+
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        with self._condition:
+            while self._pending:
+                if timeout is None:
+                    self._condition.wait()
+                    continue
+
+                remaining = deadline - time.time()
+
+                if remaining <= 0:
+                    return False
+
+                self._condition.wait(remaining)
+
+        return True
+
+    def stats(self):
+        """Returns the count of dropped requests since the worker was
+        created.
+
+        """
+
+        with self._condition:
+            return self.dropped
+
+    def shutdown(self):
+        with self._condition:
+            self._shutdown = True
+            self._queue.clear()
+            self._pending.clear()
+            self._condition.notify_all()
+
+
+_explain_plans = ExplainPlanCache()
+_explain_plan_worker = ExplainPlanWorker()
+_sql_connection_pool = SQLConnectionPool()
+
+
+def sql_connection_pool():
+    return _sql_connection_pool
+
+
+def explain_plan_cache_stats():
+    """Returns the counts of hits, misses and evictions for the cache of
+    explain plans, and of requests to the background explain plan worker
+    which were dropped, since the process started. The cache and worker
+    are shared by all applications, so the counts are not reset when read.
+
+    """
+
+    return _explain_plans.stats() + (_explain_plan_worker.stats(),)
+
+
+def sql_connection_pool_stats():
+    """Closes any pooled explain plan connections which have been idle
+    for too long, and returns the counts of connections created, reused,
+    expired and found to be unhealthy since the process started. The pool
+    is shared by all applications, so the counts are not reset when read.
+
+    """
+
+    return _sql_connection_pool.stats()
+
+
+def shutdown_explain_plan_worker():
+    _explain_plan_worker.shutdown()
+    _sql_connection_pool.close()
+
 # Wrapper for information about a specific database.
 
 
@@ -822,6 +1397,8 @@ class SQLStatement(object):
         self._normalized = None
         self._identifier = None
 
+        self._fused_lexer = global_settings().debug.sql_lexer == 'fused'
+
         if isinstance(sql, six.binary_type):
             try:
                 sql = sql.decode('utf-8')
@@ -855,20 +1432,30 @@ class SQLStatement(object):
     @property
     def uncommented(self):
         if self._uncommented is None:
-            self._uncommented = _uncomment_sql(self.sql)
+            if self._fused_lexer:
+                self._uncommented = _uncomment_sql_fused(self.sql)
+            else:
+                self._uncommented = _uncomment_sql(self.sql)
         return self._uncommented
 
     @property
     def obfuscated(self):
         if self._obfuscated is None:
-            self._obfuscated = _uncomment_sql(_obfuscate_sql(self.sql,
-                self.database))
+            if self._fused_lexer:
+                self._obfuscated = _uncomment_sql_fused(
+                        _obfuscate_sql_fused(self.sql, self.database))
+            else:
+                self._obfuscated = _uncomment_sql(_obfuscate_sql(self.sql,
+                    self.database))
         return self._obfuscated
 
     @property
     def normalized(self):
         if self._normalized is None:
-            self._normalized = _normalize_sql(self.obfuscated)
+            if self._fused_lexer:
+                self._normalized = _normalize_sql_fused(self.obfuscated)
+            else:
+                self._normalized = _normalize_sql(self.obfuscated)
         return self._normalized
 
     @property
@@ -888,7 +1475,13 @@ class SQLStatement(object):
             return self.obfuscated
 
 
-_sql_statements = weakref.WeakValueDictionary()
+# Parsed statements are held strongly so that the results of obfuscating,
+# normalizing and parsing frequently executed queries are retained from one
+# transaction to the next. The size of the cache is bounded by the setting
+# agent_limits.sql_statement_cache_size. This is a count of entries and not
+# of bytes, so memory used grows with the length of the cached statements.
+
+_sql_statements = LRUCache(global_settings().agent_limits.sql_statement_cache_size)
 
 
 def sql_statement(sql, dbapi2_module):
@@ -902,6 +1495,17 @@ def sql_statement(sql, dbapi2_module):
     database = SQLDatabase(dbapi2_module)
     result = SQLStatement(sql, database)
 
-    _sql_statements[key] = result
+    _sql_statements.maxsize = global_settings().agent_limits.sql_statement_cache_size
+    _sql_statements.put(key, result)
 
     return result
+
+
+def sql_statement_cache_stats():
+    """Returns the counts of hits, misses and evictions for the cache of
+    parsed SQL statements since the process started. The cache is shared
+    by all applications, so the counts are not reset when read.
+
+    """
+
+    return _sql_statements.stats(reset=False)
@@ -87,6 +87,9 @@ class FunctionNode(_FunctionNode, GenericNodeMixin):
             for metric in child.time_metrics(stats, root, self):
                 yield metric
 
+    def trace_node_children(self):
+        return self.children
+
     def trace_node(self, stats, root, connections):
 
         name = '%s/%s' % (self.group, self.name)
@@ -98,12 +101,7 @@ class FunctionNode(_FunctionNode, GenericNodeMixin):
 
         root.trace_node_count += 1
 
-        children = []
-
-        for child in self.children:
-            if root.trace_node_count > root.trace_node_limit:
-                break
-            children.append(child.trace_node(stats, root, connections))
+        children = self.child_trace_nodes(stats, root, connections)
 
         params = self.get_trace_segment_params(
                 root.settings, params=self.params)
@@ -30,6 +30,9 @@ _GraphQLResolverNode = namedtuple('_GraphQLNode',
     'exclusive', 'guid', 'agent_attributes', 'user_attributes', 'product'])
 
 class GraphQLNodeMixin(GenericNodeMixin):
+    def trace_node_children(self):
+        return self.children
+
     def trace_node(self, stats, root, connections):
         name = root.string_table.cache(self.name)
 
@@ -38,14 +41,7 @@ class GraphQLNodeMixin(GenericNodeMixin):
 
         root.trace_node_count += 1
 
-        children = []
-
-        # Now for the children
-
-        for child in self.children:
-            if root.trace_node_count > root.trace_node_limit:
-                break
-            children.append(child.trace_node(stats, root, connections))
+        children = self.child_trace_nodes(stats, root, connections)
 
         # Agent attributes
         params = self.get_trace_segment_params(root.settings)
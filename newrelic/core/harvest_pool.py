@@ -0,0 +1,140 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""This module implements the bounded pool of threads used to perform
+independent parts of a harvest concurrently.
+
+"""
+
+import logging
+import sys
+import threading
+from collections import deque
+
+_logger = logging.getLogger(__name__)
+
+
+class _HarvestBatch(object):
+    def __init__(self, tasks):
+        self.pending = deque(enumerate(tasks))
+        self.outcomes = [None] * len(self.pending)
+        self.remaining = len(self.pending)
+        self.condition = threading.Condition(threading.Lock())
+
+    def run_next(self):
+        """Runs the next pending task of the batch, returning False if
+        there are no pending tasks left.
+
+        """
+
+        try:
+            index, task = self.pending.popleft()
+        except IndexError:
+            return False
+
+        try:
+            outcome = (task(), None)
+        except Exception:
+            outcome = (None, sys.exc_info())
+
+        with self.condition:
+            self.outcomes[index] = outcome
+            self.remaining -= 1
+            if not self.remaining:
+                self.condition.notify_all()
+
+        return True
+
+    def wait(self):
+        with self.condition:
+            while self.remaining:
+                self.condition.wait()
+
+
+class HarvestPool(object):
+    """A bounded pool of daemon threads for running harvest tasks.
+
+    The thread which calls run() also executes tasks from the batch it
+    submitted rather than just waiting on the workers. A task is only
+    ever waited on once it has been started, so a task may itself call
+    run() with a further batch without the pool deadlocking, even when
+    every worker thread is busy.
+
+    """
+
+    def __init__(self, max_workers, name="NR-Harvest-Worker"):
+        self._max_workers = max_workers
+        self._name = name
+        self._workers = []
+        self._batches = deque()
+        self._condition = threading.Condition(threading.Lock())
+        self._shutdown = False
+
+    def _start_workers(self):
+        while len(self._workers) < self._max_workers:
+            worker = threading.Thread(target=self._worker, name="%s-%d" % (self._name, len(self._workers)))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while not self._batches and not self._shutdown:
+                    self._condition.wait()
+
+                if self._shutdown:
+                    return
+
+                batch = self._batches.popleft()
+
+            try:
+                batch.run_next()
+            except Exception:
+                _logger.exception("Unexpected exception in harvest worker thread.")
+
+    def run(self, tasks):
+        """Runs each of the callables in tasks, returning a list with the
+        outcome of each in the same order. An outcome is a tuple of the
+        value returned by the task and, if the task raised an exception,
+        the exception info for it in place of None.
+
+        """
+
+        batch = _HarvestBatch(tasks)
+
+        if batch.remaining > 1:
+            with self._condition:
+                if not self._shutdown:
+                    self._start_workers()
+
+                    # Queue one entry per task beyond the first, which is
+                    # always run by the calling thread.
+
+                    self._batches.extend([batch] * (batch.remaining - 1))
+                    self._condition.notify(batch.remaining - 1)
+
+        while batch.run_next():
+            pass
+
+        batch.wait()
+
+        return batch.outcomes
+
+    def shutdown(self):
+        with self._condition:
+            self._shutdown = True
+            self._batches.clear()
+            self._condition.notify_all()
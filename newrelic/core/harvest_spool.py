@@ -0,0 +1,366 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""This module implements the on disk spool used to hold data which
+could not be sent to the data collector during a harvest, so that it can
+be sent later, including from a subsequent run of the process.
+
+Data is appended as records to segment files. The oldest segments are
+discarded when the spool exceeds its maximum size and any segment older
+than the maximum age is discarded. When replayed, each segment is first
+claimed by renaming it, before being memory mapped and its records sent
+in order. A segment left claimed by a process which exited while
+replaying it is returned to the spool.
+
+"""
+
+import errno
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+_logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".segment"
+CLAIMED_SUFFIX = ".replay"
+
+# Each record consists of a header holding the length of the method name,
+# the length of the payload and a CRC of both, followed by the method
+# name and the payload. A record truncated by the process exiting part
+# way through writing it is detected and ignored when replaying.
+
+_RECORD_HEADER = struct.Struct(">HII")
+
+# Segments are rotated once they reach this size, capped at a fraction
+# of the maximum size of the spool so that discarding the oldest segment
+# doesn't discard most of the spooled data.
+
+MAXIMUM_SEGMENT_SIZE = 1024 * 1024
+
+# A claimed segment is returned to the spool once the process which
+# claimed it has exited, or if it has been claimed for longer than this,
+# in case the process id has since been reused.
+
+CLAIM_TIMEOUT = 10 * 60
+
+
+def _process_exists(pid):
+    if os.name == "nt":
+        # Sending a signal can't be used to check for a process without
+        # affecting it on Windows, so rely on the claim timing out.
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except OSError as exc:
+        return exc.errno != errno.ESRCH
+
+    return True
+
+
+class HarvestSpool(object):
+    def __init__(self, directory, max_size, max_age):
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+
+        self._segment_size = min(MAXIMUM_SEGMENT_SIZE, max(max_size // 8, 1))
+        self._segment = None
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+        self.spooled = 0
+        self.replayed = 0
+        self.dropped = 0
+
+    def _segments(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+
+        # Segment names begin with a fixed width timestamp, so sorting
+        # them by name orders them from oldest to newest.
+
+        return [os.path.join(self.directory, name) for name in sorted(names) if name.endswith(SEGMENT_SUFFIX)]
+
+    def _claimed_segments(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+
+        return [os.path.join(self.directory, name) for name in names if name.endswith(CLAIMED_SUFFIX)]
+
+    @staticmethod
+    def _claim_path(path):
+        return "%s.%08x%s" % (path, os.getpid(), CLAIMED_SUFFIX)
+
+    def _adopt_claimed_segments(self):
+        # Returns segments left claimed by a process which exited part
+        # way through replaying them to the spool, returning the total
+        # size of the segments still claimed by other processes. Any
+        # records sent before the process exited will be sent again.
+
+        now = time.time()
+        total = 0
+
+        for claimed in self._claimed_segments():
+            path, pid = claimed[: -len(CLAIMED_SUFFIX)].rsplit(".", 1)
+
+            try:
+                stat = os.stat(claimed)
+                pid = int(pid, 16)
+            except (OSError, ValueError):
+                continue
+
+            if now - stat.st_ctime <= CLAIM_TIMEOUT and (pid == os.getpid() or _process_exists(pid)):
+                total += stat.st_size
+                continue
+
+            try:
+                os.rename(claimed, path)
+            except OSError:
+                # Already adopted by another process.
+                pass
+
+        return total
+
+    def _new_segment(self):
+        self._sequence += 1
+        name = "%016x-%08x-%08x%s" % (int(time.time() * 1000), os.getpid(), self._sequence, SEGMENT_SUFFIX)
+        return os.path.join(self.directory, name)
+
+    def _count_dropped(self, path):
+        count = 0
+        for _ in _read_records(path):
+            count += 1
+        self.dropped += count
+
+    def _enforce_limits(self, size):
+        # Discards expired segments and then the oldest segments until
+        # there is space for a record of the given size.
+
+        total = self._adopt_claimed_segments()
+
+        now = time.time()
+        segments = []
+
+        for path in self._segments():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            if now - stat.st_mtime > self.max_age:
+                self._remove_segment(path)
+            else:
+                segments.append((path, stat.st_size))
+                total += stat.st_size
+
+        for path, segment_size in segments:
+            if total + size <= self.max_size:
+                break
+
+            self._remove_segment(path)
+            total -= segment_size
+
+        return total + size <= self.max_size
+
+    def _remove_segment(self, path):
+        try:
+            self._count_dropped(path)
+            os.remove(path)
+        except (IOError, OSError):
+            pass
+
+        if path == self._segment:
+            self._segment = None
+
+    def _append(self, data):
+        if self._segment is not None:
+            try:
+                if os.path.getsize(self._segment) + len(data) > self._segment_size:
+                    self._segment = None
+            except OSError:
+                self._segment = None
+
+        if self._segment is None:
+            self._segment = self._new_segment()
+
+        with open(self._segment, "ab") as segment:
+            segment.write(data)
+            segment.flush()
+            os.fsync(segment.fileno())
+
+    def write(self, method, payload):
+        """Appends the payload for the specified method to the spool.
+        Returns False if the payload could not be spooled.
+
+        """
+
+        payload = bytes(payload)
+        record = method.encode("utf-8") + payload
+        data = _RECORD_HEADER.pack(len(record) - len(payload), len(payload), zlib.crc32(record) & 0xFFFFFFFF) + record
+
+        with self._lock:
+            try:
+                if not os.path.isdir(self.directory):
+                    os.makedirs(self.directory)
+
+                if not self._enforce_limits(len(data)):
+                    self.dropped += 1
+                    return False
+
+                self._append(data)
+
+            except (IOError, OSError):
+                _logger.exception("Unable to write data for %r to the harvest spool in %r.", method, self.directory)
+                self.dropped += 1
+                return False
+
+            self.spooled += 1
+
+        return True
+
+    def replay(self, send):
+        """Calls send with the method name and payload of each spooled
+        record, oldest first. If send raises an exception, the record it
+        failed on and any not yet sent are returned to the spool and the
+        exception is raised.
+
+        """
+
+        with self._lock:
+            if os.path.isdir(self.directory):
+                self._enforce_limits(0)
+
+            segments = self._segments()
+
+            # New records should not be appended to a segment which is
+            # being replayed.
+
+            self._segment = None
+
+        for path in segments:
+            claimed = self._claim_path(path)
+
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                # Already claimed by another process replaying the
+                # spool for the same application.
+                continue
+
+            # The claimed segment is only removed once all its records
+            # have been sent, or the unsent records have been restored.
+            # This includes when send is interrupted by an exception
+            # such as SystemExit. If they can't be restored, it is left
+            # to be returned to the spool once the claim times out.
+
+            offset = 0
+            records = _read_records(claimed)
+            try:
+                for method, payload, offset in records:
+                    send(method, payload)
+
+                    with self._lock:
+                        self.replayed += 1
+
+            except BaseException:
+                records.close()
+                if self._restore(path, claimed, offset):
+                    self._remove_claimed(claimed)
+                raise
+
+            self._remove_claimed(claimed)
+
+    @staticmethod
+    def _remove_claimed(claimed):
+        try:
+            os.remove(claimed)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _restore(path, claimed, offset):
+        # Puts the records from offset onwards in a claimed segment back
+        # in place of the original segment. Returns whether successful.
+
+        try:
+            with open(claimed, "rb") as segment:
+                segment.seek(offset)
+                data = segment.read()
+
+            if data:
+                with open(path, "wb") as segment:
+                    segment.write(data)
+
+        except (IOError, OSError):
+            _logger.exception("Unable to return unsent data to the harvest spool in %r.", os.path.dirname(path))
+            return False
+
+        return True
+
+    def stats(self):
+        """Returns the number of records spooled, replayed and dropped
+        since the last call, resetting the counts.
+
+        """
+
+        with self._lock:
+            counts = (self.spooled, self.replayed, self.dropped)
+            self.spooled = self.replayed = self.dropped = 0
+
+        return counts
+
+
+def _read_records(path):
+    """Generator yielding the method name, payload and offset of each
+    complete record in a segment file.
+
+    """
+
+    with open(path, "rb") as segment:
+        size = os.fstat(segment.fileno()).st_size
+        if not size:
+            return
+
+        data = mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            offset = 0
+            while offset + _RECORD_HEADER.size <= size:
+                method_length, payload_length, crc = _RECORD_HEADER.unpack_from(data, offset)
+                start = offset + _RECORD_HEADER.size
+                end = start + method_length + payload_length
+
+                if end > size:
+                    break
+
+                record = data[start:end]
+                if zlib.crc32(record) & 0xFFFFFFFF != crc:
+                    break
+
+                yield record[:method_length].decode("utf-8"), record[method_length:], offset
+
+                offset = end
+
+        finally:
+            data.close()
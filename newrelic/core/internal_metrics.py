@@ -96,6 +96,16 @@ def internal_metric(name, value):
     if metrics is not None:
         metrics.record_custom_metric(name, value)
 
+def merge_internal_metrics(metrics):
+    """Merges a set of metrics, provided as an iterable of tuples of the
+    metric name and accumulated stats, into the current internal metrics.
+
+    """
+
+    current = getattr(_context, 'current', None)
+    if current is not None:
+        current.merge_custom_metrics(metrics)
+
 def internal_count_metric(name, count):
     """Create internal metric where only count has a value.
 
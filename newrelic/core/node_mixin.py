@@ -12,12 +12,66 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import random
+
 import newrelic.core.attribute as attribute
 
 from newrelic.core.attribute_filter import (DST_SPAN_EVENTS,
         DST_TRANSACTION_SEGMENTS)
 
 
+def _generate_guid():
+    # 16-digit random hex. Padded with zeros in the front.
+    return "%016x" % random.getrandbits(64)
+
+
+class SpanAttributeResolver(object):
+    """Resolves the attributes of nodes which are sent on span events.
+
+    The nodes of a transaction mostly share a small number of distinct
+    sets of attribute names, so which names pass the attribute filter is
+    worked out once for each distinct set and reused for every span with
+    the same set of names.
+
+    """
+
+    def __init__(self, attribute_filter):
+        self.attribute_filter = attribute_filter
+        self._agent_names = {}
+        self._user_names = {}
+
+    def _resolve(self, attr_dict, cache, resolve_names, attr_class):
+        attrs = attr_class()
+
+        if not attr_dict:
+            return attrs
+
+        # Attributes with a value of None are never sent, so are left out
+        # of the set of names before filtering.
+
+        attr_names = tuple(attr_name for attr_name, attr_value
+                in attr_dict.items() if attr_value is not None)
+
+        try:
+            resolved_names = cache[attr_names]
+        except KeyError:
+            resolved_names = cache[attr_names] = resolve_names(
+                    attr_names, self.attribute_filter, DST_SPAN_EVENTS)
+
+        for attr_name in resolved_names:
+            attrs[attr_name] = attr_dict[attr_name]
+
+        return attrs
+
+    def agent_attributes(self, attr_dict, attr_class=dict):
+        return self._resolve(attr_dict, self._agent_names,
+                attribute.resolve_agent_attribute_names, attr_class)
+
+    def user_attributes(self, attr_dict, attr_class=dict):
+        return self._resolve(attr_dict, self._user_names,
+                attribute.resolve_user_attribute_names, attr_class)
+
+
 class GenericNodeMixin(object):
     @property
     def processed_user_attributes(self):
@@ -31,6 +85,31 @@ class GenericNodeMixin(object):
             u_attrs[k] = v
         return u_attrs
 
+    def trace_node_children(self):
+        """Returns the child nodes which can appear beneath this node in
+        a transaction trace. Most types of node are always leaf nodes in
+        a transaction trace, even where they have children.
+
+        """
+
+        return ()
+
+    def child_trace_nodes(self, stats, root, connections):
+        # Where the transaction has more nodes than the limit, only those
+        # selected by the transaction node are materialized.
+
+        selection = root.trace_node_selected
+
+        children = []
+
+        for child in self.trace_node_children():
+            if root.trace_node_count > root.trace_node_limit:
+                break
+            if selection is None or id(child) in selection:
+                children.append(child.trace_node(stats, root, connections))
+
+        return children
+
     def get_trace_segment_params(self, settings, params=None):
         _params = attribute.resolve_agent_attributes(
                 self.agent_attributes,
@@ -53,11 +132,17 @@ class GenericNodeMixin(object):
                 settings,
                 base_attrs=None,
                 parent_guid=None,
-                attr_class=dict):
+                attr_class=dict,
+                attribute_resolver=None,
+                guid=None):
+        # Traces only generate a guid when it is needed during the
+        # transaction, so nodes are given one when their span event is
+        # generated if they don't already have one.
+
         i_attrs = base_attrs and base_attrs.copy() or attr_class()
         i_attrs['type'] = 'Span'
         i_attrs['name'] = self.name
-        i_attrs['guid'] = self.guid
+        i_attrs['guid'] = guid or self.guid or _generate_guid()
         i_attrs['timestamp'] = int(self.start_time * 1000)
         i_attrs['duration'] = self.duration
         i_attrs['category'] = 'generic'
@@ -65,17 +150,25 @@ class GenericNodeMixin(object):
         if parent_guid:
             i_attrs['parentId'] = parent_guid
 
-        a_attrs = attribute.resolve_agent_attributes(
-                self.agent_attributes,
-                settings.attribute_filter,
-                DST_SPAN_EVENTS,
-                attr_class=attr_class)
+        if attribute_resolver is None:
+            a_attrs = attribute.resolve_agent_attributes(
+                    self.agent_attributes,
+                    settings.attribute_filter,
+                    DST_SPAN_EVENTS,
+                    attr_class=attr_class)
 
-        u_attrs = attribute.resolve_user_attributes(
-                self.processed_user_attributes,
-                settings.attribute_filter,
-                DST_SPAN_EVENTS,
-                attr_class=attr_class)
+            u_attrs = attribute.resolve_user_attributes(
+                    self.processed_user_attributes,
+                    settings.attribute_filter,
+                    DST_SPAN_EVENTS,
+                    attr_class=attr_class)
+
+        else:
+            a_attrs = attribute_resolver.agent_attributes(
+                    self.agent_attributes, attr_class)
+
+            u_attrs = attribute_resolver.user_attributes(
+                    self.processed_user_attributes, attr_class)
 
         # intrinsics, user attrs, agent attrs
         return [i_attrs, u_attrs, a_attrs]
@@ -83,19 +176,32 @@ class GenericNodeMixin(object):
     def span_events(self,
             settings, base_attrs=None, parent_guid=None, attr_class=dict):
 
-        yield self.span_event(
-                settings,
-                base_attrs=base_attrs,
-                parent_guid=parent_guid,
-                attr_class=attr_class)
+        # The tree of nodes is walked using an explicit stack rather
+        # than recursively, as for deep trees the cost of passing each
+        # event up through a chain of nested generators would dominate.
+        # Events are still generated depth first in the order of the
+        # children of each node.
 
-        for child in self.children:
-            for event in child.span_events(
+        attribute_resolver = SpanAttributeResolver(settings.attribute_filter)
+
+        stack = [(self, parent_guid)]
+
+        while stack:
+            node, parent_guid = stack.pop()
+
+            guid = node.guid or _generate_guid()
+
+            yield node.span_event(
                     settings,
                     base_attrs=base_attrs,
-                    parent_guid=self.guid,
-                    attr_class=attr_class):
-                yield event
+                    parent_guid=parent_guid,
+                    attr_class=attr_class,
+                    attribute_resolver=attribute_resolver,
+                    guid=guid)
+
+            children = node.children
+            if children:
+                stack.extend([(child, guid) for child in reversed(children)])
 
 
 class DatastoreNodeMixin(GenericNodeMixin):
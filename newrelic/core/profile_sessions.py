@@ -13,12 +13,13 @@
 # limitations under the License.
 
 import base64
+import inspect
 import logging
 import os
 import threading
 import time
 import zlib
-from collections import defaultdict, deque
+from collections import defaultdict
 
 import newrelic
 import newrelic.packages.six as six
@@ -35,88 +36,19 @@ _logger = logging.getLogger(__name__)
 
 AGENT_PACKAGE_DIRECTORY = os.path.dirname(newrelic.__file__) + "/"
 
+# Code flags for functions whose frames can be suspended and resumed by
+# a different caller, changing the stack above them.
+
+_CO_RESUMABLE = 0
+for _name in ("CO_GENERATOR", "CO_COROUTINE", "CO_ITERABLE_COROUTINE", "CO_ASYNC_GENERATOR"):
+    _CO_RESUMABLE |= getattr(inspect, _name, 0)
+
 
 class SessionState(object):
     RUNNING = 1
     FINISHED = 2
 
 
-def format_stack_trace(frame, thread_category):
-    """Formats the frame obj into a list of stack trace tuples."""
-
-    stack_trace = deque()
-
-    while frame:
-        # The value frame.f_code.co_firstlineno is the first line of
-        # code in the file for the specified function. The value
-        # frame.f_lineno is the actual line which is being executed
-        # at the time the stack frame was being viewed.
-
-        code = frame.f_code
-
-        filename = intern(code.co_filename)
-        func_name = intern(code.co_name)
-        first_line = code.co_firstlineno
-
-        real_line = frame.f_lineno
-
-        # Set ourselves up to process next frame back up the stack.
-
-        frame = frame.f_back
-
-        # So as to make it more obvious to the user as to what their
-        # code is doing, we drop out stack frames related to the
-        # agent instrumentation. Don't do this for the agent threads
-        # though as we still need to seem them in that case so can
-        # debug what the agent itself is doing.
-
-        if thread_category != "AGENT" and filename.startswith(AGENT_PACKAGE_DIRECTORY):
-            continue
-
-        if not stack_trace:
-            # Add the fake leaf node with line number of where the
-            # code was executing at the point of the sample. This
-            # could be actual Python code within the function, or
-            # more likely showing the point where a call is being
-            # made into a C function wrapped as Python object. The
-            # latter can occur because we will not see stack frames
-            # when calling into C functions.
-
-            stack_trace.appendleft((filename, func_name, real_line, real_line))
-
-        # Add the actual node for the function being called at this
-        # level in the stack frames.
-
-        stack_trace.appendleft((filename, func_name, first_line, real_line))
-
-    return stack_trace
-
-
-def collect_stack_traces(include_nr_threads=False):
-    """Generator that yields the (thread category, stack trace) of all the
-    python threads.
-
-    """
-    for (txn, thread_id, thread_category, frame) in trace_cache().active_threads():
-
-        # Skip NR Threads unless explicitly requested.
-
-        if (thread_category == "AGENT") and (not include_nr_threads):
-            continue
-
-        stack_trace = format_stack_trace(frame, thread_category)
-
-        # Skip over empty stack traces. This is merely for optimization.
-        #
-        # It saves us from adding an empty deque to the txn obj, which will be
-        # discarded later on during call tree merge.
-
-        if not stack_trace:
-            continue
-
-        yield thread_category, stack_trace
-
-
 class ProfileSessionManager(object):
     """Singleton class that manages multiple profile sessions. Do NOT
     instantiate directly from this class. Instead use profile_session_manager()
@@ -202,8 +134,7 @@ class ProfileSessionManager(object):
 
         with self._lock:
             if (self.full_profile_session is not None) and (app_name == self.full_profile_app):
-                self.full_profile_session.state = SessionState.FINISHED
-                self.full_profile_session.actual_stop_time_s = time.time()
+                self.full_profile_session.finish()
                 self.finished_sessions[app_name].append(self.full_profile_session)
                 self.full_profile_session = None
                 self.full_profile_app = None
@@ -245,13 +176,15 @@ class ProfileSessionManager(object):
 
         while True:
 
-            for category, stack in collect_stack_traces(self.profile_agent_code):
+            # Merge the stack traces into the call tree only for the
+            # full_profile_session. The lock is held so the session can't
+            # be finished by the harvest thread while being sampled.
 
-                # Merge the stack_trace to the call tree only for
-                # full_profile_session.
+            with self._lock:
+                session = self.full_profile_session
 
-                if self.full_profile_session:
-                    self.full_profile_session.update_call_tree(category, stack)
+                if session and session.state == SessionState.RUNNING:
+                    session.sample_stacks(trace_cache().active_threads(), self.profile_agent_code)
 
             self.update_profile_sessions()
 
@@ -296,47 +229,231 @@ class ProfileSession(object):
         self.reset_profile_data()
 
     def reset_profile_data(self):
+        # The call tree is held in arrays indexed by node id. Each node
+        # refers to a method by its id in the method table, with the
+        # methods being interned by the code object and line number of
+        # the stack frames they were first seen in. The call buckets
+        # map the method id of each root node to the node id. The last
+        # stack sampled for each thread is kept so that samples of an
+        # unchanged stack only need to be counted.
+
         self.call_buckets = {"REQUEST": {}, "AGENT": {}, "BACKGROUND": {}, "OTHER": {}}
-        self._node_list = []
+        self._methods = []
+        self._method_ids = {}
+        self._node_methods = []
+        self._node_counts = []
+        self._node_depths = []
+        self._node_children = []
+        self._node_ignored = []
+        self._thread_stacks = {}
         self.start_time_s = time.time()
         self.sample_count = 0
         self.transaction_count = 0
 
-    def update_call_tree(self, bucket_type, stack_trace):
-        """Merge a single call stack trace into a call tree bucket. If
-        no appropriate call tree is found then create a new call tree.
-        An appropriate call tree will have the same root node as the
-        last method in the stack trace.
+    def _intern_method(self, code, line):
+        """Adds the methods for a stack frame executing the given line of
+        a code object to the method table. Returns the method ids for the
+        frame as the leaf of the stack and otherwise, along with whether
+        the frame is agent code and whether it can be resumed from a
+        different caller.
 
         """
 
-        self.transaction_count += 1
+        # The value code.co_firstlineno is the first line of code in
+        # the file for the specified function. The line number is the
+        # actual line which is being executed at the time the stack
+        # frame was being viewed. The leaf node is a fake node showing
+        # the point where the code was executing, as we will not see
+        # stack frames when calling into C functions.
 
-        depth = 1
-        try:
-            bucket = self.call_buckets[bucket_type]
-        except KeyError:
-            return False
+        filename = intern(code.co_filename)
+        func_name = intern(code.co_name)
+
+        methods = self._methods
+
+        leaf_id = len(methods)
+        methods.append((filename, func_name, line, line))
+
+        method_id = len(methods)
+        methods.append((filename, func_name, code.co_firstlineno, line))
+
+        # Hashing a code object is expensive, so the methods are looked
+        # up by the id of the code object instead. The code object is
+        # kept with the entry so the id can't be reused by another.
+
+        entry = (
+            method_id,
+            leaf_id,
+            filename.startswith(AGENT_PACKAGE_DIRECTORY),
+            bool(code.co_flags & _CO_RESUMABLE),
+            code,
+        )
+
+        self._method_ids[(id(code), line)] = entry
+
+        return entry
+
+    def _add_node(self, method_id, depth):
+        node = len(self._node_methods)
+
+        self._node_methods.append(method_id)
+        self._node_counts.append(0)
+        self._node_depths.append(depth)
+        self._node_children.append({})
+        self._node_ignored.append(False)
+
+        return node
+
+    def _count_repeated_stack(self, thread_stack):
+        # Adds the samples of a stack which were counted against the
+        # thread, but not yet against the nodes along its path.
+
+        repeats = thread_stack[4]
+
+        if repeats:
+            node_counts = self._node_counts
+            for node in thread_stack[3]:
+                node_counts[node] += repeats
+
+            thread_stack[4] = 0
+
+    def finish(self):
+        """Marks the session as finished. The last stacks sampled for each
+        thread are counted in the call tree and then released, as they
+        hold references to the frames of the threads, and so everything
+        referenced from the local variables of those frames.
+
+        """
+
+        self.state = SessionState.FINISHED
+        self.actual_stop_time_s = time.time()
+
+        for thread_stack in six.itervalues(self._thread_stacks):
+            self._count_repeated_stack(thread_stack)
+
+        self._thread_stacks = {}
+
+    def sample_stacks(self, threads, include_nr_threads=False):
+        """Merges a sample of the stacks of the given threads into the
+        call tree buckets. The threads are given as the (transaction,
+        thread id, thread category, frame) of each as yielded by the
+        trace cache.
+
+        """
+
+        method_ids = self._method_ids
+        node_counts = self._node_counts
+        node_children = self._node_children
 
-        for method in stack_trace:
-            call_tree = bucket.get(method)
+        previous_stacks = self._thread_stacks
+        thread_stacks = self._thread_stacks = {}
 
-            if call_tree is None:
-                call_tree = CallTree(method, depth=depth)
-                self._node_list.append(call_tree)
-                bucket[method] = call_tree
+        for _, thread_id, category, frame in threads:
 
-            call_tree.call_count += 1
+            # Skip NR Threads unless explicitly requested.
+
+            if category == "AGENT" and not include_nr_threads:
+                continue
+
+            if frame is None:
+                continue
+
+            line = frame.f_lineno
+
+            # While the same frame is executing the same line as in the
+            # previous sample, none of the frames above it can have
+            # changed either, unless one of them can be resumed from a
+            # different caller. The path through the call tree recorded
+            # for the thread can then be counted again without walking
+            # the stack, with the counts of the nodes along the path only
+            # being updated once the stack changes.
+
+            previous = previous_stacks.get(thread_id)
+
+            if previous is not None and previous[0] is frame and previous[1] == line and previous[2] == category:
+                previous[4] += 1
+
+                self.transaction_count += 1
+                thread_stacks[thread_id] = previous
+                continue
+
+            try:
+                bucket = self.call_buckets[category]
+            except KeyError:
+                continue
+
+            top, top_line = frame, line
+            skip_agent_code = category != "AGENT"
+            resumable = False
+            entries = []
+
+            while frame is not None:
+                code = frame.f_code
+                entry = method_ids.get((id(code), frame.f_lineno))
+
+                if entry is None:
+                    entry = self._intern_method(code, frame.f_lineno)
+
+                # Set ourselves up to process next frame back up the stack.
+
+                frame = frame.f_back
+
+                if entry[3]:
+                    resumable = True
+
+                # So as to make it more obvious to the user as to what their
+                # code is doing, we drop out stack frames related to the
+                # agent instrumentation. Don't do this for the agent threads
+                # though as we still need to seem them in that case so can
+                # debug what the agent itself is doing.
+
+                if entry[2] and skip_agent_code:
+                    continue
+
+                entries.append(entry)
+
+            # Skip over empty stack traces.
+
+            if not entries:
+                continue
+
+            self.transaction_count += 1
+
+            # The topmost frame is also added as the leaf node with line
+            # number of where the code was executing.
+
+            methods = [entry[0] for entry in reversed(entries)]
+            methods.append(entries[0][1])
 
             # The call depth is incremented on each recursive call so we
             # know the depth of the call stack. We use this later when
             # pruning nodes if go over the limit. Specifically, the deepest
             # and least used nodes will be prune first.
 
-            bucket = call_tree.children
-            depth += 1
+            children = bucket
+            path = []
 
-        return True
+            for depth, method_id in enumerate(methods, 1):
+                node = children.get(method_id)
+
+                if node is None:
+                    node = children[method_id] = self._add_node(method_id, depth)
+
+                node_counts[node] += 1
+                path.append(node)
+
+                children = node_children[node]
+
+            # The frame is kept so its identity can be compared in the
+            # next sample. Holding it means it can't be freed and its id
+            # reused by a different frame in the meantime.
+
+            if not resumable:
+                thread_stacks[thread_id] = [top, top_line, category, path, 0]
+
+        for thread_id, thread_stack in six.iteritems(previous_stacks):
+            if thread_stacks.get(thread_id) is not thread_stack:
+                self._count_repeated_stack(thread_stack)
 
     def _prune_call_trees(self, limit):
         """Prune the number of profile nodes we send up to the data
@@ -345,7 +462,7 @@ class ProfileSession(object):
 
         """
 
-        if len(self._node_list) <= limit:
+        if len(self._node_methods) <= limit:
             return
 
         # We sort the profile nodes based on call count, but also take
@@ -370,10 +487,35 @@ class ProfileSession(object):
         # categories in UI, the duplicates only appear as one after the
         # UI merges them.
 
-        self._node_list.sort(key=lambda x: (x.call_count, -x.depth), reverse=True)
+        counts = self._node_counts
+        depths = self._node_depths
+
+        nodes = sorted(range(len(counts)), key=lambda x: (counts[x], -depths[x]), reverse=True)
 
-        for node in self._node_list[limit:]:
-            node.ignore = True
+        for node in nodes[limit:]:
+            self._node_ignored[node] = True
+
+    def _flatten_call_tree(self, node):
+        filename, func_name, func_line, exec_line = self._methods[self._node_methods[node]]
+
+        # func_line is the first line of a function and exec_line is the line
+        # inside that function that is currently being executed.  On the leaf
+        # nodes the exec_line will be different from the func_line. Such nodes
+        # are labeled with an @ sign in the second element of the tuple.
+
+        if func_line == exec_line:
+            method_data = (filename, "@%s#%s" % (func_name, func_line), exec_line)
+        else:
+            method_data = (filename, "%s#%s" % (func_name, func_line), exec_line)
+
+        ignored = self._node_ignored
+
+        return [
+            method_data,
+            self._node_counts[node],
+            0,
+            [self._flatten_call_tree(x) for x in self._node_children[node].values() if not ignored[x]],
+        ]
 
     def profile_data(self):
 
@@ -399,7 +541,7 @@ class ProfileSession(object):
             # empty buckets.
 
             if bucket:
-                flat_tree[category] = [x.flatten() for x in bucket.values()]
+                flat_tree[category] = [self._flatten_call_tree(x) for x in bucket.values()]
                 thread_count += len(bucket)
 
         # Construct the actual final data for sending. The actual call
@@ -438,30 +580,5 @@ class ProfileSession(object):
         return profile
 
 
-class CallTree(object):
-    def __init__(self, method_data, call_count=0, depth=1):
-        self.method_data = method_data
-        self.call_count = call_count
-        self.children = {}
-
-        self.depth = depth
-        self.ignore = False
-
-    def flatten(self):
-        filename, func_name, func_line, exec_line = self.method_data
-
-        # func_line is the first line of a function and exec_line is the line
-        # inside that function that is currently being executed.  On the leaf
-        # nodes the exec_line will be different from the func_line. Such nodes
-        # are labeled with an @ sign in the second element of the tuple.
-
-        if func_line == exec_line:
-            method_data = (filename, "@%s#%s" % (func_name, func_line), exec_line)
-        else:
-            method_data = (filename, "%s#%s" % (func_name, func_line), exec_line)
-
-        return [method_data, self.call_count, 0, [x.flatten() for x in self.children.values() if not x.ignore]]
-
-
 def profile_session_manager():
     return ProfileSessionManager.singleton()
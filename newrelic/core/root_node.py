@@ -38,6 +38,9 @@ class RootNode(_RootNode, GenericNodeMixin):
             i_attrs['tracingVendors'] = self.tracing_vendors
         return span
 
+    def trace_node_children(self):
+        return self.children
+
     def trace_node(self, stats, root, connections):
 
         name = self.path
@@ -47,12 +50,7 @@ class RootNode(_RootNode, GenericNodeMixin):
 
         root.trace_node_count += 1
 
-        children = []
-
-        for child in self.children:
-            if root.trace_node_count > root.trace_node_limit:
-                break
-            children.append(child.trace_node(stats, root, connections))
+        children = self.child_trace_nodes(stats, root, connections)
 
         params = self.get_trace_segment_params(root.settings)
 
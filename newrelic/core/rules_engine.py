@@ -15,6 +15,15 @@
 import re
 from collections import namedtuple
 
+from newrelic.common.lru_cache import LRUCache
+
+# Default bound on the number of names for which the result of applying
+# the normalization rules is memoized by each rules engine.
+
+DEFAULT_CACHE_SIZE = 2000
+
+_UNFUSIBLE_RE = re.compile(r"\\[1-9]|\(\?P|\(\?\(|\(\?[aiLmsux]+\)")
+
 _NormalizationRule = namedtuple(
     "_NormalizationRule",
     ["match_expression", "replacement", "ignore", "eval_order", "terminate_chain", "each_segment", "replace_all"],
@@ -34,7 +43,22 @@ class NormalizationRule(_NormalizationRule):
 
 
 class RulesEngine(object):
-    def __init__(self, rules):
+    """Applies an ordered chain of normalization rules to names.
+
+    A new rules engine is created with the rules received from the data
+    collector each time the agent connects, so the results of applying
+    the rules to each name can be memoized for the life of the engine.
+    The cache is bounded as names such as URLs can be unbounded in number.
+
+    To reduce the cost of names which are not cached, runs of consecutive
+    rules which are not applied to each segment are also fused into a
+    single regular expression which matches if any rule in the run could
+    match. If it does not match, no rule in the run could have modified
+    the name, so the whole run can be skipped.
+
+    """
+
+    def __init__(self, rules, cache_size=DEFAULT_CACHE_SIZE):
         self.__rules = []
 
         for rule in rules:
@@ -46,10 +70,63 @@ class RulesEngine(object):
 
         self.__rules = sorted(self.__rules, key=lambda rule: rule.eval_order)
 
+        self.__rule_runs = self._fuse_rules(self.__rules)
+
+        self.cache = LRUCache(cache_size)
+
     @property
     def rules(self):
         return self.__rules
 
+    @staticmethod
+    def _fuse_rules(rules):
+        # Group the sorted rules into runs, each being a tuple of a pre
+        # match regular expression and the rules in the run. Rules which
+        # are applied to each segment, or whose patterns can't be safely
+        # combined with others, are placed in a run of their own without
+        # a pre match.
+
+        runs = []
+        current = []
+
+        def flush():
+            if not current:
+                return
+
+            if len(current) > 1:
+                pattern = "|".join("(?:%s)" % rule.match_expression for rule in current)
+                try:
+                    prematch = re.compile(pattern, re.IGNORECASE)
+                except re.error:
+                    prematch = None
+            else:
+                prematch = None
+
+            if prematch is not None:
+                runs.append((prematch, tuple(current)))
+            else:
+                runs.extend((None, (rule,)) for rule in current)
+
+            del current[:]
+
+        for rule in rules:
+            # Back references, conditional group references and named
+            # groups are relative to the whole pattern and inline flags
+            # apply to the whole pattern, so can't be combined with other
+            # patterns.
+
+            fusible = not rule.each_segment and not _UNFUSIBLE_RE.search(rule.match_expression)
+
+            if fusible:
+                current.append(rule)
+            else:
+                flush()
+                runs.append((None, (rule,)))
+
+        flush()
+
+        return tuple(runs)
+
     def normalize(self, string):
         # URLs are supposed to be ASCII but can get a
         # URL with illegal non ASCII characters. As the
@@ -63,9 +140,35 @@ class RulesEngine(object):
         if isinstance(string, bytes):
             string = string.decode("Latin-1")
 
+        if not self.__rules:
+            return (string, False)
+
+        result = self.cache.get(string)
+
+        if result is None:
+            result = self._normalize(string)
+            self.cache.put(string, result)
+
+        return result
+
+    def _normalize(self, string):
         final_string = string
         ignore = False
-        for rule in self.__rules:
+
+        for prematch, rules in self.__rule_runs:
+            if prematch is not None and not prematch.search(final_string):
+                continue
+
+            final_string, ignore, terminate = self._apply_rules(rules, final_string, ignore)
+
+            if terminate:
+                break
+
+        return (final_string, ignore)
+
+    @staticmethod
+    def _apply_rules(rules, final_string, ignore):
+        for rule in rules:
             if rule.each_segment:
                 matched = False
 
@@ -100,9 +203,9 @@ class RulesEngine(object):
                 ignore = ignore or rule.ignore
 
             if matched and rule.terminate_chain:
-                break
+                return (final_string, ignore, True)
 
-        return (final_string, ignore)
+        return (final_string, ignore, False)
 
 
 class SegmentCollapseEngine(object):
@@ -19,7 +19,6 @@ data whereby it is sent to the core application.
 
 """
 
-import base64
 import copy
 import logging
 import operator
@@ -29,12 +28,13 @@ import time
 import traceback
 import warnings
 import zlib
+from functools import partial
 from heapq import heapify, heapreplace
 
 import newrelic.packages.six as six
 from newrelic.api.settings import STRIP_EXCEPTION_MESSAGE
 from newrelic.api.time_trace import get_linking_metadata
-from newrelic.common.encoding_utils import json_encode
+from newrelic.common.encoding_utils import json_encode_compressed
 from newrelic.common.object_names import parse_exc_info
 from newrelic.common.streaming_utils import StreamBuffer
 from newrelic.core.attribute import (
@@ -52,6 +52,7 @@ from newrelic.core.error_collector import TracedError
 from newrelic.core.log_event_node import LogEventNode
 from newrelic.core.metric import TimeMetric
 from newrelic.core.stack_trace import exception_stack
+from newrelic.core.trace_node import RootNode, TraceNode
 
 _logger = logging.getLogger(__name__)
 
@@ -67,6 +68,25 @@ EVENT_HARVEST_METHODS = {
 }
 
 
+def _expand_trace_data(item):
+    # When encoding a transaction trace, trace nodes are expanded down to
+    # those whose children are all leaf nodes. Each such subtree is then
+    # encoded in one go, keeping the number of chunks small while still
+    # never building the JSON for the whole tree as a single string.
+
+    if isinstance(item, RootNode):
+        return True
+
+    if isinstance(item, TraceNode):
+        item = item.children
+
+    for child in item:
+        if isinstance(child, TraceNode) and child.children:
+            return True
+
+    return False
+
+
 def c2t(count=0, total=0.0, min=0.0, max=0.0, sum_of_squares=0.0):
     return (count, total, total, min, max, sum_of_squares)
 
@@ -79,7 +99,10 @@ class ApdexStats(list):
     # application as that and list as base class means it encodes direct
     # to JSON as we need it. In this case only the first 3 entries are
     # strictly used for the metric. The 4th and 5th entries are set to
-    # be the apdex_t value in use at the time.
+    # be the apdex_t value in use at the time. No per instance dictionary
+    # is needed so it is suppressed to reduce the memory held per metric.
+
+    __slots__ = ()
 
     def __init__(self, satisfying=0, tolerating=0, frustrating=0, apdex_t=0.0):
         super(ApdexStats, self).__init__([satisfying, tolerating, frustrating, apdex_t, apdex_t, 0])
@@ -115,7 +138,10 @@ class TimeStats(list):
 
     # Is based on a list of length 6 as all metrics are sent to the core
     # application as that and list as base class means it encodes direct
-    # to JSON as we need it.
+    # to JSON as we need it. No per instance dictionary is needed so it is
+    # suppressed to reduce the memory held per metric.
+
+    __slots__ = ()
 
     def __init__(
         self,
@@ -182,6 +208,8 @@ class TimeStats(list):
 
 
 class CountStats(TimeStats):
+    __slots__ = ()
+
     def merge_stats(self, other):
         self[0] += other[0]
 
@@ -227,6 +255,20 @@ class CustomMetrics(object):
 
         return six.iteritems(self.__stats_table)
 
+    def merge_custom_metrics(self, metrics):
+        """Merges in a set of value metrics. The metrics should be
+        provided as an iterable where each item is a tuple of the metric
+        name and the accumulated stats for the metric.
+
+        """
+
+        for name, other in metrics:
+            stats = self.__stats_table.get(name)
+            if stats is None:
+                self.__stats_table[name] = other
+            else:
+                stats.merge_stats(other)
+
     def reset_metric_stats(self):
         """Resets the accumulated statistics back to initial state for
         metric data.
@@ -236,6 +278,8 @@ class CustomMetrics(object):
 
 
 class SlowSqlStats(list):
+    __slots__ = ()
+
     def __init__(self):
         super(SlowSqlStats, self).__init__([0, 0, 0, 0, None])
 
@@ -330,28 +374,77 @@ class SampledDataSet(object):
             priority = random.random()  # nosec
 
         entry = (priority, self.num_seen, sample)
-        if self.num_seen == self.capacity:
-            self.pq.append(entry)
-            self.heap = self.heap or heapify(self.pq) or True
-        elif not self.heap:
+        if not self.heap:
             self.pq.append(entry)
-        else:
-            sampled = self.should_sample(priority)
-            if not sampled:
-                return
+            if len(self.pq) >= self.capacity:
+                heapify(self.pq)
+                self.heap = True
+        elif priority > self.pq[0][0]:
             heapreplace(self.pq, entry)
 
+    def add_deferred(self, factory, priority=None):
+        """Adds the sample returned by calling factory, but only calls it
+        where the sample would be retained. Returns whether the sample was
+        added. Used where creating the sample is costly, so that work is
+        not done for samples which would immediately be discarded.
+
+        """
+
+        if priority is None:
+            priority = random.random()  # nosec
+
+        if self.capacity <= 0 or (self.heap and priority <= self.pq[0][0]):
+            self.num_seen += 1
+            return False
+
+        self.add(factory(), priority)
+        return True
+
     def merge(self, other_data_set, priority=None):
         if priority is None:
             priority = -1
 
-        for original_priority, seen_at, sample in other_data_set.pq:
-            self.add(sample, max(priority, original_priority))
+        num_seen = self.num_seen
+        self.num_seen += other_data_set.num_seen
 
-        # Merge the num_seen from the other_data_set, but take care not to
-        # double-count the actual samples of other_data_set since the .add
-        # call above will add one to self.num_seen each time
-        self.num_seen += other_data_set.num_seen - other_data_set.num_samples
+        if self.capacity <= 0:
+            return
+
+        # Samples from the other data set are numbered as if they had
+        # been added in turn, with those which would be rejected given
+        # the current minimum priority being dropped up front.
+
+        pq = self.pq
+
+        entries = [
+            (max(priority, original_priority), num_seen + i, sample)
+            for i, (original_priority, _, sample) in enumerate(other_data_set.pq, 1)
+        ]
+
+        if self.heap:
+            minimum = pq[0][0]
+            entries = [entry for entry in entries if entry[0] > minimum]
+
+        if len(pq) + len(entries) < self.capacity:
+            pq.extend(entries)
+
+        elif self.heap and len(entries) * 16 < len(pq):
+            # Only a few samples to merge into a much larger reservoir,
+            # so replace the minimum priority sample for each in turn.
+
+            for entry in entries:
+                if entry[0] > pq[0][0]:
+                    heapreplace(pq, entry)
+
+        else:
+            # Keep the highest priority samples across both by sorting,
+            # which is done in C, and leaves the samples in an order
+            # which satisfies the heap invariant.
+
+            pq.extend(entries)
+            pq.sort()
+            del pq[: -self.capacity]
+            self.heap = True
 
 
 class LimitedDataSet(list):
@@ -992,9 +1085,10 @@ class StatsEngine(object):
             self.__transaction_errors = self.__transaction_errors[: settings.agent_limits.errors_per_harvest]
 
         if error_collector.capture_events and error_collector.enabled and settings.collect_error_events:
-            events = transaction.error_events(self.__stats_table)
-            for event in events:
-                self._error_events.add(event, priority=transaction.priority)
+            for error in transaction.errors:
+                self._error_events.add_deferred(
+                    partial(transaction.error_event, error, self.__stats_table), priority=transaction.priority
+                )
 
         # Capture any sql traces if transaction tracer enabled.
 
@@ -1034,8 +1128,9 @@ class StatsEngine(object):
             self._synthetics_events.add(event)
 
         elif settings.collect_analytics_events and settings.transaction_events.enabled:
-            event = transaction.transaction_event(self.__stats_table)
-            self._transaction_events.add(event, priority=transaction.priority)
+            self._transaction_events.add_deferred(
+                partial(transaction.transaction_event, self.__stats_table), priority=transaction.priority
+            )
 
         # Merge in custom events
 
@@ -1046,11 +1141,19 @@ class StatsEngine(object):
 
         if settings.distributed_tracing.enabled and settings.span_events.enabled and settings.collect_span_events:
             if settings.infinite_tracing.enabled:
-                for event in transaction.span_protos(settings):
-                    self._span_stream.put(event)
+                self._span_stream.put_many(transaction.span_protos(settings))
             elif transaction.sampled:
-                for event in transaction.span_events(self.__settings):
-                    self._span_events.add(event, priority=transaction.priority)
+                # All span events for the transaction share the same
+                # priority, so if the first would be rejected, so would
+                # all of them and they needn't be created at all.
+
+                span_events = self._span_events
+
+                if span_events.capacity > 0 and span_events.should_sample(transaction.priority):
+                    for event in transaction.span_events(self.__settings):
+                        span_events.add(event, priority=transaction.priority)
+                else:
+                    span_events.num_seen += transaction.span_count()
 
         # Merge in log events
 
@@ -1063,7 +1166,7 @@ class StatsEngine(object):
         ):
             self._log_events.merge(transaction.log_events, priority=transaction.priority)
 
-    def record_log_event(self, message, level=None, timestamp=None, priority=None):
+    def record_log_event(self, message, level=None, timestamp=None, priority=None, attributes=None):
         settings = self.__settings
         if not (
             settings
@@ -1083,11 +1186,14 @@ class StatsEngine(object):
 
         message = truncate(message, MAX_LOG_MESSAGE_LENGTH)
 
+        if attributes is None:
+            attributes = get_linking_metadata()
+
         event = LogEventNode(
             timestamp=timestamp,
             level=level,
             message=message,
-            attributes=get_linking_metadata(),
+            attributes=attributes,
         )
 
         if priority is None:
@@ -1127,13 +1233,29 @@ class StatsEngine(object):
                 list(six.iteritems(self.__stats_table)),
             )
 
+        # The same metric name is usually recorded under many scopes, so
+        # the result of normalizing each name is cached for the duration
+        # of the call. The stats held in the stats table are only copied
+        # when renaming causes two metrics to collapse together, as that
+        # is the only case where the original stats would be modified.
+
         if normalizer is not None:
+            normalized_names = {}
+            merged_keys = set()
+
             for key, value in six.iteritems(self.__stats_table):
-                key = (normalizer(key[0])[0], key[1])
+                name = normalized_names.get(key[0])
+                if name is None:
+                    name = normalized_names[key[0]] = normalizer(key[0])[0]
+
+                key = (name, key[1])
                 stats = normalized_stats.get(key)
                 if stats is None:
-                    normalized_stats[key] = copy.copy(value)
+                    normalized_stats[key] = value
                 else:
+                    if key not in merged_keys:
+                        stats = normalized_stats[key] = copy.copy(stats)
+                        merged_keys.add(key)
                     stats.merge_stats(value)
         else:
             normalized_stats = self.__stats_table
@@ -1220,15 +1342,10 @@ class StatsEngine(object):
             if slow_sql_node.database_name:
                 params["database_name"] = slow_sql_node.database_name
 
-            json_data = json_encode(params)
-
             level = self.__settings.agent_limits.data_compression_level
             level = level or zlib.Z_DEFAULT_COMPRESSION
 
-            params_data = base64.standard_b64encode(zlib.compress(six.b(json_data), level))
-
-            if six.PY3:
-                params_data = params_data.decode("Latin-1")
+            params_data = json_encode_compressed(params, level)
 
             # Limit the length of any SQL that is reported back.
 
@@ -1303,8 +1420,10 @@ class StatsEngine(object):
                     # not be one which would not be included in the
                     # transaction trace because limit was reached.
 
+                    selection = trace.trace_node_selection(maximum_nodes)
+
                     if (
-                        node.node_count < maximum_nodes
+                        (selection is None or id(node) in selection)
                         and node.connect_params
                         and node.statement.operation in node.statement.database.explain_stmts
                     ):
@@ -1334,17 +1453,10 @@ class StatsEngine(object):
             if self.__settings.debug.log_transaction_trace_payload:
                 _logger.debug("Encoding slow transaction data where payload=%r.", data)
 
-            json_data = json_encode(data)
-
             level = self.__settings.agent_limits.data_compression_level
             level = level or zlib.Z_DEFAULT_COMPRESSION
 
-            zlib_data = zlib.compress(six.b(json_data), level)
-
-            pack_data = base64.standard_b64encode(zlib_data)
-
-            if six.PY3:
-                pack_data = pack_data.decode("Latin-1")
+            pack_data = json_encode_compressed(data, level, expand=_expand_trace_data)
 
             root = transaction_trace.root
 
@@ -1399,17 +1511,10 @@ class StatsEngine(object):
         if self.__settings.debug.log_transaction_trace_payload:
             _logger.debug("Encoding slow transaction data where payload=%r.", data)
 
-        json_data = json_encode(data)
-
         level = self.__settings.agent_limits.data_compression_level
         level = level or zlib.Z_DEFAULT_COMPRESSION
 
-        zlib_data = zlib.compress(six.b(json_data), level)
-
-        pack_data = base64.standard_b64encode(zlib_data)
-
-        if six.PY3:
-            pack_data = pack_data.decode("Latin-1")
+        pack_data = json_encode_compressed(data, level, expand=_expand_trace_data)
 
         root = transaction_trace.root
 
@@ -1453,7 +1558,9 @@ class StatsEngine(object):
         # streams are never reset after instantiation
         if reset_stream:
             self._span_stream = StreamBuffer(
-                settings.infinite_tracing.span_queue_size, batching=settings.infinite_tracing.batching
+                settings.infinite_tracing.span_queue_size,
+                batching=settings.infinite_tracing.batching,
+                batch_timeout=settings.infinite_tracing.batch_timeout,
             )
 
     def reset_metric_stats(self):
@@ -1627,6 +1734,26 @@ class StatsEngine(object):
         self._merge_sql(snapshot)
         self._merge_traces(snapshot)
 
+    def merge_shard(self, shard):
+        """Merges data from a stats engine shard. Shard is an instance of
+        StatsEngine that has accumulated data from many transactions, so
+        unlike merge() all sampled events it holds are merged in.
+        """
+
+        if not self.__settings:
+            return
+
+        self.merge_metric_stats(shard)
+        self._merge_transaction_events(shard, rollback=True)
+        self._merge_synthetics_events(shard)
+        self._merge_error_events(shard)
+        self._merge_error_traces(shard)
+        self._merge_custom_events(shard)
+        self._merge_span_events(shard)
+        self._merge_log_events(shard)
+        self._merge_sql(shard)
+        self._merge_traces(shard)
+
     def rollback(self, snapshot):
         """Performs a "rollback" merge after a failed harvest. Snapshot is a
         copy of the main StatsEngine data that we attempted to harvest, but
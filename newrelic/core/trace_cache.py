@@ -33,6 +33,11 @@ try:
 except ImportError:
     from collections import MutableMapping
 
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+
 from newrelic.core.config import global_settings
 from newrelic.core.loop_node import LoopNode
 
@@ -104,6 +109,16 @@ class TraceCache(MutableMapping):
     def __init__(self):
         self._cache = weakref.WeakValueDictionary()
 
+        # Traces running in asyncio tasks, indexed by the ID of the event
+        # loop of the task and then by the key they were saved under, so
+        # that blocking of an event loop can be attributed without
+        # scanning every trace in the cache. Entries are not removed when
+        # a trace is replaced, so must be checked against the cache. The
+        # loop ID is used as not all event loops support weak references.
+
+        self._loop_traces = {}
+        self._loop_traces_lock = threading.Lock()
+
     def __repr__(self):
         return "<%s object at 0x%x %s>" % (self.__class__.__name__, id(self), str(dict(self.items())))
 
@@ -141,6 +156,7 @@ class TraceCache(MutableMapping):
         trace = self.current_trace()
         if trace:
             self[id(task)] = trace
+            self._index_trace(id(task), trace)
 
     def task_stop(self, task):
         self.pop(id(task), None)
@@ -189,7 +205,7 @@ class TraceCache(MutableMapping):
                 # obtain a name for as being 'OTHER'.
 
                 thread = threading._active.get(thread_id)
-                if thread is not None and thread.getName().startswith("NR-"):
+                if thread is not None and thread.name.startswith("NR-"):
                     yield None, thread_id, "AGENT", frame
                 else:
                     yield None, thread_id, "OTHER", frame
@@ -245,52 +261,120 @@ class TraceCache(MutableMapping):
 
         thread_id = trace.thread_id
 
-        if thread_id in self:
-            cache_root = self[thread_id].root
-            if cache_root and cache_root is not trace.root and not cache_root.exited:
-                # Cached trace exists and has a valid root still
-                _logger.error(
-                    "Runtime instrumentation error. Attempt to "
-                    "save a trace from an inactive transaction. "
-                    "Report this issue to New Relic support.\n%s",
-                    "".join(traceback.format_stack()[:-1]),
-                )
-
-                raise TraceCacheActiveTraceError("transaction already active")
+        self._check_active_root(self.get(thread_id), trace)
 
         self[thread_id] = trace
 
+        self._save_coroutine(trace)
+
+    def _check_active_root(self, current, trace):
+        if current is None:
+            return
+
+        cache_root = current.root
+        if cache_root and cache_root is not trace.root and not cache_root.exited:
+            # Cached trace exists and has a valid root still
+            _logger.error(
+                "Runtime instrumentation error. Attempt to "
+                "save a trace from an inactive transaction. "
+                "Report this issue to New Relic support.\n%s",
+                "".join(traceback.format_stack()[:-1]),
+            )
+
+            raise TraceCacheActiveTraceError("transaction already active")
+
+    def _save_coroutine(self, trace):
         # We judge whether we are actually running in a coroutine by
-        # seeing if the current thread ID is actually listed in the set
-        # of all current frames for executing threads. If we are
-        # executing within a greenlet, then thread.get_ident() will
-        # return the greenlet identifier. This will not be a key in
-        # dictionary of all current frames because that will still be
-        # the original standard thread which all greenlets are running
-        # within.
+        # comparing the ID the trace was saved under against the ID of
+        # the current thread. If we are executing within a greenlet or
+        # an asyncio task, then current_thread_id() will have returned
+        # the identifier of the greenlet or task instead. This avoids
+        # using sys._current_frames(), which takes a snapshot of the
+        # frames of every thread in the process. Where gevent has patched
+        # thread.get_ident() to return the identifier of the greenlet
+        # the IDs will match, so the current greenlet is also checked in
+        # the same way as in current_thread_id().
 
         trace._greenlet = None
 
-        if hasattr(sys, "_current_frames"):
-            if thread_id not in sys._current_frames():
-                if self.greenlet:
-                    trace._greenlet = weakref.ref(self.greenlet.getcurrent())
+        in_coroutine = trace.thread_id != thread.get_ident()
+
+        if not in_coroutine and self.greenlet:
+            current = self.greenlet.getcurrent()
+            in_coroutine = current is not None and bool(current.parent)
 
-                if self.asyncio and not hasattr(trace, "_task"):
-                    task = current_task(self.asyncio)
-                    trace._task = task
+        if in_coroutine:
+            if self.greenlet:
+                trace._greenlet = weakref.ref(self.greenlet.getcurrent())
+
+            if self.asyncio and not hasattr(trace, "_task"):
+                task = current_task(self.asyncio)
+                trace._task = task
+
+            self._index_trace(trace.thread_id, trace)
+
+    def _index_trace(self, key, trace):
+        task = getattr(trace, "_task", None)
+        loop = get_event_loop(task)
+        if loop is None:
+            return
+
+        loop_traces = self._loop_traces
+
+        with self._loop_traces_lock:
+            traces = loop_traces.get(id(loop))
+            if traces is None:
+                # Drop event loops with no traces remaining, as these
+                # will most likely have been closed.
+
+                for loop_id, _traces in list(loop_traces.items()):
+                    if not _traces:
+                        del loop_traces[loop_id]
+
+                traces = loop_traces[id(loop)] = weakref.WeakValueDictionary()
+
+            traces[key] = trace
+
+    def _event_loop_traces(self, loop):
+        """Returns the distinct traces in the cache which are running in
+        asyncio tasks on the given event loop.
+
+        """
+
+        traces = self._loop_traces.get(id(loop))
+        if loop is None or traces is None:
+            return []
+
+        result = []
+        seen = set()
+
+        for wr in traces.valuerefs():
+            trace = wr()
+
+            if (
+                trace is not None
+                and trace not in seen
+                and self._cache.get(wr.key) is trace
+                and getattr(trace, "_task", None) is not None
+                and get_event_loop(trace._task) is loop
+            ):
+                seen.add(trace)
+                result.append(trace)
+
+        return result
 
     def pop_current(self, trace):
         """Restore the trace's parent under the thread ID of the current
         executing thread."""
 
-        if hasattr(trace, "_task"):
-            delattr(trace, "_task")
-
         thread_id = trace.thread_id
         parent = trace.parent
         self[thread_id] = parent
 
+        if hasattr(trace, "_task"):
+            delattr(trace, "_task")
+            self._index_trace(thread_id, parent)
+
     def complete_root(self, root):
         """Completes a trace specified by the given root
 
@@ -299,25 +383,7 @@ class TraceCache(MutableMapping):
 
         """
 
-        if hasattr(root, "_task"):
-            if root.has_outstanding_children():
-                task_ids = (id(task) for task in all_tasks(self.asyncio))
-
-                to_complete = []
-
-                for task_id in task_ids:
-                    entry = self.get(task_id)
-
-                    if entry and entry is not root and entry.root is root:
-                        to_complete.append(entry)
-
-                while to_complete:
-                    entry = to_complete.pop()
-                    if entry.parent and entry.parent is not root:
-                        to_complete.append(entry.parent)
-                    entry.__exit__(None, None, None)
-
-            root._task = None
+        self._complete_tasks(root)
 
         thread_id = root.thread_id
 
@@ -341,6 +407,27 @@ class TraceCache(MutableMapping):
         del self[thread_id]
         root._greenlet = None
 
+    def _complete_tasks(self, root):
+        if hasattr(root, "_task"):
+            if root.has_outstanding_children():
+                task_ids = (id(task) for task in all_tasks(self.asyncio))
+
+                to_complete = []
+
+                for task_id in task_ids:
+                    entry = self.get(task_id)
+
+                    if entry and entry is not root and entry.root is root:
+                        to_complete.append(entry)
+
+                while to_complete:
+                    entry = to_complete.pop()
+                    if entry.parent and entry.parent is not root:
+                        to_complete.append(entry.parent)
+                    entry.__exit__(None, None, None)
+
+            root._task = None
+
     def record_event_loop_wait(self, start_time, end_time):
         transaction = self.current_transaction()
         if not transaction or not transaction.settings:
@@ -359,27 +446,15 @@ class TraceCache(MutableMapping):
 
         fetch_name = transaction._cached_path.path
         roots = set()
-        seen = set()
 
         task = getattr(transaction.root_span, "_task", None)
         loop = get_event_loop(task)
 
-        for trace in self.values():
-            if trace in seen:
-                continue
-
-            # If the trace is on a different transaction and it's asyncio
-            if (
-                trace.transaction is not transaction
-                and getattr(trace, "_task", None) is not None
-                and get_event_loop(trace._task) is loop
-                and trace._is_leaf()
-            ):
+        for trace in self._event_loop_traces(loop):
+            # If the trace is on a different transaction
+            if trace.transaction is not transaction and trace._is_leaf():
                 trace.exclusive -= duration
                 roots.add(trace.root)
-                seen.add(trace)
-
-        seen = None
 
         for root in roots:
             guid = "%016x" % random.getrandbits(64)
@@ -452,6 +527,136 @@ class TraceCache(MutableMapping):
         return bool(self._cache.__len__())
 
 
+class ContextVarTraceCache(TraceCache):
+    """Trace cache which tracks the current trace in a context variable.
+
+    Looking up the current trace or transaction reads the context
+    variable directly rather than first working out the ID of the
+    current greenlet, task or thread. Each thread, asyncio task and
+    greenlet (greenlet 0.4.17 or later) has its own context, with tasks
+    inheriting the current trace from the context they were created in.
+
+    The mapping of IDs to traces is still maintained so that the thread
+    profiler and lookups of a trace by ID continue to work.
+
+    """
+
+    def __init__(self):
+        super(ContextVarTraceCache, self).__init__()
+
+        # The context holds the ID the trace was saved under, along with
+        # a weak reference to the trace so that abandoned traces can
+        # still be garbage collected as with the mapping.
+
+        self._context = contextvars.ContextVar("newrelic_trace_cache", default=None)
+
+    def _current(self):
+        current = self._context.get()
+        trace = current and current[1]()
+
+        # A trace can be exited from outside of the context it is current
+        # in, such as when a transaction completes traces still running
+        # in other tasks. The mapping then holds the trace which replaced
+        # it, as that is the only state which could be updated.
+
+        if trace is not None and trace.exited:
+            return self.get(current[0])
+
+        return trace
+
+    def _set_current(self, thread_id, trace):
+        if trace is None:
+            self._context.set(None)
+        else:
+            self._context.set((thread_id, weakref.ref(trace)))
+
+    def current_transaction(self):
+        trace = self._current()
+        return trace and trace.transaction
+
+    def current_trace(self):
+        return self._current()
+
+    def prepare_for_root(self):
+        trace = self._current()
+        if not trace:
+            return None
+
+        if not hasattr(trace, "_task"):
+            return trace
+
+        task = current_task(self.asyncio)
+        if (task is not None and id(trace._task) != id(task)) or (trace.root and trace.root.exited):
+            self._cache.pop(self.current_thread_id(), None)
+            self._context.set(None)
+            return None
+
+        return trace
+
+    def save_trace(self, trace):
+        thread_id = trace.thread_id
+
+        self._check_active_root(self._current(), trace)
+
+        self._set_current(thread_id, trace)
+        self._cache[thread_id] = trace
+
+        self._save_coroutine(trace)
+
+    def pop_current(self, trace):
+        thread_id = trace.thread_id
+        parent = trace.parent
+
+        # A trace which is completed by a child running in a different
+        # task must not replace the current trace of the child.
+
+        current = self._context.get()
+        if current and current[0] == thread_id:
+            self._set_current(thread_id, parent)
+
+        self._cache[thread_id] = parent
+
+        if hasattr(trace, "_task"):
+            delattr(trace, "_task")
+            self._index_trace(thread_id, parent)
+
+    def complete_root(self, root):
+        self._complete_tasks(root)
+
+        current = self._current()
+
+        if current is None:
+            raise TraceCacheNoActiveTraceError("no active trace")
+
+        if root is not current:
+            _logger.error(
+                "Runtime instrumentation error. Attempt to "
+                "drop the root when it is not the current "
+                "trace. Report this issue to New Relic support.\n%s",
+                "".join(traceback.format_stack()[:-1]),
+            )
+
+            raise RuntimeError("not the current trace")
+
+        self._context.set(None)
+        self._cache.pop(root.thread_id, None)
+        root._greenlet = None
+
+    # Traces may also be set directly by ID, such as when propagating
+    # context to another thread. Where this is for the current thread
+    # the context is updated to match.
+
+    def __setitem__(self, key, value):
+        self._cache.__setitem__(key, value)
+        if key == self.current_thread_id():
+            self._set_current(key, value)
+
+    def __delitem__(self, key):
+        self._cache.__delitem__(key)
+        if key == self.current_thread_id():
+            self._context.set(None)
+
+
 _trace_cache = TraceCache()
 
 
@@ -459,6 +664,25 @@ def trace_cache():
     return _trace_cache
 
 
+def use_context_var_trace_cache():
+    """Replaces the trace cache with one which tracks the current trace
+    using a context variable. This must be done before any transactions
+    have been started. Returns False if context variables are not
+    supported by this version of Python.
+
+    """
+
+    global _trace_cache
+
+    if contextvars is None:
+        return False
+
+    if not isinstance(_trace_cache, ContextVarTraceCache):
+        _trace_cache = ContextVarTraceCache()
+
+    return True
+
+
 def greenlet_loaded(module):
     _trace_cache.greenlet = module
 
@@ -22,7 +22,7 @@ from collections import namedtuple
 
 import newrelic.core.error_collector
 import newrelic.core.trace_node
-from newrelic.common.streaming_utils import SpanProtoAttrs
+from newrelic.common.streaming_utils import CACHED_SPAN_INTRINSICS, span_proto_attrs
 from newrelic.core.attribute import create_agent_attributes, create_user_attributes
 from newrelic.core.attribute_filter import (
     DST_ERROR_COLLECTOR,
@@ -370,10 +370,72 @@ class TransactionNode(_TransactionNode):
                 start_time=error.timestamp, path=self.path, message=error.message, type=error.type, parameters=params
             )
 
+    def trace_node_selection(self, limit):
+        """Returns the set of ids of the nodes to be included in the
+        transaction trace where there are more nodes than the limit, or
+        None where all nodes can be included.
+
+        The nodes with the greatest exclusive time are selected, along
+        with the chain of parents needed to reach each of them, so that
+        only the selected nodes need to be materialized.
+
+        """
+
+        cached = getattr(self, "_trace_node_selection", None)
+
+        if cached is not None and cached[0] == limit:
+            return cached[1]
+
+        # The tree is walked breadth first, recording the index of the
+        # parent of each node, with the root node at index zero.
+
+        nodes = [self.root]
+        parents = [None]
+
+        for index, node in enumerate(nodes):
+            children = node.trace_node_children()
+            if children:
+                nodes.extend(children)
+                parents.extend([index] * len(children))
+
+        # The root node is always included along with up to the limit
+        # of further nodes.
+
+        if len(nodes) <= limit + 1:
+            selection = None
+
+        else:
+            selected = set([0])
+            remaining = limit
+
+            exclusive = [node.exclusive for node in nodes]
+            order = sorted(range(1, len(nodes)), key=exclusive.__getitem__, reverse=True)
+
+            for index in order:
+                chain = []
+
+                while index not in selected:
+                    chain.append(index)
+                    index = parents[index]
+
+                if len(chain) <= remaining:
+                    selected.update(chain)
+                    remaining -= len(chain)
+
+                    if not remaining:
+                        break
+
+            selection = set([id(nodes[index]) for index in selected])
+
+        self._trace_node_selection = (limit, selection)
+
+        return selection
+
     def transaction_trace(self, stats, limit, connections):
 
         self.trace_node_count = 0
         self.trace_node_limit = limit
+        self.trace_node_selected = self.trace_node_selection(limit)
 
         start_time = newrelic.core.trace_node.root_start_time(self)
 
@@ -498,47 +560,44 @@ class TransactionNode(_TransactionNode):
         return intrinsics
 
     def error_events(self, stats_table):
+        return [self.error_event(error, stats_table) for error in self.errors]
 
-        errors = []
-        for error in self.errors:
-
-            intrinsics = self.error_event_intrinsics(error, stats_table)
+    def error_event(self, error, stats_table):
 
-            # Add user and agent attributes to event
+        intrinsics = self.error_event_intrinsics(error, stats_table)
 
-            agent_attributes = {}
-            for attr in self.agent_attributes:
-                if attr.destinations & DST_ERROR_COLLECTOR:
-                    agent_attributes[attr.name] = attr.value
+        # Add user and agent attributes to event
 
-            user_attributes = {}
-            for attr in self.user_attributes:
-                if attr.destinations & DST_ERROR_COLLECTOR:
-                    user_attributes[attr.name] = attr.value
+        agent_attributes = {}
+        for attr in self.agent_attributes:
+            if attr.destinations & DST_ERROR_COLLECTOR:
+                agent_attributes[attr.name] = attr.value
 
-            # add error specific agent attributes to this error's agentAttributes
+        user_attributes = {}
+        for attr in self.user_attributes:
+            if attr.destinations & DST_ERROR_COLLECTOR:
+                user_attributes[attr.name] = attr.value
 
-            err_agent_attrs = {}
-            error_group_name = error.error_group_name
-            if error_group_name:
-                err_agent_attrs["error.group.name"] = error_group_name
+        # add error specific agent attributes to this error's agentAttributes
 
-            err_agent_attrs = create_agent_attributes(err_agent_attrs, self.settings.attribute_filter)
-            for attr in err_agent_attrs:
-                if attr.destinations & DST_ERROR_COLLECTOR:
-                    agent_attributes[attr.name] = attr.value
+        err_agent_attrs = {}
+        error_group_name = error.error_group_name
+        if error_group_name:
+            err_agent_attrs["error.group.name"] = error_group_name
 
-            # add error specific custom params to this error's userAttributes
+        err_agent_attrs = create_agent_attributes(err_agent_attrs, self.settings.attribute_filter)
+        for attr in err_agent_attrs:
+            if attr.destinations & DST_ERROR_COLLECTOR:
+                agent_attributes[attr.name] = attr.value
 
-            err_attrs = create_user_attributes(error.custom_params, self.settings.attribute_filter)
-            for attr in err_attrs:
-                if attr.destinations & DST_ERROR_COLLECTOR:
-                    user_attributes[attr.name] = attr.value
+        # add error specific custom params to this error's userAttributes
 
-            error_event = [intrinsics, user_attributes, agent_attributes]
-            errors.append(error_event)
+        err_attrs = create_user_attributes(error.custom_params, self.settings.attribute_filter)
+        for attr in err_attrs:
+            if attr.destinations & DST_ERROR_COLLECTOR:
+                user_attributes[attr.name] = attr.value
 
-        return errors
+        return [intrinsics, user_attributes, agent_attributes]
 
     def error_event_intrinsics(self, error, stats_table):
 
@@ -622,8 +681,29 @@ class TransactionNode(_TransactionNode):
         return intrinsics
 
     def span_protos(self, settings):
-        for i_attrs, u_attrs, a_attrs in self.span_events(settings, attr_class=SpanProtoAttrs):
-            yield Span(trace_id=self.trace_id, intrinsics=i_attrs, user_attributes=u_attrs, agent_attributes=a_attrs)
+        # The spans are built directly from the plain span event attributes
+        # rather than converting each attribute as it is set. The intrinsics
+        # common to all spans of the transaction are only converted once.
+
+        base_attrs = span_proto_attrs(
+            {
+                "transactionId": self.guid,
+                "traceId": self.trace_id,
+                "sampled": self.sampled,
+                "priority": self.priority,
+            }
+        )
+
+        for i_attrs, u_attrs, a_attrs in self.root.span_events(settings, parent_guid=self.parent_span):
+            intrinsics = base_attrs.copy()
+            intrinsics.update(span_proto_attrs(i_attrs, CACHED_SPAN_INTRINSICS))
+
+            yield Span(
+                trace_id=self.trace_id,
+                intrinsics=intrinsics,
+                user_attributes=span_proto_attrs(u_attrs),
+                agent_attributes=span_proto_attrs(a_attrs),
+            )
 
     def span_events(self, settings, attr_class=dict):
         base_attrs = attr_class(
@@ -642,3 +722,19 @@ class TransactionNode(_TransactionNode):
             attr_class=attr_class,
         ):
             yield event
+
+    def span_count(self):
+        """Returns the number of span events span_events() would yield,
+        without creating them.
+
+        """
+
+        count = 0
+        stack = [self.root]
+
+        while stack:
+            node = stack.pop()
+            count += 1
+            stack.extend(node.children)
+
+        return count
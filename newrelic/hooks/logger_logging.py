@@ -13,7 +13,7 @@
 # limitations under the License.
 
 from newrelic.api.application import application_instance
-from newrelic.api.time_trace import get_linking_metadata
+from newrelic.api.time_trace import current_trace, get_linking_metadata
 from newrelic.api.transaction import current_transaction, record_log_event
 from newrelic.common.object_wrapper import function_wrapper, wrap_function_wrapper
 from newrelic.core.config import global_settings
@@ -24,16 +24,62 @@ except ImportError:
     from urllib.parse import quote
 
 
-def add_nr_linking_metadata(message):
-    available_metadata = get_linking_metadata()
-    entity_name = quote(available_metadata.get("entity.name", ""))
-    entity_guid = available_metadata.get("entity.guid", "")
-    span_id = available_metadata.get("span.id", "")
-    trace_id = available_metadata.get("trace.id", "")
-    hostname = available_metadata.get("hostname", "")
+def nr_linking_string(metadata):
+    return "|".join(
+        (
+            "NR-LINKING",
+            metadata.get("entity.guid", ""),
+            metadata.get("hostname", ""),
+            metadata.get("trace.id", ""),
+            metadata.get("span.id", ""),
+            quote(metadata.get("entity.name", "")),
+        )
+    )
+
+
+# The linking string last generated outside of a transaction, along with
+# the linking metadata it was generated from.
+
+_nr_linking_string = (None, None)
+
+
+def get_nr_linking_string():
+    """Returns the linking string for the current span. Within a
+    transaction this is generated once for each span and saved on the
+    trace, so is only regenerated if the settings, trace ID or span ID
+    change.
+
+    """
+
+    global _nr_linking_string
+
+    trace = current_trace()
+    transaction = trace and trace.transaction
+    settings = transaction and transaction.settings
+
+    if settings:
+        key = (settings, settings.app_name, settings.entity_guid, transaction.trace_id, trace.guid)
+        cached = getattr(trace, "_nr_linking_string", None)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        linking_string = nr_linking_string(trace.get_linking_metadata())
+        trace._nr_linking_string = (key, linking_string)
+
+        return linking_string
 
-    nr_linking_str = "|".join(("NR-LINKING", entity_guid, hostname, trace_id, span_id, entity_name))
-    return "%s %s|" % (message, nr_linking_str)
+    metadata = get_linking_metadata()
+
+    cached_metadata, linking_string = _nr_linking_string
+    if cached_metadata != metadata:
+        linking_string = nr_linking_string(metadata)
+        _nr_linking_string = (metadata, linking_string)
+
+    return linking_string
+
+
+def add_nr_linking_metadata(message):
+    return "%s %s|" % (message, get_nr_linking_string())
 
 
 @function_wrapper
@@ -47,13 +93,14 @@ def bind_callHandlers(record):
 
 
 def wrap_callHandlers(wrapped, instance, args, kwargs):
-    transaction = current_transaction()
     record = bind_callHandlers(*args, **kwargs)
 
     logger_name = getattr(instance, "name", None)
     if logger_name and logger_name.split(".")[0] == "newrelic":
         return wrapped(*args, **kwargs)
 
+    transaction = current_transaction()
+
     if transaction:
         settings = transaction.settings
     else:
@@ -62,20 +109,37 @@ def wrap_callHandlers(wrapped, instance, args, kwargs):
     # Return early if application logging not enabled
     if settings and settings.application_logging and settings.application_logging.enabled:
         level_name = str(getattr(record, "levelname", "UNKNOWN"))
+
+        # Outside of a transaction, the application is looked up once
+        # and used to record both the metrics and the log event.
+        application = None
+        if not transaction:
+            application = application_instance(activate=False)
+            if not (application and application.enabled):
+                application = None
+
         if settings.application_logging.metrics and settings.application_logging.metrics.enabled:
             if transaction:
                 transaction.record_custom_metric("Logging/lines", {"count": 1})
                 transaction.record_custom_metric("Logging/lines/%s" % level_name, {"count": 1})
-            else:
-                application = application_instance(activate=False)
-                if application and application.enabled:
-                    application.record_custom_metric("Logging/lines", {"count": 1})
-                    application.record_custom_metric("Logging/lines/%s" % level_name, {"count": 1})
-
-        if settings.application_logging.forwarding and settings.application_logging.forwarding.enabled:
+            elif application:
+                application.record_custom_metrics(
+                    (("Logging/lines", {"count": 1}), ("Logging/lines/%s" % level_name, {"count": 1}))
+                )
+
+        # Records below the forwarding log level are filtered out before
+        # the message is formatted.
+        forwarding = settings.application_logging.forwarding
+        if forwarding and forwarding.enabled and getattr(record, "levelno", 0) >= forwarding.log_level:
             try:
                 message = record.getMessage()
-                record_log_event(message, level_name, int(record.created * 1000))
+                timestamp = int(record.created * 1000)
+                if transaction:
+                    transaction.record_log_event(message, level_name, timestamp)
+                elif application:
+                    application.record_log_event(message, level_name, timestamp)
+                else:
+                    record_log_event(message, level_name, timestamp)
             except Exception:
                 pass
 
@@ -58,7 +58,8 @@ def _nr_log_forwarder(message_instance):
                     application.record_custom_metric("Logging/lines", {"count": 1})
                     application.record_custom_metric("Logging/lines/%s" % level_name, {"count": 1})
 
-        if settings.application_logging.forwarding and settings.application_logging.forwarding.enabled:
+        forwarding = settings.application_logging.forwarding
+        if forwarding and forwarding.enabled and (level.no if level else 0) >= forwarding.log_level:
             try:
                 record_log_event(message, level_name, int(record["time"].timestamp()))
             except Exception:
@@ -0,0 +1,170 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Helpers for building synthetic transaction nodes of an arbitrary size
+so that the core data recording paths can be benchmarked without running
+an instrumented application.
+
+"""
+
+from newrelic.core.config import finalize_application_settings
+from newrelic.core.function_node import FunctionNode
+from newrelic.core.root_node import RootNode
+from newrelic.core.stats_engine import CustomMetrics, SampledDataSet
+from newrelic.core.transaction_node import TransactionNode
+
+START_TIME = 1524764430.0
+
+
+def application_settings(overrides=None):
+    settings = {"agent_run_id": "1234567", "distributed_tracing.enabled": True}
+    settings.update(overrides or {})
+    return finalize_application_settings(settings)
+
+
+def function_nodes(num_nodes, fanout=10, start_time=START_TIME, duration=1.0, attributes=None):
+    """Returns a tuple of the top level children of a tree of function
+    nodes containing num_nodes in total, where each node has at most
+    fanout children. Each node is given a copy of attributes as both
+    its agent and user attributes.
+
+    """
+
+    counter = [0]
+
+    def build(remaining, start_time, duration):
+        children = []
+        count = min(fanout, remaining)
+        if not count:
+            return (), 0
+
+        used = 0
+        width = duration / count
+        for index in range(count):
+            share = (remaining - count) // count
+            if index < (remaining - count) % count:
+                share += 1
+
+            counter[0] += 1
+            node_start = start_time + index * width
+            grandchildren, nested = build(share, node_start, width / 2.0)
+            exclusive = width - sum(child.duration for child in grandchildren)
+
+            children.append(
+                FunctionNode(
+                    group="Function",
+                    name="benchmark.function_%d" % (counter[0] % 50),
+                    children=grandchildren,
+                    start_time=node_start,
+                    end_time=node_start + width,
+                    duration=width,
+                    exclusive=exclusive,
+                    label=None,
+                    params=None,
+                    rollup=None,
+                    guid="%016x" % counter[0],
+                    agent_attributes=dict(attributes or {}),
+                    user_attributes=dict(attributes or {}),
+                )
+            )
+            used += 1 + nested
+
+        return tuple(children), used
+
+    return build(num_nodes, start_time, duration)[0]
+
+
+def transaction_node(settings=None, num_nodes=10, fanout=10, name="main", attributes=None):
+    """Returns a synthetic background transaction node with a tree of
+    num_nodes function nodes beneath the root node.
+
+    """
+
+    settings = settings or application_settings()
+    path = "OtherTransaction/Function/%s" % name
+    children = function_nodes(num_nodes, fanout, attributes=attributes)
+
+    root = RootNode(
+        name="Function/%s" % name,
+        children=children,
+        start_time=START_TIME,
+        end_time=START_TIME + 1.0,
+        duration=1.0,
+        exclusive=1.0 - sum(child.duration for child in children),
+        guid="0000000000000000",
+        agent_attributes={},
+        user_attributes={},
+        path=path,
+        trusted_parent_span=None,
+        tracing_vendors=None,
+    )
+
+    return TransactionNode(
+        settings=settings,
+        path=path,
+        type="OtherTransaction",
+        group="Function",
+        base_name=name,
+        name_for_metric="Function/%s" % name,
+        port=None,
+        request_uri=None,
+        queue_start=0.0,
+        start_time=START_TIME,
+        end_time=START_TIME + 1.0,
+        last_byte_time=0.0,
+        total_time=1.0,
+        response_time=1.0,
+        duration=1.0,
+        exclusive=root.exclusive,
+        root=root,
+        errors=(),
+        slow_sql=(),
+        custom_events=SampledDataSet(),
+        log_events=SampledDataSet(),
+        apdex_t=0.5,
+        suppress_apdex=False,
+        custom_metrics=CustomMetrics(),
+        guid="4485b89db608aece",
+        cpu_time=0.0,
+        suppress_transaction_trace=False,
+        client_cross_process_id=None,
+        referring_transaction_guid=None,
+        record_tt=False,
+        synthetics_resource_id=None,
+        synthetics_job_id=None,
+        synthetics_monitor_id=None,
+        synthetics_header=None,
+        is_part_of_cat=False,
+        trip_id="4485b89db608aece",
+        path_hash=None,
+        referring_path_hash=None,
+        alternate_path_hashes=[],
+        trace_intrinsics={},
+        distributed_trace_intrinsics={},
+        agent_attributes=[],
+        user_attributes=[],
+        priority=1.0,
+        parent_transport_duration=None,
+        parent_span=None,
+        parent_type=None,
+        parent_account=None,
+        parent_app=None,
+        parent_tx=None,
+        parent_transport_type=None,
+        sampled=True,
+        root_span_guid=None,
+        trace_id="4485b89db608aece",
+        loop_time=0.0,
+    )
@@ -0,0 +1,67 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from newrelic.core.agent_protocol import AgentProtocol
+from newrelic.core.config import finalize_application_settings
+
+SPAN_COUNT = 10000
+
+
+def span_event_payload(count):
+    events = []
+
+    for index in range(count):
+        intrinsics = {
+            "type": "Span",
+            "traceId": "%032x" % index,
+            "guid": "%016x" % index,
+            "transactionId": "%016x" % (index // 100),
+            "sampled": True,
+            "priority": 1.23456,
+            "timestamp": 1600000000000 + index,
+            "duration": 0.001 * index,
+            "name": "Function/benchmark:function_%d" % index,
+            "category": "generic",
+        }
+        events.append([intrinsics, {}, {"code.function": "function_%d" % index}])
+
+    return ("RUN_TOKEN", {"reservoir_size": count, "events_seen": count}, events)
+
+
+class SendSpanEvents(object):
+    """Time and memory needed to serialize and compress a span event
+    payload, as done when sending span_event_data at harvest.
+
+    """
+
+    params = [1000, SPAN_COUNT]
+    param_names = ["span_count"]
+
+    def setup(self, span_count):
+        self.protocol = AgentProtocol(finalize_application_settings({"agent_run_id": "RUN_TOKEN"}))
+        self.payload = span_event_payload(span_count)
+        self.client = self.protocol.client
+
+    def time_serialize(self, span_count):
+        _, _, data = self.protocol._to_http("span_event_data", self.payload)
+        b"".join(data)
+
+    def time_serialize_and_compress(self, span_count):
+        _, _, data = self.protocol._to_http("span_event_data", self.payload)
+        self.client._encode_chunks(data)
+
+    def peakmem_serialize_and_compress(self, span_count):
+        _, _, data = self.protocol._to_http("span_event_data", self.payload)
+        self.client._encode_chunks(data)
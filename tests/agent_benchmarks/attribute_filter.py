@@ -0,0 +1,52 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from newrelic.core.attribute_filter import DST_ALL, AttributeFilter
+
+SETTINGS = {
+    "attributes.enabled": True,
+    "transaction_events.attributes.enabled": True,
+    "transaction_tracer.attributes.enabled": True,
+    "error_collector.attributes.enabled": True,
+    "span_events.attributes.enabled": True,
+    "attributes.exclude": ["request.headers.*", "secret.*"] + ["custom.rule_%d" % i for i in range(50)],
+    "attributes.include": ["request.headers.accept*", "custom.*"],
+    "span_events.attributes.exclude": ["db.*", "peer.*"],
+    "transaction_events.attributes.include": ["user.id"],
+}
+
+
+class TimeAttributeFilterApply(object):
+    """Applies the attribute filter to dynamically named attributes, so
+    that every lookup misses the cache, and to a small fixed set of names
+    which are always cached.
+
+    """
+
+    def setup(self):
+        self.attribute_filter = AttributeFilter(SETTINGS)
+        self.dynamic_names = ["user.%d" % i for i in range(20000)]
+        self.static_names = ["request.headers.accept", "request.method", "response.status", "user.id"] * 5000
+
+    def time_apply_uncached(self):
+        apply = self.attribute_filter.apply
+        for name in self.dynamic_names:
+            apply(name, DST_ALL)
+        self.attribute_filter.cache.clear()
+
+    def time_apply_cached(self):
+        apply = self.attribute_filter.apply
+        for name in self.static_names:
+            apply(name, DST_ALL)
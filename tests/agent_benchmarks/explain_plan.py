@@ -0,0 +1,117 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from newrelic.core.config import global_settings
+from newrelic.core.database_utils import (
+    SQLConnectionPool,
+    SQLConnections,
+    _explain_plans,
+    explain_plan,
+    sql_statement,
+)
+
+
+class DBAPI2Module(object):
+    __name__ = "benchmark_sqlite3"
+
+    _nr_database_product = "SQLite"
+    _nr_quoting_style = "single"
+    _nr_explain_query = "EXPLAIN QUERY PLAN"
+    _nr_explain_stmts = ("select",)
+
+    NotSupportedError = sqlite3.NotSupportedError
+
+    @staticmethod
+    def connect(*args, **kwargs):
+        return sqlite3.connect(*args, **kwargs)
+
+
+class TimeExplainPlan(object):
+    """Time taken to obtain explain plans for the slow SQL of a harvest,
+    against a database on disk, with and without the explain plan cache.
+
+    """
+
+    params = [0.0, 300.0]
+    param_names = ["explain_plan_cache_ttl"]
+
+    def setup(self, explain_plan_cache_ttl):
+        self.directory = tempfile.mkdtemp()
+        self.connect_params = ((os.path.join(self.directory, "benchmark.db"),), {})
+
+        connection = sqlite3.connect(*self.connect_params[0])
+        for i in range(10):
+            connection.execute("CREATE TABLE table_%d (id INTEGER PRIMARY KEY, name TEXT)" % i)
+        connection.close()
+
+        self.statements = [
+            sql_statement("SELECT * FROM table_%d WHERE id = 1 AND name = 'x'" % i, DBAPI2Module) for i in range(10)
+        ]
+
+        tracer = global_settings().transaction_tracer
+        self.original_ttl = tracer.explain_plan_cache_ttl
+        tracer.explain_plan_cache_ttl = explain_plan_cache_ttl
+
+        _explain_plans.clear()
+
+    def teardown(self, explain_plan_cache_ttl):
+        global_settings().transaction_tracer.explain_plan_cache_ttl = self.original_ttl
+        _explain_plans.clear()
+        shutil.rmtree(self.directory)
+
+    def time_harvest_explain_plans(self, explain_plan_cache_ttl):
+        for _ in range(10):
+            with SQLConnections() as connections:
+                for statement in self.statements:
+                    explain_plan(connections, statement, self.connect_params, None, None, None, "obfuscated")
+
+
+class TimeExplainPlanConnections(object):
+    """Time taken to obtain explain plans for the slow SQL of a harvest,
+    without the explain plan cache, with and without connections being
+    pooled across harvests.
+
+    """
+
+    params = [0.0, 60.0]
+    param_names = ["sql_connection_idle_timeout"]
+
+    def setup(self, sql_connection_idle_timeout):
+        self.explain_plan = TimeExplainPlan()
+        self.explain_plan.setup(0.0)
+
+        limits = global_settings().agent_limits
+        self.original_timeout = limits.sql_connection_idle_timeout
+        limits.sql_connection_idle_timeout = sql_connection_idle_timeout
+
+        self.pool = SQLConnectionPool()
+
+    def teardown(self, sql_connection_idle_timeout):
+        self.pool.close()
+        global_settings().agent_limits.sql_connection_idle_timeout = self.original_timeout
+        self.explain_plan.teardown(0.0)
+
+    def time_harvest_explain_plans(self, sql_connection_idle_timeout):
+        for _ in range(10):
+            with SQLConnections(4, self.pool) as connections:
+                for statement in self.explain_plan.statements:
+                    explain_plan(
+                        connections, statement, self.explain_plan.connect_params, None, None, None, "obfuscated"
+                    )
@@ -0,0 +1,108 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from newrelic.api.html_insertion import HTMLInsertionScanner, insert_html_snippet, verify_body_exists
+
+TEXT = b"<script>window.NREUM = {};</script>"
+
+CHUNK_SIZE = 4096
+
+
+def page(size):
+    head = b"<!DOCTYPE html><html><head><meta charset='utf-8'><title>Page</title>"
+    head += b"<style>" + b".c { color: red; }\n" * 2000 + b"</style></head><body>"
+    row = b"<tr><td>cell</td><td>cell</td><td>cell</td></tr>\n"
+    rows = row * ((size - len(head)) // len(row))
+    return head + rows + b"</body></html>"
+
+
+def buffered_insertion(chunks, search_limit=64 * 1024):
+    # The insertion as it was prior to the response being scanned as it
+    # is streamed, with data buffered and joined until the start of the
+    # body is found, kept to compare against.
+
+    buffered = []
+    length = 0
+    done = False
+
+    for data in chunks:
+        if done:
+            yield data
+            continue
+
+        if not buffered:
+            modified = insert_html_snippet(data, lambda: TEXT, search_limit)
+            if modified is not None:
+                done = True
+                yield modified
+                continue
+
+        if not buffered or not verify_body_exists(data):
+            buffered.append(data)
+            length += len(data)
+            if length >= search_limit:
+                done = True
+                for data in buffered:
+                    yield data
+                buffered = []
+            continue
+
+        buffered.append(data)
+        data = b"".join(buffered)
+        buffered = []
+        done = True
+        yield insert_html_snippet(data, lambda: TEXT, search_limit)
+
+    for data in buffered:
+        yield data
+
+
+def streamed_insertion(chunks):
+    scanner = HTMLInsertionScanner(lambda: TEXT)
+
+    for data in chunks:
+        data = scanner.feed(data)
+        if data:
+            yield data
+
+    data = scanner.close()
+    if data:
+        yield data
+
+
+INSERTIONS = {"buffered": buffered_insertion, "streamed": streamed_insertion}
+
+
+class TimeHTMLInsertion(object):
+    """Time taken to the first byte being sent, and to stream the whole
+    response, when inserting the browser agent into a 1MB HTML page sent
+    in 4KB chunks.
+
+    """
+
+    params = ["buffered", "streamed"]
+    param_names = ["insertion"]
+
+    def setup(self, insertion):
+        data = page(1024 * 1024)
+        self.chunks = [data[i : i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE)]
+        self.insertion = INSERTIONS[insertion]
+
+    def time_first_byte(self, insertion):
+        next(self.insertion(iter(self.chunks)))
+
+    def time_stream(self, insertion):
+        for _ in self.insertion(iter(self.chunks)):
+            pass
@@ -0,0 +1,147 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import logging
+import sys
+
+from newrelic.api.application import application_instance
+from newrelic.api.background_task import BackgroundTask
+from newrelic.common.object_wrapper import wrap_function_wrapper
+from newrelic.core.agent import agent_instance
+from newrelic.core.application import Application
+from newrelic.core.config import global_settings
+from newrelic.hooks.logger_logging import wrap_callHandlers
+
+APP_NAME = "Python Agent Benchmarks"
+
+LOG_CALLS = 1000000
+
+
+class _Logger(logging.Logger):
+    pass
+
+
+wrap_function_wrapper(sys.modules[__name__], "_Logger.callHandlers", wrap_callHandlers)
+
+
+class _Handler(logging.Handler):
+    def emit(self, record):
+        self.format(record)
+
+
+class _InstrumentedLogger(object):
+    """Base class for benchmarks of logging through an instrumented
+    logger, with the global settings overridden for the application
+    while the benchmark runs.
+
+    """
+
+    timeout = 600
+
+    def settings(self, *params):
+        raise NotImplementedError
+
+    def setup(self, *params):
+        self.original_settings = {}
+
+        overrides = {
+            "developer_mode": True,
+            "license_key": "**NOT A LICENSE KEY**",
+            "app_name": APP_NAME,
+        }
+        overrides.update(self.settings(*params))
+
+        for name, value in overrides.items():
+            parent, _, attr = name.rpartition(".")
+            target = global_settings()
+            for part in parent.split(".") if parent else ():
+                target = getattr(target, part)
+            self.original_settings[(target, attr)] = getattr(target, attr)
+            setattr(target, attr, value)
+
+        self.application = Application(APP_NAME)
+        self.application.connect_to_data_collector(None)
+
+        # Make the application the one log events are recorded against.
+
+        agent_instance()._applications[APP_NAME] = self.application
+        self.api_application = application_instance(APP_NAME)
+
+        self.logger = _Logger("benchmark")
+        self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(_Handler())
+
+    def teardown(self, *params):
+        agent_instance()._applications.pop(APP_NAME, None)
+
+        for (target, attr), value in self.original_settings.items():
+            setattr(target, attr, value)
+
+
+class TimeLogForwarding(_InstrumentedLogger):
+    """Time taken for 1000000 calls to an instrumented logger outside of
+    a transaction, with log forwarding enabled and disabled. Half of the
+    calls are below the forwarding log level.
+
+    """
+
+    params = [False, True]
+    param_names = ["forwarding"]
+
+    def settings(self, forwarding):
+        return {
+            "application_logging.forwarding.enabled": forwarding,
+            "application_logging.forwarding.log_level": logging.WARNING,
+        }
+
+    def time_log_calls(self, forwarding):
+        logger = self.logger
+        for i in range(LOG_CALLS // 2):
+            logger.info("Processed item %d", i)
+            logger.warning("Item %d took too long", i)
+
+        # Include the cost of adding the buffered log events to the
+        # stats engine, as that is work moved into the harvest.
+
+        self.application._record_buffered_log_events()
+
+
+class TimeLocalDecorating(_InstrumentedLogger):
+    """Time taken for 1000000 calls to an instrumented logger with local
+    decorating enabled, both within a single span of a transaction and
+    outside of a transaction.
+
+    """
+
+    params = [False, True]
+    param_names = ["transaction"]
+
+    def settings(self, transaction):
+        return {
+            "application_logging.forwarding.enabled": False,
+            "application_logging.metrics.enabled": False,
+            "application_logging.local_decorating.enabled": True,
+        }
+
+    def time_log_calls(self, transaction):
+        logger = self.logger
+
+        if transaction:
+            with BackgroundTask(self.api_application, "benchmark"):
+                for i in range(LOG_CALLS):
+                    logger.info("Processed item %d", i)
+        else:
+            for i in range(LOG_CALLS):
+                logger.info("Processed item %d", i)
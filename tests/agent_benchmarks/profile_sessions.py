@@ -0,0 +1,133 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import threading
+from collections import deque
+
+from newrelic.core.profile_sessions import AGENT_PACKAGE_DIRECTORY, ProfileSession
+from newrelic.core.trace_cache import TraceCache
+
+
+class _CallTree(object):
+    def __init__(self, method_data, depth=1):
+        self.method_data = method_data
+        self.call_count = 0
+        self.children = {}
+        self.depth = depth
+
+
+def format_stack_trace(frame, thread_category):
+    """The formatting of a stack trace for the thread profiler as
+    originally implemented, building tuples for every frame.
+
+    """
+
+    stack_trace = deque()
+
+    while frame:
+        code = frame.f_code
+
+        filename = code.co_filename
+        func_name = code.co_name
+        first_line = code.co_firstlineno
+
+        real_line = frame.f_lineno
+
+        frame = frame.f_back
+
+        if thread_category != "AGENT" and filename.startswith(AGENT_PACKAGE_DIRECTORY):
+            continue
+
+        if not stack_trace:
+            stack_trace.appendleft((filename, func_name, real_line, real_line))
+
+        stack_trace.appendleft((filename, func_name, first_line, real_line))
+
+    return stack_trace
+
+
+def update_call_tree(buckets, bucket_type, stack_trace):
+    """The merging of a stack trace into the call tree as originally
+    implemented, with a dictionary of children for each node.
+
+    """
+
+    depth = 1
+    bucket = buckets[bucket_type]
+
+    for method in stack_trace:
+        call_tree = bucket.get(method)
+
+        if call_tree is None:
+            call_tree = _CallTree(method, depth=depth)
+            bucket[method] = call_tree
+
+        call_tree.call_count += 1
+
+        bucket = call_tree.children
+        depth += 1
+
+
+def _recurse(depth, event):
+    if depth:
+        return _recurse(depth - 1, event)
+    event.wait()
+
+
+class TimeProfilerSample(object):
+    """Time taken for 100 samples by the thread profiler of the stacks of
+    a number of threads, each blocked 30 frames deep. The interned walk
+    forces the stacks to be walked on every sample, as is the case when
+    threads are busy rather than blocked.
+
+    """
+
+    params = ([1, 10, 100, 300], ["call_tree", "interned", "interned_walk"])
+    param_names = ["threads", "mode"]
+
+    def setup(self, threads, mode):
+        self.cache = TraceCache()
+
+        self.shutdown = threading.Event()
+        self.threads = [threading.Thread(target=_recurse, args=(30, self.shutdown)) for _ in range(threads)]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def teardown(self, threads, mode):
+        self.shutdown.set()
+        for thread in self.threads:
+            thread.join()
+
+    def time_samples(self, threads, mode):
+        cache = self.cache
+
+        if mode == "call_tree":
+            buckets = {"REQUEST": {}, "AGENT": {}, "BACKGROUND": {}, "OTHER": {}}
+
+            for _ in range(100):
+                for _, _, category, frame in cache.active_threads():
+                    stack_trace = format_stack_trace(frame, category)
+                    if stack_trace:
+                        update_call_tree(buckets, category, stack_trace)
+
+        else:
+            session = ProfileSession(1, 0)
+
+            for _ in range(100):
+                if mode == "interned_walk":
+                    session._thread_stacks = {}
+
+                session.sample_stacks(cache.active_threads())
@@ -0,0 +1,59 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import os
+
+from newrelic.core.rules_engine import NormalizationRule, RulesEngine
+
+FIXTURE = os.path.join(os.path.dirname(__file__), os.pardir, "cross_agent", "fixtures", "rules.json")
+
+
+def _load_rules_engines(cache_size):
+    with open(FIXTURE, "r") as fh:
+        test_groups = json.load(fh)
+
+    cases = []
+
+    for test_group in test_groups:
+        rules = test_group["rules"]
+        for rule in rules:
+            for field in NormalizationRule._fields:
+                rule[field] = rule.get(field, "")
+
+        rules_engine = RulesEngine(rules, cache_size=cache_size)
+        inputs = [test["input"] for test in test_group["tests"]]
+        cases.append((rules_engine, inputs))
+
+    return cases
+
+
+class TimeRulesEngineNormalize(object):
+    """Normalizes the inputs from the cross agent rules fixtures, with and
+    without caching of the results.
+
+    """
+
+    params = [0, 2000]
+    param_names = ["cache_size"]
+
+    def setup(self, cache_size):
+        self.cases = _load_rules_engines(cache_size)
+
+    def time_normalize(self, cache_size):
+        for _ in range(1000):
+            for rules_engine, inputs in self.cases:
+                for string in inputs:
+                    rules_engine.normalize(string)
@@ -0,0 +1,115 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import random
+
+from newrelic.core.stats_engine import SampledDataSet, StatsEngine
+
+from ._transaction_nodes import application_settings, transaction_node
+
+CAPACITY = 1000
+OVERSUBSCRIPTION = 10
+
+
+class TimeSampledDataSetAdd(object):
+    """Time taken to offer a reservoir ten times as many transaction
+    events as it can hold, creating every event up front as against only
+    creating those which the reservoir would retain.
+
+    """
+
+    params = [False, True]
+    param_names = ["deferred"]
+
+    def setup(self, deferred):
+        rnd = random.Random(0)
+        transaction = transaction_node(num_nodes=10)
+        self.transactions = [
+            transaction._replace(priority=rnd.random()) for _ in range(CAPACITY * OVERSUBSCRIPTION)
+        ]
+        self.stats_table = {}
+
+    def time_add(self, deferred):
+        data_set = SampledDataSet(CAPACITY)
+        stats_table = self.stats_table
+
+        if deferred:
+            for transaction in self.transactions:
+                data_set.add_deferred(
+                    lambda: transaction.transaction_event(stats_table), priority=transaction.priority
+                )
+        else:
+            for transaction in self.transactions:
+                data_set.add(transaction.transaction_event(stats_table), priority=transaction.priority)
+
+
+class TimeRecordTransactionSpans(object):
+    """Time taken to record transactions with 100 spans each, into a
+    span event reservoir oversubscribed ten times over.
+
+    """
+
+    def setup(self):
+        self.settings = application_settings({"event_harvest_config.harvest_limits.span_event_data": CAPACITY})
+        rnd = random.Random(0)
+        transaction = transaction_node(self.settings, num_nodes=99)
+        self.transactions = [
+            transaction._replace(priority=rnd.random()) for _ in range(CAPACITY * OVERSUBSCRIPTION // 100)
+        ]
+
+    def time_record_transaction(self):
+        stats = StatsEngine()
+        stats.reset_stats(self.settings)
+
+        for transaction in self.transactions:
+            stats.record_transaction(transaction)
+
+
+def _sequential_merge(data_set, other_data_set):
+    # Merging as was done prior to the bulk merge, kept to compare against.
+
+    for original_priority, _, sample in other_data_set.pq:
+        data_set.add(sample, original_priority)
+
+    data_set.num_seen += other_data_set.num_seen - other_data_set.num_samples
+
+
+class TimeSampledDataSetMerge(object):
+    """Time taken to merge ten full reservoirs into one, as when folding
+    stats engine shards or rolling back a failed harvest.
+
+    """
+
+    params = [False, True]
+    param_names = ["sequential"]
+
+    def setup(self, sequential):
+        rnd = random.Random(0)
+        self.data_sets = []
+
+        for _ in range(OVERSUBSCRIPTION):
+            data_set = SampledDataSet(CAPACITY)
+            for i in range(CAPACITY * 2):
+                data_set.add(i, rnd.random())
+            self.data_sets.append(data_set)
+
+    def time_merge(self, sequential):
+        data_set = SampledDataSet(CAPACITY)
+
+        for other_data_set in self.data_sets:
+            if sequential:
+                _sequential_merge(data_set, other_data_set)
+            else:
+                data_set.merge(other_data_set)
@@ -0,0 +1,76 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from newrelic.core.attribute import resolve_agent_attributes, resolve_user_attributes
+from newrelic.core.attribute_filter import DST_SPAN_EVENTS
+from newrelic.core.node_mixin import GenericNodeMixin
+
+from ._transaction_nodes import application_settings, transaction_node
+
+ATTRIBUTES = {
+    "code.function": "function",
+    "code.namespace": "benchmark",
+    "code.lineno": 10,
+    "db.operation": "select",
+    "request.parameters.id": "1",
+}
+
+
+def recursive_span_events(node, settings, base_attrs=None, parent_guid=None):
+    # The span event generation as it was prior to the tree being walked
+    # iteratively, kept to compare against.
+
+    i_attrs = base_attrs and base_attrs.copy() or {}
+    i_attrs["type"] = "Span"
+    i_attrs["name"] = node.name
+    i_attrs["guid"] = node.guid
+    i_attrs["timestamp"] = int(node.start_time * 1000)
+    i_attrs["duration"] = node.duration
+    i_attrs["category"] = "generic"
+    if parent_guid:
+        i_attrs["parentId"] = parent_guid
+
+    a_attrs = resolve_agent_attributes(node.agent_attributes, settings.attribute_filter, DST_SPAN_EVENTS)
+    u_attrs = resolve_user_attributes(node.processed_user_attributes, settings.attribute_filter, DST_SPAN_EVENTS)
+
+    yield [i_attrs, u_attrs, a_attrs]
+
+    for child in node.children:
+        for event in recursive_span_events(child, settings, base_attrs, node.guid):
+            yield event
+
+
+class SpanEvents(object):
+    """Time taken to generate the span events for a transaction with a
+    5k node trace, for both a shallow and a deep tree of nodes.
+
+    """
+
+    params = ([10, 2], [False, True])
+    param_names = ["fanout", "recursive"]
+
+    def setup(self, fanout, recursive):
+        self.settings = application_settings({"attributes.exclude": ["request.parameters.*"]})
+        self.transaction = transaction_node(self.settings, num_nodes=5000, fanout=fanout, attributes=ATTRIBUTES)
+
+        # Attribute filter results are cached, so ensure the cache is
+        # populated before timing either implementation.
+        list(self.transaction.span_events(self.settings))
+
+    def time_span_events(self, fanout, recursive):
+        if recursive:
+            list(recursive_span_events(self.transaction.root, self.settings))
+        else:
+            list(GenericNodeMixin.span_events(self.transaction.root, self.settings))
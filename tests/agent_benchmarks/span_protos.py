@@ -0,0 +1,59 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from newrelic.common.streaming_utils import SpanProtoAttrs
+from newrelic.core.infinite_tracing_pb2 import Span
+
+from ._transaction_nodes import application_settings, transaction_node
+
+ATTRIBUTES = {
+    "code.function": "function",
+    "code.namespace": "benchmark",
+    "code.lineno": 10,
+}
+
+
+def two_step_span_protos(transaction, settings):
+    # The conversion as it was prior to spans being built directly, where
+    # every attribute was converted as it was set on the span event.
+
+    for i_attrs, u_attrs, a_attrs in transaction.span_events(settings, attr_class=SpanProtoAttrs):
+        yield Span(
+            trace_id=transaction.trace_id, intrinsics=i_attrs, user_attributes=u_attrs, agent_attributes=a_attrs
+        )
+
+
+class TimeSpanProtos(object):
+    """Time taken to build the protobuf spans sent to Infinite Tracing
+    for a transaction with a 1k node trace.
+
+    """
+
+    params = [False, True]
+    param_names = ["two_step"]
+
+    def setup(self, two_step):
+        self.settings = application_settings()
+        self.transaction = transaction_node(self.settings, num_nodes=1000, attributes=ATTRIBUTES)
+
+        # Attribute filter results are cached, so ensure the cache is
+        # populated before timing either implementation.
+        list(self.transaction.span_events(self.settings))
+
+    def time_span_protos(self, two_step):
+        if two_step:
+            list(two_step_span_protos(self.transaction, self.settings))
+        else:
+            list(self.transaction.span_protos(self.settings))
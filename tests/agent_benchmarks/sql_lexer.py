@@ -0,0 +1,63 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from newrelic.core.config import global_settings
+from newrelic.core.database_utils import SQLStatement
+
+
+def _in_list_statement(count):
+    values = ", ".join("%d" % (i * 7919) for i in range(count))
+    return "SELECT id, name FROM customers WHERE id IN (%s) AND name <> 'x'" % values
+
+
+def _wordy_statement(count):
+    columns = ", ".join("c.column_%d" % i for i in range(count))
+    joins = " ".join(
+        "LEFT OUTER JOIN table_%d t%d ON t%d.customer_id = c.id AND t%d.kind = 'k%d' /* join %d */"
+        % (i, i, i, i, i, i)
+        for i in range(count // 10)
+    )
+    return "SELECT %s FROM customers c %s WHERE c.active = true -- trailing\n" % (columns, joins)
+
+
+class DBAPI2Module(object):
+    quoting_style = "single+double"
+
+
+class TimeSQLLexer(object):
+    """Time taken to obfuscate and normalize large statements and obtain
+    their operation and target, without the statement cache.
+
+    """
+
+    params = (["regex", "fused"], ["in_list", "wordy"])
+    param_names = ["sql_lexer", "statement"]
+
+    def setup(self, sql_lexer, statement):
+        self.sql = _in_list_statement(5000) if statement == "in_list" else _wordy_statement(2000)
+
+        debug = global_settings().debug
+        self.original_sql_lexer = debug.sql_lexer
+        debug.sql_lexer = sql_lexer
+
+    def teardown(self, sql_lexer, statement):
+        global_settings().debug.sql_lexer = self.original_sql_lexer
+
+    def time_sql_lexer(self, sql_lexer, statement):
+        statement = SQLStatement(self.sql, DBAPI2Module)
+        statement.obfuscated
+        statement.normalized
+        statement.operation
+        statement.target
@@ -0,0 +1,69 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import os
+
+from newrelic.core.config import global_settings
+from newrelic.core.database_utils import _sql_statements, sql_statement
+
+FIXTURES = os.path.join(os.path.dirname(__file__), os.pardir, "cross_agent", "fixtures")
+
+
+def _load_statements():
+    with open(os.path.join(FIXTURES, "sql_parsing.json"), "r") as fh:
+        statements = [test["input"] for test in json.load(fh)]
+
+    with open(os.path.join(FIXTURES, "sql_obfuscation", "sql_obfuscation.json"), "r") as fh:
+        statements.extend(test["sql"] for test in json.load(fh) if not test.get("pathological"))
+
+    return statements
+
+
+class DBAPI2Module(object):
+    _nr_quoting_style = "single+double"
+
+
+class TimeSQLStatement(object):
+    """Time taken to obtain the operation, target and normalized form of
+    each of the statements in the cross agent SQL fixtures, as is done
+    when recording a database node, repeated as if for many requests.
+
+    """
+
+    params = [0, 1000]
+    param_names = ["cache_size"]
+
+    def setup(self, cache_size):
+        self.statements = _load_statements()
+
+        limits = global_settings().agent_limits
+        self.original_cache_size = limits.sql_statement_cache_size
+        limits.sql_statement_cache_size = cache_size
+
+        _sql_statements.maxsize = cache_size
+        _sql_statements.clear()
+
+    def teardown(self, cache_size):
+        global_settings().agent_limits.sql_statement_cache_size = self.original_cache_size
+        _sql_statements.clear()
+
+    def time_sql_statement(self, cache_size):
+        for _ in range(100):
+            for sql in self.statements:
+                statement = sql_statement(sql, DBAPI2Module)
+                statement.operation
+                statement.target
+                statement.identifier
@@ -0,0 +1,66 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from newrelic.core.metric import TimeMetric
+from newrelic.core.stats_engine import StatsEngine
+
+from ._transaction_nodes import application_settings
+
+UNIQUE_NAMES = 2000
+SCOPES = 10
+
+
+def populated_stats_engine():
+    stats = StatsEngine()
+    stats.reset_stats(application_settings())
+
+    # 20k unique scoped metrics, each name being recorded in every scope.
+
+    for index in range(UNIQUE_NAMES):
+        name = "Function/benchmark:function_%d" % index
+        for scope in range(SCOPES):
+            stats.record_time_metric(
+                TimeMetric(name=name, scope="WebTransaction/Function/scope_%d" % scope, duration=0.1, exclusive=0.05)
+            )
+
+    return stats
+
+
+def normalizer(name):
+    return name.rsplit("_", 1)[0], False
+
+
+class StatsTable(object):
+    """Memory held by, and time to report, a stats table holding 20k
+    unique scoped metrics.
+
+    """
+
+    def setup(self):
+        self.stats = populated_stats_engine()
+
+    def peakmem_populate_stats_table(self):
+        populated_stats_engine()
+
+    def time_merge_metric_stats(self):
+        stats = StatsEngine()
+        stats.reset_stats(self.stats.settings)
+        stats.merge_metric_stats(self.stats)
+
+    def time_metric_data(self):
+        self.stats.metric_data()
+
+    def time_metric_data_normalized(self):
+        self.stats.metric_data(normalizer)
@@ -0,0 +1,78 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import threading
+
+from newrelic.core.application import Application
+from newrelic.core.config import global_settings
+
+from ._transaction_nodes import transaction_node
+
+TRANSACTIONS_PER_RUN = 4096
+
+
+class TimeRecordTransaction(object):
+    """Records a fixed number of transactions spread across a number of
+    threads, with and without sharded accumulation of the stats engine.
+
+    """
+
+    params = ([1, 8, 64], [0, 16])
+    param_names = ["threads", "stats_engine_shards"]
+    timeout = 300
+
+    def setup(self, threads, stats_engine_shards):
+        settings = global_settings()
+        self.original_settings = (
+            settings.developer_mode,
+            settings.license_key,
+            settings.agent_limits.stats_engine_shards,
+        )
+
+        settings.developer_mode = True
+        settings.license_key = "**NOT A LICENSE KEY**"
+        settings.agent_limits.stats_engine_shards = stats_engine_shards
+
+        self.application = Application("Python Agent Benchmarks")
+        self.application.connect_to_data_collector(None)
+
+        self.node = transaction_node(num_nodes=20)
+
+    def teardown(self, threads, stats_engine_shards):
+        settings = global_settings()
+        (
+            settings.developer_mode,
+            settings.license_key,
+            settings.agent_limits.stats_engine_shards,
+        ) = self.original_settings
+
+    def time_record_transaction(self, threads, stats_engine_shards):
+        count = TRANSACTIONS_PER_RUN // threads
+
+        def record():
+            for _ in range(count):
+                self.application.record_transaction(self.node)
+
+        workers = [threading.Thread(target=record) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        # Include the cost of folding the shards back together as that
+        # is work moved out of the recording path into the harvest.
+
+        with self.application._stats_lock:
+            self.application._merge_stats_shards()
@@ -0,0 +1,58 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from newrelic.api.function_trace import FunctionTrace
+
+
+def create_traces(count, depth):
+    # Builds chains of nested traces without entering them, which is the
+    # allocation done for every instrumented call before timing starts.
+
+    traces = []
+    parent = None
+    for i in range(count):
+        if i % depth == 0:
+            parent = None
+        parent = FunctionTrace("trace", parent=parent)
+        traces.append(parent)
+    return traces
+
+
+class TimeTraceCreation(object):
+    """Time taken and memory used to create 1M nested function traces."""
+
+    params = ([1, 100],)
+    param_names = ["depth"]
+
+    def setup(self, depth):
+        self.count = 1000000
+
+    def time_create_traces(self, depth):
+        create_traces(self.count, depth)
+
+    def peakmem_create_traces(self, depth):
+        create_traces(self.count, depth)
+
+    def time_create_traces_with_guid(self, depth):
+        for trace in create_traces(self.count, depth):
+            trace.guid
+
+    def time_create_nodes(self, depth):
+        # Recorded traces are turned into nodes when they exit, which must
+        # not allocate what was left unallocated when creating the traces.
+        for trace in create_traces(self.count, depth):
+            trace.start_time = trace.end_time = 0.0
+            trace.duration = trace.exclusive = 0.0
+            trace.create_node()
@@ -0,0 +1,166 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import threading
+
+from newrelic.api.function_trace import FunctionTrace
+from newrelic.api.transaction import Sentinel
+from newrelic.core.trace_cache import (
+    ContextVarTraceCache,
+    TraceCache,
+    get_event_loop,
+)
+
+from ._transaction_nodes import application_settings
+
+
+class TraceCacheNesting(object):
+    """Time taken to push and pop 100 nested function traces through the
+    trace cache, looking up the current trace for each, while a number of
+    other threads are alive in the process.
+
+    """
+
+    params = ([1, 50, 200], ["thread", "contextvars"])
+    param_names = ["threads", "mode"]
+
+    def setup(self, threads, mode):
+        self.cache = TraceCache() if mode == "thread" else ContextVarTraceCache()
+
+        self.shutdown = threading.Event()
+        self.threads = [threading.Thread(target=self.shutdown.wait) for _ in range(threads - 1)]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+        # The outermost trace stands in for the root of the transaction
+        # and remains in the cache for the duration of the benchmark.
+        parent = FunctionTrace("root")
+        parent.thread_id = self.cache.current_thread_id()
+        self.cache.save_trace(parent)
+
+        self.traces = []
+        for _ in range(100):
+            parent = FunctionTrace("trace", parent=parent)
+            self.traces.append(parent)
+
+    def teardown(self, threads, mode):
+        self.shutdown.set()
+        for thread in self.threads:
+            thread.join()
+
+    def time_nested_traces(self, threads, mode):
+        cache = self.cache
+        for trace in self.traces:
+            assert cache.current_trace() is trace.parent
+            trace.thread_id = cache.current_thread_id()
+            cache.save_trace(trace)
+        for trace in reversed(self.traces):
+            cache.pop_current(trace)
+
+
+class _EventLoop(object):
+    pass
+
+
+class _Task(object):
+    def __init__(self, loop):
+        self._loop = loop
+
+    def get_loop(self):
+        return self._loop
+
+
+class _CachedPath(object):
+    path = "OtherTransaction/Function/block"
+
+
+class _Transaction(object):
+    thread_id = None
+
+    def __init__(self, settings, task):
+        self.settings = settings
+        self.root_span = FunctionTrace("root")
+        self.root_span._task = task
+        self._loop_time = 0.0
+        self._cached_path = _CachedPath()
+
+    def _process_node(self, node):
+        pass
+
+
+def scan_event_loop_traces(cache, loop):
+    """The selection of traces for attributing blocking of an event loop
+    as originally implemented, scanning all traces in the cache.
+
+    """
+
+    result = []
+    seen = set()
+
+    for trace in cache.values():
+        if trace in seen:
+            continue
+
+        if getattr(trace, "_task", None) is not None and get_event_loop(trace._task) is loop:
+            seen.add(trace)
+            result.append(trace)
+
+    return result
+
+
+class TimeEventLoopWait(object):
+    """Time taken to attribute a blocked event loop to the traces in
+    other transactions on that loop, with 10000 concurrent tasks each
+    running a transaction spread evenly across a number of event loops.
+
+    """
+
+    params = ([1, 10, 100], [False, True])
+    param_names = ["loops", "scan"]
+
+    def setup(self, loops, scan):
+        settings = application_settings({"event_loop_visibility.blocking_threshold": 0.0})
+
+        self.cache = TraceCache()
+        if scan:
+            self.cache._event_loop_traces = lambda loop: scan_event_loop_traces(self.cache, loop)
+
+        loops = [_EventLoop() for _ in range(loops)]
+        self.traces = []
+
+        for index in range(10000):
+            task = _Task(loops[index % len(loops)])
+
+            transaction = _Transaction(settings, task)
+            root = Sentinel(transaction)
+            root._task = task
+            trace = FunctionTrace("task", parent=root)
+            trace.root = root
+            trace._task = task
+
+            # The cache and the root only hold weak references to the
+            # traces and transaction.
+            self.cache[id(task)] = trace
+            self.cache._index_trace(id(task), trace)
+            self.traces.append((transaction, trace))
+
+        # The transaction of the last task is the one blocking its
+        # event loop.
+
+        self.cache[self.cache.current_thread_id()] = root
+
+    def time_record_event_loop_wait(self, loops, scan):
+        self.cache.record_event_loop_wait(0.0, 0.1)
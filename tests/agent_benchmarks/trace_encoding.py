@@ -0,0 +1,67 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import base64
+import tracemalloc
+import zlib
+
+from newrelic.common.encoding_utils import json_encode, json_encode_compressed
+from newrelic.core.stats_engine import _expand_trace_data
+from newrelic.packages import six
+
+from ._transaction_nodes import application_settings, transaction_node
+
+
+def chained(data):
+    zlib_data = zlib.compress(six.b(json_encode(data)), zlib.Z_DEFAULT_COMPRESSION)
+    return base64.standard_b64encode(zlib_data).decode("Latin-1")
+
+
+def streaming(data):
+    return json_encode_compressed(data, zlib.Z_DEFAULT_COMPRESSION, expand=_expand_trace_data)
+
+
+ENCODERS = {"chained": chained, "streaming": streaming}
+
+
+class TimeTraceEncoding(object):
+    """Time taken and peak memory allocated to compress and base64 encode
+    a transaction trace, comparing the chained calls with the streaming
+    encoder.
+
+    """
+
+    params = ([2000, 20000], ["chained", "streaming"])
+    param_names = ["num_nodes", "encoder"]
+
+    def setup(self, num_nodes, encoder):
+        settings = application_settings()
+        transaction = transaction_node(settings, num_nodes=num_nodes, attributes={"key": "value" * 20})
+        trace = transaction.transaction_trace(None, num_nodes, None)
+        self.data = [trace, list(transaction.string_table.values())]
+        self.encode = ENCODERS[encoder]
+
+    def time_encode(self, num_nodes, encoder):
+        self.encode(self.data)
+
+    def track_peak_allocation(self, num_nodes, encoder):
+        tracemalloc.start()
+        try:
+            self.encode(self.data)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    track_peak_allocation.unit = "bytes"
@@ -0,0 +1,40 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from newrelic.common.encoding_utils import json_encode
+
+from ._transaction_nodes import application_settings, transaction_node
+
+
+class TimeTransactionTrace(object):
+    """Time taken to generate and encode the transaction trace for a
+    transaction with many more nodes than the limit, as for a batch job.
+
+    """
+
+    params = ([2000, 50000], [2000])
+    param_names = ["num_nodes", "transaction_traces_nodes"]
+
+    def setup(self, num_nodes, transaction_traces_nodes):
+        self.settings = application_settings()
+        self.transaction = transaction_node(self.settings, num_nodes=num_nodes)
+
+    def time_transaction_trace(self, num_nodes, transaction_traces_nodes):
+        # Clear anything cached on the transaction from previous runs.
+        self.transaction.__dict__.pop("_trace_node_selection", None)
+        self.transaction.__dict__.pop("_string_table", None)
+
+        trace = self.transaction.transaction_trace(None, transaction_traces_nodes, None)
+        json_encode([trace, list(self.transaction.string_table.values())])
@@ -1026,3 +1026,69 @@ def test_html_insertion_manual_rum_insertion():
     # footer added by the agent.
 
     response.mustcontain(no=["NREUM HEADER", "NREUM.info"])
+
+
+_streamed_chunks = [
+    b"<!DOCTYPE html>\n<html>",
+    b"<head><title>title</title></head>",
+    b"<body>",
+    b"<p>RESPONSE</p>",
+    b"</body></html>",
+]
+
+
+@wsgi_application()
+def target_wsgi_application_streamed(environ, start_response):
+    status = "200 OK"
+
+    response_headers = [("Content-Type", "text/html; charset=utf-8")]
+    start_response(status, response_headers)
+
+    for data in _streamed_chunks:
+        environ["streamed.produced"].append(data)
+        yield data
+
+
+_test_html_insertion_streamed_settings = {
+    "browser_monitoring.enabled": True,
+    "browser_monitoring.auto_instrument": True,
+    "js_agent_loader": "<!-- NREUM HEADER -->",
+}
+
+
+@override_application_settings(_test_html_insertion_streamed_settings)
+def test_html_insertion_streamed():
+    produced = []
+    environ = webtest.TestRequest.blank("/").environ
+    environ["streamed.produced"] = produced
+
+    response_headers = []
+
+    def start_response(status, headers, *args):
+        response_headers.extend(headers)
+
+    result = target_wsgi_application_streamed(environ, start_response)
+
+    try:
+        output = []
+
+        for data in result:
+            output.append(data)
+
+            # Without a content length, data before the insertion point
+            # is sent on as soon as it is produced, rather than being
+            # buffered up to the start of the body.
+            if len(output) == 1:
+                assert data == _streamed_chunks[0]
+                assert len(produced) == 1
+                assert response_headers
+
+    finally:
+        result.close()
+
+    output = b"".join(output)
+
+    assert b"NREUM HEADER" in output
+    assert output.startswith(b"<!DOCTYPE html>\n<html><head><script")
+    assert output.endswith(b"<title>title</title></head><body><p>RESPONSE</p></body></html>")
+    assert not any(name.lower() == "content-length" for name, _ in response_headers)
@@ -17,6 +17,8 @@ import logging
 
 import pytest
 
+from testing_support.fixtures import override_application_settings
+
 from newrelic.agent import get_linking_metadata
 from newrelic.api.background_task import background_task
 from newrelic.api.function_trace import FunctionTrace
@@ -252,3 +254,21 @@ def test_get_linking_metadata_api_inside_transaction():
 def test_get_linking_metadata_api_outside_transaction():
     metadata = get_linking_metadata()
     validate_metadata(metadata, EXPECTED_KEYS_NO_TXN)
+
+
+def test_get_linking_metadata_settings_changed():
+    metadata = get_linking_metadata()
+    app_name = metadata["entity.name"]
+
+    # The metadata returned can be modified without affecting later calls.
+    metadata["entity.name"] = "modified"
+    assert get_linking_metadata()["entity.name"] == app_name
+
+    @override_application_settings({"app_name": "Python Agent Test (renamed)"})
+    @background_task(name="test_get_linking_metadata_settings_changed")
+    def _test():
+        assert get_linking_metadata()["entity.name"] == "Python Agent Test (renamed)"
+
+    _test()
+
+    assert get_linking_metadata()["entity.name"] == app_name
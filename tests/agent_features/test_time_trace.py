@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import logging
+import weakref
 
 import pytest
 from testing_support.validators.validate_transaction_metrics import (
@@ -46,20 +47,20 @@ def test_trace_after_end_of_transaction(caplog):
     assert not error_messages
 
 
-@pytest.mark.parametrize(
-    "trace_type,args",
-    (
-        (DatabaseTrace, ("select * from foo",)),
-        (DatastoreTrace, ("db_product", "db_target", "db_operation")),
-        (ExternalTrace, ("lib", "url")),
-        (FunctionTrace, ("name",)),
-        (GraphQLOperationTrace, ()),
-        (GraphQLResolverTrace, ()),
-        (MemcacheTrace, ("command",)),
-        (MessageTrace, ("lib", "operation", "dst_type", "dst_name")),
-        (SolrTrace, ("lib", "command")),
-    ),
+TRACE_TYPES = (
+    (DatabaseTrace, ("select * from foo",)),
+    (DatastoreTrace, ("db_product", "db_target", "db_operation")),
+    (ExternalTrace, ("lib", "url")),
+    (FunctionTrace, ("name",)),
+    (GraphQLOperationTrace, ()),
+    (GraphQLResolverTrace, ()),
+    (MemcacheTrace, ("command",)),
+    (MessageTrace, ("lib", "operation", "dst_type", "dst_name")),
+    (SolrTrace, ("lib", "command")),
 )
+
+
+@pytest.mark.parametrize("trace_type,args", TRACE_TYPES)
 @background_task()
 def test_trace_finalizes_with_transaction_missing_settings(monkeypatch, trace_type, args):
     txn = current_transaction()
@@ -71,3 +72,48 @@ def test_trace_finalizes_with_transaction_missing_settings(monkeypatch, trace_ty
         # Ensure transaction still has settings when it exits to prevent other crashes making errors hard to read
         monkeypatch.undo()
         assert txn.settings
+
+
+@pytest.mark.parametrize("trace_type,args", TRACE_TYPES)
+def test_trace_lazy_attributes(trace_type, args):
+    trace = trace_type(*args)
+
+    # Nothing is allocated until first used.
+    assert trace._guid is None
+    assert trace._agent_attributes is None
+    assert trace._user_attributes is None
+
+    guid = trace.guid
+    assert len(guid) == 16
+    assert trace.guid == guid
+
+    trace._add_agent_attribute("key", "value")
+    assert trace.agent_attributes == {"key": "value"}
+    assert trace._user_attributes is None
+
+
+@pytest.mark.parametrize("trace_type,args", TRACE_TYPES)
+def test_trace_slots_compatibility(trace_type, args):
+    trace = trace_type(*args)
+
+    # Traces must remain weak referenceable for the trace cache and
+    # accept ad hoc attributes set by instrumentation.
+    assert weakref.ref(trace)() is trace
+
+    trace._nr_custom = 1
+    assert trace._nr_custom == 1
+
+    trace.guid = "0123456789abcdef"
+    assert trace.guid == "0123456789abcdef"
+
+
+@pytest.mark.parametrize("trace_type,args", TRACE_TYPES)
+@background_task()
+def test_trace_slots_node(trace_type, args):
+    with trace_type(*args) as trace:
+        trace.add_custom_attribute("custom", "value")
+        guid = trace.guid
+
+    node = trace.create_node()
+    assert node.guid == guid
+    assert node.user_attributes == {"custom": "value"}
@@ -467,6 +467,86 @@ def test_span_supportability_metrics(mock_grpc_server, monkeypatch, app, dropped
     _test()
 
 
+def test_span_drop_counts_exact(
+    mock_grpc_server, monkeypatch, app, batching, spans_received, span_batches_received, spans_processed_event
+):
+    wait_event = threading.Event()
+    continue_event = threading.Event()
+
+    queue_size = 10
+    total_spans = 75
+
+    metrics = [
+        ("Supportability/InfiniteTracing/Span/Seen", total_spans),
+        ("Supportability/InfiniteTracing/Span/Sent", queue_size),
+    ]
+
+    class WaitOnWait(CONDITION_CLS):
+        def wait(self, *args, **kwargs):
+            wait_event.set()
+            ret = super(WaitOnWait, self).wait(*args, **kwargs)
+            assert continue_event.wait(timeout=5)
+            return ret
+
+    @staticmethod
+    def condition(*args, **kwargs):
+        return WaitOnWait(*args, **kwargs)
+
+    monkeypatch.setattr(StreamBuffer, "condition", condition)
+
+    def received():
+        if batching:
+            return sum(len(batch.spans) for batch in span_batches_received)
+        return len(spans_received)
+
+    @override_generic_settings(
+        settings,
+        {
+            "distributed_tracing.enabled": True,
+            "span_events.enabled": True,
+            "infinite_tracing.trace_observer_host": "localhost",
+            "infinite_tracing.trace_observer_port": mock_grpc_server,
+            "infinite_tracing.ssl": False,
+            "infinite_tracing.batching": batching,
+            "infinite_tracing.span_queue_size": queue_size,
+        },
+    )
+    @validate_metric_payload(metrics)
+    def _test():
+        app.connect_to_data_collector(None)
+
+        assert wait_event.wait(timeout=5)
+
+        stream_buffer = app._stats_engine.span_stream
+
+        # Overflow the buffer from several threads while the iterator is
+        # blocked, in groups as is done for the spans of a transaction.
+        def produce():
+            for _ in range(5):
+                stream_buffer.put_many(Span(intrinsics={}, agent_attributes={}, user_attributes={}) for _ in range(5))
+
+        threads = [threading.Thread(target=produce) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        continue_event.set()
+
+        # Wait for every span that was not dropped to reach the server.
+        start_time = time.time()
+        while received() < queue_size:
+            assert spans_processed_event.wait(timeout=5)
+            spans_processed_event.clear()
+            assert time.time() - start_time < 5, "Timed out waiting for spans."
+
+        assert received() == queue_size
+
+        app.harvest()
+
+    _test()
+
+
 @pytest.mark.parametrize("trace_observer_host", ["localhost", None])
 @pytest.mark.parametrize("batching", [True, False])
 @pytest.mark.parametrize("compression", [True, False])
@@ -12,11 +12,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from functools import partial
+
 from newrelic.api.background_task import background_task
 from newrelic.api.transaction import current_transaction
+from newrelic.common.streaming_utils import SpanProtoAttrs
+from newrelic.core.config import finalize_application_settings
+from newrelic.core.infinite_tracing_pb2 import Span
+from newrelic.core.root_node import RootNode
+from newrelic.core.transaction_node import TransactionNode
 
 from testing_support.fixtures import (override_application_settings,
         core_application_stats_engine)
+from testing_support.trace_nodes import function_node
 from testing_support.validators.validate_span_events import (
         validate_span_events)
 
@@ -43,3 +51,40 @@ def test_span_stream_is_singleton():
 
     # The workarea span stream should be equal to the global span stream
     assert stats_engine.span_stream is workarea.span_stream
+
+
+def test_span_protos_match_span_events():
+    settings = finalize_application_settings({})
+    node = partial(function_node, agent_attributes={"code.lineno": 10}, user_attributes={"user": u"value"})
+
+    root = RootNode(
+        name="Function/main",
+        children=(node("a", children=(node("b"),)), node("a")),
+        start_time=0.0,
+        end_time=1.0,
+        exclusive=0.0,
+        duration=1.0,
+        guid="root",
+        agent_attributes={},
+        user_attributes={},
+        path="OtherTransaction/Function/main",
+        trusted_parent_span=None,
+        tracing_vendors=None,
+    )
+
+    fields = dict.fromkeys(TransactionNode._fields)
+    fields.update(settings=settings, root=root, guid="guid", trace_id="trace", sampled=True, priority=1.5)
+    transaction = TransactionNode(**fields)
+
+    # The spans built directly must match converting the span events.
+    expected = [
+        Span(
+            trace_id="trace",
+            intrinsics=SpanProtoAttrs(i_attrs),
+            user_attributes=SpanProtoAttrs(u_attrs),
+            agent_attributes=SpanProtoAttrs(a_attrs),
+        )
+        for i_attrs, u_attrs, a_attrs in transaction.span_events(settings)
+    ]
+
+    assert list(transaction.span_protos(settings)) == expected
@@ -12,6 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
+import time
+
 import pytest
 from conftest import CONDITION_CLS
 
@@ -85,3 +88,72 @@ def test_stream_buffer_queue_size():
     assert len(stream_buffer) == 1
     assert stream_buffer._dropped == 1
     assert stream_buffer._seen == 2
+
+
+def test_stream_buffer_put_many_exact_drop_counts():
+    stream_buffer = StreamBuffer(10)
+
+    def produce():
+        for _ in range(100):
+            stream_buffer.put_many(Span(intrinsics={}, agent_attributes={}, user_attributes={}) for _ in range(3))
+
+    threads = [threading.Thread(target=produce) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+
+    # Consume concurrently with the producers.
+    consumed = 0
+    while any(thread.is_alive() for thread in threads) or stream_buffer:
+        with stream_buffer._notify:
+            if stream_buffer:
+                stream_buffer._queue.popleft()
+                consumed += 1
+
+    for thread in threads:
+        thread.join()
+
+    seen, dropped = stream_buffer.stats()
+    assert seen == 1200
+    assert dropped == seen - consumed
+
+
+def test_stream_buffer_iterator_adaptive_batch_size(stop_iteration_on_wait):
+    stream_buffer = StreamBuffer(1000, batching=True)
+
+    for _ in range(1000):
+        span = Span(intrinsics={}, agent_attributes={}, user_attributes={})
+        stream_buffer.put(span)
+
+    iterator = iter(stream_buffer)
+    assert len(next(iterator).spans) == StreamBufferIterator.MAX_BATCH_SIZE
+
+    # Simulate sending the previous batch taking too long.
+    iterator._batch_time -= StreamBufferIterator.MAX_BATCH_SEND_TIME + 1
+    assert len(next(iterator).spans) == StreamBufferIterator.MAX_BATCH_SIZE // 2
+
+    # Quickly sent batches grow back to the maximum size.
+    sizes = [len(next(iterator).spans) for _ in range(6)]
+    assert sizes == sorted(sizes)
+    assert sizes[-1] == StreamBufferIterator.MAX_BATCH_SIZE
+
+
+def test_stream_buffer_iterator_batch_timeout():
+    stream_buffer = StreamBuffer(100, batching=True, batch_timeout=0.25)
+
+    for _ in range(5):
+        span = Span(intrinsics={}, agent_attributes={}, user_attributes={})
+        stream_buffer.put(span)
+
+    def produce():
+        # Wait until the iterator is holding back the partial batch.
+        while not stream_buffer._waiting:
+            time.sleep(0.01)
+        stream_buffer.put_many(Span(intrinsics={}, agent_attributes={}, user_attributes={}) for _ in range(5))
+
+    thread = threading.Thread(target=produce)
+    thread.start()
+
+    batch = next(iter(stream_buffer))
+    thread.join()
+
+    assert len(batch.spans) == 10
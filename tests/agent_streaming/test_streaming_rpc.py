@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import threading
+import time
 
 import pytest
 from testing_support.fixtures import override_generic_settings
@@ -183,3 +184,47 @@ def test_rpc_serialization_and_deserialization(
     else:
         assert not span_batches_received, "Span batches incorrectly received."
         assert spans_received, "No spans received."
+
+
+def test_parallel_streams_share_stream_buffer(
+    mock_grpc_server, batching, spans_received, span_batches_received, spans_processed_event
+):
+    endpoint = "localhost:%s" % mock_grpc_server
+    stream_buffer = StreamBuffer(100, batching=batching)
+
+    rpcs = [
+        StreamingRpc(endpoint, stream_buffer, DEFAULT_METADATA, record_metric, ssl=False, stream_id=stream_id)
+        for stream_id in range(2)
+    ]
+
+    for rpc in rpcs:
+        rpc.connect()
+
+    total_spans = 60
+
+    def received():
+        if batching:
+            return sum(len(batch.spans) for batch in span_batches_received)
+        return len(spans_received)
+
+    try:
+        for _ in range(total_spans // 5):
+            stream_buffer.put_many(Span(intrinsics={}, agent_attributes={}, user_attributes={}) for _ in range(5))
+
+        start_time = time.time()
+        while received() < total_spans:
+            assert spans_processed_event.wait(timeout=5)
+            spans_processed_event.clear()
+            assert time.time() - start_time < 5, "Timed out waiting for spans."
+
+        # Every span is sent exactly once, by one of the streams.
+        assert received() == total_spans
+        assert sum(rpc.stats() for rpc in rpcs) == total_spans
+        assert sum(rpc.stats() for rpc in rpcs) == 0
+
+    finally:
+        for rpc in rpcs:
+            rpc.close()
+
+    for rpc in rpcs:
+        assert not rpc.response_processing_thread.is_alive()
@@ -73,3 +73,18 @@ def test_agent_final_harvest(agent):
 
     assert agent._applications['fake'].harvest_flexible == 1
     assert agent._applications['fake'].harvest_default == 1
+
+
+@override_generic_settings(SETTINGS, {'agent_limits.harvest_threads': 2})
+def test_agent_final_harvest_pool():
+    agent = FakeAgent(SETTINGS)
+    agent._applications['other'] = FakeApplication()
+    assert agent._harvest_pool is not None
+
+    agent.activate_agent()
+    agent.shutdown_agent(timeout=5)
+    assert not agent._harvest_thread.is_alive()
+
+    for application in agent._applications.values():
+        assert application.harvest_flexible == 1
+        assert application.harvest_default == 1
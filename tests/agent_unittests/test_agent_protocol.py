@@ -12,17 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import base64
 import logging
 import os
 import ssl
 import tempfile
+import zlib
 from collections import namedtuple
 
 import pytest
 
 from newrelic.common import certs, system_info
 from newrelic.common.agent_http import DeveloperModeClient
-from newrelic.common.encoding_utils import json_decode, serverless_payload_decode
+from newrelic.common.encoding_utils import (
+    json_decode,
+    json_encode,
+    json_encode_chunks,
+    json_encode_compressed,
+    serverless_payload_decode,
+)
 from newrelic.common.utilization import CommonUtilization
 from newrelic.core.agent_protocol import AgentProtocol, ServerlessModeProtocol
 from newrelic.core.config import finalize_application_settings, global_settings
@@ -78,6 +86,7 @@ class HttpClientRecorder(DeveloperModeClient):
         headers=None,
         payload=None,
     ):
+        payload = self._join_payload(payload)
         request = Request(method=method, path=path, params=params, headers=headers, payload=payload)
         self.SENT.append(request)
         if self.STATUS_CODE:
@@ -205,6 +214,76 @@ def test_send(status_code):
     assert protocol.finalize() is None
 
 
+@pytest.mark.parametrize(
+    "payload",
+    (
+        (1, 2, 3),
+        [],
+        {"key": "value"},
+        u"unicode \u2603",
+        ("run_id", 0.0, 1.0, [[{"name": "metric"}, [1, 2.0, 3.0, 4.0, 5.0, 6.0]]] * 1000),
+        ("run_id", {"reservoir_size": 10, "events_seen": 1}, [[{"guid": u"\u2603"}, {}, {}]] * 600),
+        [list(range(300)), [], list(range(700))],
+    ),
+)
+def test_json_encode_chunks(payload):
+    chunks = list(json_encode_chunks(payload, batch_size=256))
+    assert "".join(chunks) == json_encode(payload)
+
+
+def test_json_encode_chunks_generator():
+    payload = (x for x in range(1000))
+    chunks = list(json_encode_chunks(payload, batch_size=256))
+    assert "".join(chunks) == json_encode(list(range(1000)))
+
+
+def _nested_tree(depth, fanout):
+    if not depth:
+        return [0.0, 1.0, "leaf", {"key": u"value \u2603"}, []]
+    return [0.0, 1.0, "node", {}, [_nested_tree(depth - 1, fanout) for _ in range(fanout)]]
+
+
+def test_json_encode_chunks_expand():
+    payload = [_nested_tree(4, 3), ["string"] * 10]
+    chunks = list(json_encode_chunks(payload, batch_size=256, expand=lambda item: True))
+    assert len(chunks) > 100
+    assert "".join(chunks) == json_encode(payload)
+
+
+@pytest.mark.parametrize(
+    "payload",
+    (
+        {},
+        {"sql": "SELECT * FROM table", "backtrace": ["line"] * 50},
+        [_nested_tree(6, 4), ["string"] * 300],
+        ("run_id", [[{"guid": u"\u2603"}, {}, {}]] * 600),
+    ),
+)
+@pytest.mark.parametrize("level", (zlib.Z_DEFAULT_COMPRESSION, 1, 9))
+def test_json_encode_compressed(payload, level):
+    expected = base64.standard_b64encode(zlib.compress(six.b(json_encode(payload)), level))
+    if six.PY3:
+        expected = expected.decode("Latin-1")
+
+    # Use a small chunk size so that compressed output spans many blocks.
+
+    result = json_encode_compressed(payload, level, expand=lambda item: True, chunk_size=512)
+    assert result == expected
+
+
+def test_send_large_payload():
+    HttpClientRecorder.STATUS_CODE = None
+    settings = finalize_application_settings({"agent_run_id": "RUN_TOKEN"})
+    protocol = AgentProtocol(settings, client_cls=HttpClientRecorder)
+
+    events = [[{"type": "Span", "name": u"span-\u2603", "priority": 1.0}, {}, {}]] * 10000
+    payload = ("RUN_TOKEN", {"reservoir_size": 10000, "events_seen": 10000}, events)
+    protocol.send("span_event_data", payload)
+
+    request = HttpClientRecorder.SENT[0]
+    assert request.payload == json_encode(payload).encode("utf-8")
+
+
 @pytest.mark.parametrize(
     "status_code,expected_exc,log_level",
     (
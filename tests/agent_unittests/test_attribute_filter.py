@@ -0,0 +1,143 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import random
+import threading
+
+import pytest
+
+from newrelic.core.attribute_filter import (
+    DST_ALL,
+    DST_ERROR_COLLECTOR,
+    DST_NONE,
+    DST_SPAN_EVENTS,
+    DST_TRANSACTION_EVENTS,
+    DST_TRANSACTION_TRACER,
+    AttributeFilter,
+)
+
+
+def _settings(**overrides):
+    settings = {
+        "attributes.enabled": True,
+        "transaction_events.attributes.enabled": True,
+        "transaction_tracer.attributes.enabled": True,
+        "error_collector.attributes.enabled": True,
+        "span_events.attributes.enabled": True,
+    }
+    settings.update(overrides)
+    return settings
+
+
+def _linear_apply(attribute_filter, name, default_destinations):
+    # Reference implementation walking every rule in sorted order.
+
+    destinations = attribute_filter.enabled_destinations & default_destinations
+    for rule in attribute_filter.rules:
+        if rule.name_match(name):
+            if rule.is_include:
+                destinations |= rule.destinations & attribute_filter.enabled_destinations
+            else:
+                destinations &= ~rule.destinations
+    return destinations
+
+
+def test_cache_is_bounded():
+    attribute_filter = AttributeFilter(_settings(**{"agent_limits.attribute_filter_cache_size": 10}))
+
+    for index in range(100):
+        attribute_filter.apply("user.%d" % index, DST_ALL)
+
+    assert len(attribute_filter.cache) == 10
+    assert attribute_filter.cache.stats() == (0, 100, 90)
+
+
+def test_cache_hits():
+    attribute_filter = AttributeFilter(_settings(**{"attributes.exclude": ["request.*"]}))
+
+    assert attribute_filter.apply("request.uri", DST_ALL) == DST_NONE
+    assert attribute_filter.apply("request.uri", DST_ALL) == DST_NONE
+    assert attribute_filter.apply("response.status", DST_ALL) != DST_NONE
+
+    assert attribute_filter.cache.stats() == (1, 2, 0)
+
+    # Counts are reset once read.
+    assert attribute_filter.cache.stats() == (0, 0, 0)
+
+
+def test_cache_disabled():
+    attribute_filter = AttributeFilter(_settings(**{"agent_limits.attribute_filter_cache_size": 0}))
+
+    assert attribute_filter.apply("foo", DST_TRANSACTION_EVENTS) == DST_TRANSACTION_EVENTS
+    assert attribute_filter.apply("foo", DST_TRANSACTION_EVENTS) == DST_TRANSACTION_EVENTS
+    assert len(attribute_filter.cache) == 0
+
+
+def test_cache_shared_between_threads():
+    attribute_filter = AttributeFilter(_settings(**{"agent_limits.attribute_filter_cache_size": 50}))
+
+    def apply():
+        for index in range(2000):
+            attribute_filter.apply("user.%d" % (index % 100), DST_ALL)
+
+    threads = [threading.Thread(target=apply) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    hits, misses, evictions = attribute_filter.cache.stats()
+
+    assert len(attribute_filter.cache) == 50
+    assert hits + misses == 8 * 2000
+
+    # Threads missing on the same name at once each put the result, but
+    # only the first of those adds an entry to the cache.
+    assert evictions <= misses - 50
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_indexed_rules_match_linear_walk(seed):
+    rng = random.Random(seed)
+
+    fragments = ["", "a", "ab", "abc", "b", "ba", "request.", "request.headers.", "x"]
+
+    def rule_names():
+        return [rng.choice(fragments) + rng.choice(("", "*")) for _ in range(rng.randint(0, 4))]
+
+    attribute_filter = AttributeFilter(
+        _settings(
+            **{
+                "attributes.include": rule_names(),
+                "attributes.exclude": rule_names(),
+                "transaction_events.attributes.exclude": rule_names(),
+                "transaction_tracer.attributes.include": rule_names(),
+                "error_collector.attributes.exclude": rule_names(),
+                "span_events.attributes.include": rule_names(),
+            }
+        )
+    )
+
+    for first in fragments:
+        for second in fragments:
+            name = first + second
+            for default_destinations in (
+                DST_ALL,
+                DST_NONE,
+                DST_TRANSACTION_EVENTS | DST_ERROR_COLLECTOR,
+                DST_TRANSACTION_TRACER | DST_SPAN_EVENTS,
+            ):
+                expected = _linear_apply(attribute_filter, name, default_destinations)
+                assert attribute_filter.apply(name, default_destinations) == expected, name
@@ -0,0 +1,196 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sqlite3
+
+import pytest
+from testing_support.fixtures import override_generic_settings
+
+from newrelic.core.config import global_settings
+from newrelic.core.database_utils import (
+    ExplainPlanWorker,
+    SQLConnections,
+    _explain_plans,
+    explain_plan,
+    explain_plan_cache_stats,
+    sql_statement,
+)
+
+SQL = "SELECT * FROM sqlite_master WHERE name = 'foo'"
+
+
+class CountingDBAPI2Module(object):
+    """Wraps the sqlite3 module, counting the connections made."""
+
+    __name__ = "counting_sqlite3"
+
+    _nr_database_product = "SQLite"
+    _nr_quoting_style = "single"
+    _nr_explain_query = "EXPLAIN QUERY PLAN"
+    _nr_explain_stmts = ("select",)
+
+    NotSupportedError = sqlite3.NotSupportedError
+
+    def __init__(self):
+        self.connects = 0
+
+    def connect(self, *args, **kwargs):
+        self.connects += 1
+        return sqlite3.connect(*args, **kwargs)
+
+
+@pytest.fixture
+def dbapi2_module():
+    return CountingDBAPI2Module()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    _explain_plans.clear()
+    yield
+    _explain_plans.clear()
+
+
+def run_explain_plan(dbapi2_module, connect_params=((":memory:",), {})):
+    with SQLConnections() as connections:
+        return explain_plan(
+            connections, sql_statement(SQL, dbapi2_module), connect_params, None, None, None, "obfuscated"
+        )
+
+
+def test_explain_plan_cached(dbapi2_module):
+    previous = explain_plan_cache_stats()
+
+    first = run_explain_plan(dbapi2_module)
+    second = run_explain_plan(dbapi2_module)
+
+    assert first is not None
+    assert second == first
+    assert dbapi2_module.connects == 1
+    assert tuple(total - last for total, last in zip(explain_plan_cache_stats(), previous)) == (1, 1, 0, 0)
+
+
+def test_explain_plan_cached_per_connect_params(dbapi2_module):
+    run_explain_plan(dbapi2_module)
+    run_explain_plan(dbapi2_module, (("file::memory:",), {"uri": True}))
+
+    assert dbapi2_module.connects == 2
+
+
+def test_explain_plan_unhashable_connect_params_not_cached(dbapi2_module):
+    connect_params = ((":memory:",), {"detect_types": 0, "unused": []})
+
+    with SQLConnections() as connections:
+        statement = sql_statement(SQL, dbapi2_module)
+        for _ in range(2):
+            explain_plan(connections, statement, connect_params, None, None, None, "obfuscated")
+
+    # The connection fails due to the unknown keyword argument, but no
+    # result is cached for it either way.
+
+    assert dbapi2_module.connects == 2
+    assert len(_explain_plans._plans) == 0
+
+
+@override_generic_settings(global_settings(), {"transaction_tracer.explain_plan_cache_ttl": 0.0})
+def test_explain_plan_cache_disabled(dbapi2_module):
+    run_explain_plan(dbapi2_module)
+    run_explain_plan(dbapi2_module)
+
+    assert dbapi2_module.connects == 2
+
+
+def test_explain_plan_cache_expired(dbapi2_module):
+    run_explain_plan(dbapi2_module)
+
+    key, (expires, details) = list(_explain_plans._plans._data.items())[0]
+    _explain_plans._plans._data[key] = (expires - 300.0, details)
+
+    run_explain_plan(dbapi2_module)
+
+    assert dbapi2_module.connects == 2
+
+
+@override_generic_settings(global_settings(), {"transaction_tracer.explain_plan_async": True})
+def test_explain_plan_async(dbapi2_module, monkeypatch):
+    worker = ExplainPlanWorker()
+    monkeypatch.setattr("newrelic.core.database_utils._explain_plan_worker", worker)
+
+    try:
+        # The first harvest only queues the explain plan, with it being
+        # available to the next harvest once the worker has run it.
+
+        assert run_explain_plan(dbapi2_module) is None
+        assert worker.wait(timeout=5.0)
+
+        assert run_explain_plan(dbapi2_module) is not None
+        assert dbapi2_module.connects == 1
+
+    finally:
+        worker.shutdown()
+
+
+class DummyThread(object):
+    def __init__(self, alive):
+        self.alive = alive
+
+    def is_alive(self):
+        return self.alive
+
+
+@override_generic_settings(global_settings(), {"agent_limits.sql_explain_plan_cache_size": 1})
+def test_explain_plan_worker_bounded():
+    worker = ExplainPlanWorker()
+
+    # Prevent a worker thread being started so that requests stay queued.
+
+    worker._thread = DummyThread(alive=True)
+
+    worker.submit("a", ())
+    worker.submit("a", ())
+    worker.submit("b", ())
+
+    assert list(worker._queue) == [("a", ())]
+    assert worker.stats() == 1
+
+    worker.submit("c", ())
+    assert worker.stats() == 2
+
+    worker.shutdown()
+    assert worker.wait(timeout=0.0)
+
+
+@override_generic_settings(global_settings(), {"transaction_tracer.explain_plan_async": True})
+def test_explain_plan_worker_restarted(dbapi2_module, monkeypatch):
+    worker = ExplainPlanWorker()
+    monkeypatch.setattr("newrelic.core.database_utils._explain_plan_worker", worker)
+
+    # A worker thread which has gone away, as after a fork, with requests
+    # still waiting for it.
+
+    worker._thread = DummyThread(alive=False)
+    worker._queue.append(("stale", ()))
+    worker._pending.add("stale")
+
+    try:
+        assert run_explain_plan(dbapi2_module) is None
+        assert worker.wait(timeout=5.0)
+
+        assert "stale" not in worker._pending
+        assert worker._thread.is_alive()
+        assert run_explain_plan(dbapi2_module) is not None
+
+    finally:
+        worker.shutdown()
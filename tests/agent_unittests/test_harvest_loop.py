@@ -12,8 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 import random
 import tempfile
+import threading
 import time
 
 import pytest
@@ -25,11 +27,13 @@ from testing_support.fixtures import (
 
 from newrelic.common.agent_http import DeveloperModeClient
 from newrelic.common.object_wrapper import function_wrapper, transient_function_wrapper
-from newrelic.core.application import Application
+from newrelic.core.application import LOG_EVENT_BATCH_SIZE, Application
 from newrelic.core.config import finalize_application_settings, global_settings
 from newrelic.core.custom_event import create_custom_event
+from newrelic.core.database_utils import sql_statement
 from newrelic.core.error_node import ErrorNode
 from newrelic.core.function_node import FunctionNode
+from newrelic.core.harvest_pool import HarvestPool
 from newrelic.core.log_event_node import LogEventNode
 from newrelic.core.root_node import RootNode
 from newrelic.core.stats_engine import CustomMetrics, SampledDataSet
@@ -472,6 +476,209 @@ def test_transaction_count(transaction_node):
     assert app._transaction_count == 0
 
 
+@override_generic_settings(
+    settings,
+    {
+        "developer_mode": True,
+        "license_key": "**NOT A LICENSE KEY**",
+        "feature_flag": set(),
+        "collect_custom_events": False,
+        "application_logging.forwarding.enabled": False,
+        "agent_limits.stats_engine_shards": 4,
+    },
+)
+def test_sharded_transaction_recording(transaction_node):
+    app = Application("Python Agent Test (Harvest Loop)")
+    app.connect_to_data_collector(None)
+
+    assert len(app._stats_shards) == 4
+
+    threads = [threading.Thread(target=app.record_transaction, args=(transaction_node,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Data is held in the shards until a harvest is performed, with the
+    # threads spread evenly across the shards
+    assert app._transaction_count == 0
+    assert [shard.transaction_count for shard in app._stats_shards] == [2, 2, 2, 2]
+    assert app._stats_engine.transaction_events.num_seen == 0
+
+    with app._stats_lock:
+        app._merge_stats_shards()
+
+    assert app._transaction_count == 8
+    assert sum(shard.transaction_count for shard in app._stats_shards) == 0
+    assert app._stats_engine.transaction_events.num_seen == 8
+    assert app._stats_engine.transaction_events.num_samples == 8
+    assert app._stats_engine.stats_table[("OtherTransaction/all", "")].call_count == 8
+
+    app.record_transaction(transaction_node)
+    app.harvest()
+
+    # Harvest folds in the shards and resets the transaction count
+    assert app._transaction_count == 0
+    assert sum(shard.transaction_count for shard in app._stats_shards) == 0
+    assert app._stats_engine.transaction_events.num_seen == 0
+
+
+@override_generic_settings(
+    settings,
+    {
+        "developer_mode": True,
+        "license_key": "**NOT A LICENSE KEY**",
+        "application_logging.forwarding.enabled": True,
+    },
+)
+def test_buffered_log_events():
+    app = Application("Python Agent Test (Harvest Loop)")
+    app.connect_to_data_collector(None)
+
+    # Log events recorded outside of a transaction are buffered until
+    # there are enough to add to the stats engine together.
+    for _ in range(LOG_EVENT_BATCH_SIZE - 1):
+        app.record_log_event("A", "WARNING")
+    assert app._stats_engine.log_events.num_seen == 0
+
+    app.record_log_event("A", "WARNING")
+    assert app._stats_engine.log_events.num_seen == LOG_EVENT_BATCH_SIZE
+    assert not app._log_event_buffer
+
+    app.record_log_event("B", "ERROR")
+
+    sent = []
+
+    @transient_function_wrapper("newrelic.core.data_collector", "Session.send_log_events")
+    def send_log_events(wrapped, instance, args, kwargs):
+        sent.append(args[0]["events_seen"])
+        return wrapped(*args, **kwargs)
+
+    # Those remaining in the buffer are included in the next harvest.
+    send_log_events(app.harvest)(flexible=True)
+    send_log_events(app.harvest)(flexible=False)
+
+    assert sent == [LOG_EVENT_BATCH_SIZE + 1]
+    assert app._stats_engine.log_events.num_seen == 0
+
+
+class DummyDBAPI2Module(object):
+    _nr_quoting_style = "single"
+
+
+@override_generic_settings(
+    settings,
+    {
+        "developer_mode": True,
+        "license_key": "**NOT A LICENSE KEY**",
+    },
+)
+def test_process_stats_reported_by_each_application():
+    apps = [Application("Python Agent Test (Harvest Loop %d)" % i) for i in range(2)]
+    for app in apps:
+        app.connect_to_data_collector(None)
+
+    sent = []
+
+    @transient_function_wrapper("newrelic.core.data_collector", "Session.send_metric_data")
+    def send_metric_data(wrapped, instance, args, kwargs):
+        for metric_info, metric_values in args[2]:
+            if metric_info["name"] == "Supportability/Python/SQLStatement/Cache/Misses":
+                sent.append(metric_values[0])
+        return wrapped(*args, **kwargs)
+
+    sql_statement("SELECT * FROM process_stats_%f" % time.time(), DummyDBAPI2Module)
+
+    # The cache is shared by the applications, so a harvest by one must
+    # not reset the counts for the other.
+
+    for app in apps:
+        send_metric_data(app.harvest)()
+
+    assert sent == [1, 1]
+
+    del sent[:]
+    for app in apps:
+        send_metric_data(app.harvest)()
+
+    assert sent == [0, 0]
+
+
+@failing_endpoint("metric_data")
+@override_generic_settings(
+    settings,
+    {
+        "developer_mode": True,
+        "license_key": "**NOT A LICENSE KEY**",
+    },
+)
+def test_harvest_pool_sends_endpoints(transaction_node):
+    app = Application("Python Agent Test (Harvest Loop)")
+    app.connect_to_data_collector(None)
+
+    app.record_transaction(transaction_node)
+
+    pool = HarvestPool(4)
+    try:
+        app.harvest(pool=pool)
+    finally:
+        pool.shutdown()
+
+    # Events are sent concurrently ahead of the metric data, so are not
+    # rolled back when sending the metric data fails.
+    assert app._stats_engine.transaction_events.num_seen == 0
+    assert app._stats_engine.error_events.num_seen == 0
+    assert app._stats_engine.custom_events.num_seen == 0
+    assert app._stats_engine.log_events.num_seen == 0
+    assert app._stats_engine.span_events.num_seen == 0
+
+    # The internal metrics recorded in each pool thread are merged in
+    # with the metric data that was rolled back.
+    stats_table = app._stats_engine.stats_table
+    for endpoint in (
+        "analytic_event_data",
+        "span_event_data",
+        "error_event_data",
+        "custom_event_data",
+        "log_event_data",
+        "error_data",
+    ):
+        assert ("Supportability/Python/Harvest/Endpoint/%s" % endpoint, "") in stats_table
+    assert ("Supportability/SpanEvent/TotalEventsSent", "") in stats_table
+    assert ("Supportability/Python/Collector/analytic_event_data/Output/Bytes", "") in stats_table
+
+
+@failing_endpoint("analytic_event_data")
+@override_generic_settings(
+    settings,
+    {
+        "developer_mode": True,
+        "license_key": "**NOT A LICENSE KEY**",
+    },
+)
+def test_harvest_pool_failing_endpoint(transaction_node):
+    app = Application("Python Agent Test (Harvest Loop)")
+    app.connect_to_data_collector(None)
+
+    app.record_transaction(transaction_node)
+
+    pool = HarvestPool(4)
+    try:
+        app.harvest(pool=pool)
+    finally:
+        pool.shutdown()
+
+    # Only the data which failed to send is rolled back, along with the
+    # metric data which is not sent after a failure.
+    assert app._stats_engine.transaction_events.num_seen == 1
+    assert app._stats_engine.span_events.num_seen == 0
+    assert app._stats_engine.custom_events.num_seen == 0
+    assert ("OtherTransaction/all", "") in app._stats_engine.stats_table
+    assert ("Supportability/Python/Harvest/Exception/newrelic.network.exceptions:RetryDataForRequest", "") in (
+        app._stats_engine.stats_table
+    )
+
+
 @override_generic_settings(
     settings,
     {
@@ -895,7 +1102,58 @@ def test_default_events_harvested(allowlist_event):
     num_seen = 0 if (allowlist_event != "span_event_data") else 1
     assert app._stats_engine.span_events.num_seen == num_seen
 
-    assert app._stats_engine.metrics_count() == 4
+    assert ("Supportability/Python/Harvest/Endpoint/metric_data", "") in app._stats_engine.stats_table
+    assert app._stats_engine.metrics_count() == 5
+
+
+def test_harvest_spool(tmpdir):
+    def spooled_segments():
+        return [name for _, _, names in os.walk(str(tmpdir)) for name in names]
+
+    @failing_endpoint("analytic_event_data")
+    @override_generic_settings(
+        settings,
+        {
+            "developer_mode": True,
+            "harvest_spool.enabled": True,
+            "harvest_spool.directory": str(tmpdir),
+        },
+    )
+    def _test():
+        app = Application("Python Agent Test (Harvest Loop)")
+        app.connect_to_data_collector(None)
+
+        app._stats_engine.transaction_events.add("transaction event")
+        app._stats_engine.record_custom_metric("Custom/test_harvest_spool", 1)
+
+        app.harvest()
+
+        # Data which failed to send is spooled rather than rolled back, as
+        # is the remaining data for the harvest, including the metric data.
+        assert app._stats_engine.transaction_events.num_seen == 0
+        assert ("Custom/test_harvest_spool", "") not in app._stats_engine.stats_table
+        assert len(spooled_segments()) == 1
+
+        endpoints_called = []
+
+        @validate_metric_payload(
+            metrics=[
+                ("Supportability/Python/HarvestSpool/Spooled", 2),
+                ("Supportability/Python/HarvestSpool/Replayed", 2),
+                ("Supportability/Python/HarvestSpool/Dropped", 0),
+            ],
+            endpoints_called=endpoints_called,
+        )
+        def _harvest():
+            app.harvest()
+
+        _harvest()
+
+        # The spooled data is sent first, in the order it was spooled.
+        assert endpoints_called[:2] == ["analytic_event_data", "metric_data"]
+        assert spooled_segments() == []
+
+    _test()
 
 
 @failing_endpoint("analytic_event_data")
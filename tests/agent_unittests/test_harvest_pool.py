@@ -0,0 +1,71 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import threading
+
+import pytest
+
+from newrelic.core.harvest_pool import HarvestPool
+
+
+@pytest.fixture
+def pool():
+    pool = HarvestPool(2)
+    yield pool
+    pool.shutdown()
+
+
+def test_run_outcomes(pool):
+    def fail():
+        raise ValueError("failed")
+
+    outcomes = pool.run([lambda: 1, fail, lambda: 3])
+
+    assert [result for result, _ in outcomes] == [1, None, 3]
+    assert outcomes[0][1] is None
+    assert outcomes[1][1][0] is ValueError
+    assert outcomes[2][1] is None
+
+
+def test_run_concurrently(pool):
+    # Each task can only complete once the other has started, so this
+    # would never finish if the tasks were run one at a time.
+
+    events = [threading.Event(), threading.Event()]
+
+    def task(index):
+        events[index].set()
+        return events[1 - index].wait(5.0)
+
+    outcomes = pool.run([lambda: task(0), lambda: task(1)])
+
+    assert [result for result, _ in outcomes] == [True, True]
+
+
+def test_nested_run(pool):
+    def task():
+        return sum(result for result, _ in pool.run([lambda: 1] * 4))
+
+    outcomes = pool.run([task] * 4)
+
+    assert [result for result, _ in outcomes] == [4] * 4
+
+
+def test_run_after_shutdown(pool):
+    pool.shutdown()
+
+    outcomes = pool.run([lambda: 1, lambda: 2])
+
+    assert [result for result, _ in outcomes] == [1, 2]
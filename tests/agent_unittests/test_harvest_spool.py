@@ -0,0 +1,274 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+from testing_support.mock_external_http_server import MockExternalHTTPServer
+
+from newrelic.core import harvest_spool
+from newrelic.core.harvest_spool import HarvestSpool
+
+try:
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    from urlparse import parse_qs, urlparse
+
+
+def replay(spool):
+    records = []
+    spool.replay(lambda method, payload: records.append((method, bytes(payload))))
+    return records
+
+
+def test_spool_replay(tmpdir):
+    spool = HarvestSpool(str(tmpdir), 1024 * 1024, 60)
+
+    assert spool.write("metric_data", b"[1]")
+    assert spool.write("span_event_data", bytearray(b"[2]"))
+
+    assert replay(spool) == [("metric_data", b"[1]"), ("span_event_data", b"[2]")]
+    assert replay(spool) == []
+    assert spool.stats() == (2, 2, 0)
+
+
+def test_spool_survives_new_instance(tmpdir):
+    HarvestSpool(str(tmpdir), 1024 * 1024, 60).write("metric_data", b"[1]")
+
+    assert replay(HarvestSpool(str(tmpdir), 1024 * 1024, 60)) == [("metric_data", b"[1]")]
+
+
+def test_spool_max_size_drops_oldest(tmpdir):
+    # Each record is 24 bytes, so segments are rotated after every record
+    # and the spool can only hold the three most recent records.
+    spool = HarvestSpool(str(tmpdir), 72, 60)
+
+    for index in range(10):
+        assert spool.write("metric_data", b"[%d]" % index)
+
+    assert replay(spool) == [("metric_data", b"[%d]" % index) for index in (7, 8, 9)]
+    assert spool.stats() == (10, 3, 7)
+
+
+def test_spool_oversized_record_dropped(tmpdir):
+    spool = HarvestSpool(str(tmpdir), 16, 60)
+
+    assert not spool.write("metric_data", b"[1]")
+    assert replay(spool) == []
+    assert spool.stats() == (0, 0, 1)
+
+
+def test_spool_max_age(tmpdir):
+    spool = HarvestSpool(str(tmpdir), 1024 * 1024, 60)
+    spool.write("metric_data", b"[1]")
+
+    expired = time.time() - 120
+    for name in os.listdir(str(tmpdir)):
+        os.utime(os.path.join(str(tmpdir), name), (expired, expired))
+
+    assert replay(spool) == []
+    assert spool.stats() == (1, 0, 1)
+
+
+def test_spool_replay_failure_restores_unsent(tmpdir):
+    spool = HarvestSpool(str(tmpdir), 1024 * 1024, 60)
+
+    for index in range(3):
+        spool.write("metric_data", b"[%d]" % index)
+
+    sent = []
+
+    def send(method, payload):
+        if len(sent) == 1:
+            raise ValueError()
+        sent.append(bytes(payload))
+
+    with pytest.raises(ValueError):
+        spool.replay(send)
+
+    assert sent == [b"[0]"]
+    assert replay(spool) == [("metric_data", b"[1]"), ("metric_data", b"[2]")]
+
+
+def test_spool_replay_interrupted_restores_unsent(tmpdir):
+    spool = HarvestSpool(str(tmpdir), 1024 * 1024, 60)
+
+    for index in range(3):
+        spool.write("metric_data", b"[%d]" % index)
+
+    sent = []
+
+    def send(method, payload):
+        if len(sent) == 2:
+            raise KeyboardInterrupt()
+        sent.append(bytes(payload))
+
+    with pytest.raises(KeyboardInterrupt):
+        spool.replay(send)
+
+    assert replay(spool) == [("metric_data", b"[2]")]
+
+
+def claim_segments(directory, pid):
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        os.rename(path, "%s.%08x%s" % (path, pid, harvest_spool.CLAIMED_SUFFIX))
+
+
+def test_spool_adopts_segments_claimed_by_exited_process(tmpdir):
+    spool = HarvestSpool(str(tmpdir), 1024 * 1024, 60)
+    spool.write("metric_data", b"[1]")
+
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    claim_segments(str(tmpdir), process.pid)
+
+    assert replay(spool) == [("metric_data", b"[1]")]
+    assert os.listdir(str(tmpdir)) == []
+
+
+def test_spool_segments_claimed_by_running_process(tmpdir, monkeypatch):
+    # Each record is 24 bytes, so the spool can only hold three records.
+    spool = HarvestSpool(str(tmpdir), 72, 60)
+
+    for index in range(2):
+        spool.write("metric_data", b"[%d]" % index)
+
+    claim_segments(str(tmpdir), os.getpid())
+
+    for index in range(2, 4):
+        spool.write("metric_data", b"[%d]" % index)
+
+    # The claimed segments are left for the process replaying them, but
+    # still count towards the size of the spool.
+
+    assert replay(spool) == [("metric_data", b"[3]")]
+    assert spool.stats() == (4, 1, 1)
+
+    # Once the claim times out the segments are returned to the spool.
+
+    monkeypatch.setattr(harvest_spool, "CLAIM_TIMEOUT", -1)
+
+    assert replay(spool) == [("metric_data", b"[0]"), ("metric_data", b"[1]")]
+
+
+def test_spool_ignores_truncated_record(tmpdir):
+    spool = HarvestSpool(str(tmpdir), 1024 * 1024, 60)
+    spool.write("metric_data", b"[1]")
+    spool.write("metric_data", b"[2]")
+
+    (name,) = os.listdir(str(tmpdir))
+    path = os.path.join(str(tmpdir), name)
+    with open(path, "rb+") as segment:
+        segment.truncate(os.path.getsize(path) - 1)
+
+    assert replay(spool) == [("metric_data", b"[1]")]
+
+
+COLLECTOR = {"connects": 0, "failing": set(), "received": []}
+
+
+def collector_stub(self):
+    method = parse_qs(urlparse(self.path).query)["method"][0]
+    payload = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    if method in COLLECTOR["failing"]:
+        self.send_response(503)
+        self.end_headers()
+        return
+
+    if method == "preconnect":
+        result = {"redirect_host": "localhost"}
+    elif method == "connect":
+        COLLECTOR["connects"] += 1
+        result = {"agent_run_id": "RUN_%d" % COLLECTOR["connects"]}
+    else:
+        result = None
+        if method == "metric_data":
+            COLLECTOR["received"].append(json.loads(payload.decode("utf-8")))
+
+    self.send_response(200)
+    self.end_headers()
+    self.wfile.write(json.dumps({"return_value": result}).encode("utf-8"))
+
+
+# Run in a separate process for each step so that the only state shared
+# between the agent sending the data and the one replaying it is the
+# spool on disk.
+
+AGENT_PROCESS = """
+import sys
+
+from newrelic.common.agent_http import InsecureHttpClient, SupportabilityMixin
+from newrelic.core.config import global_settings
+from newrelic.core.data_collector import Session
+
+
+class StubClient(SupportabilityMixin, InsecureHttpClient):
+    pass
+
+
+class StubSession(Session):
+    CLIENT = StubClient
+
+
+port, directory, step = sys.argv[1:]
+
+settings = global_settings()
+settings.license_key = "**NOT A LICENSE KEY**"
+settings.host = "localhost"
+settings.port = int(port)
+settings.startup_timeout = 0.0
+settings.utilization.detect_aws = False
+settings.utilization.detect_azure = False
+settings.utilization.detect_docker = False
+settings.utilization.detect_gcp = False
+settings.utilization.detect_kubernetes = False
+settings.utilization.detect_pcf = False
+settings.harvest_spool.enabled = True
+settings.harvest_spool.directory = directory
+
+session = StubSession("Python Agent Test (Harvest Spool)", [], [], settings)
+
+if step == "send":
+    session.send_metric_data(1.0, 2.0, [[{"name": "Custom/Spooled", "scope": ""}, [1, 1, 1, 1, 1, 1]]])
+else:
+    session.replay_spool()
+"""
+
+
+def run_agent_process(port, directory, step):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(sys.path)
+    subprocess.check_call([sys.executable, "-c", AGENT_PROCESS, str(port), directory, step], env=env)
+
+
+def test_spooled_data_survives_restart(tmpdir):
+    with MockExternalHTTPServer(handler=collector_stub) as server:
+        COLLECTOR["failing"] = set(("metric_data",))
+        run_agent_process(server.port, str(tmpdir), "send")
+
+        assert COLLECTOR["received"] == []
+
+        COLLECTOR["failing"] = set()
+        run_agent_process(server.port, str(tmpdir), "replay")
+
+    # The data is replayed against the run of the restarted process.
+
+    assert COLLECTOR["received"] == [["RUN_2", 1.0, 2.0, [[{"name": "Custom/Spooled", "scope": ""}, [1, 1, 1, 1, 1, 1]]]]]
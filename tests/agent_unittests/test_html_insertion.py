@@ -0,0 +1,104 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import random
+
+import pytest
+
+from newrelic.api.html_insertion import HTMLInsertionScanner, insert_html_snippet
+
+TEXT = b"<!-- RUM -->"
+
+PARTS = (
+    b"<html>",
+    b"<head>",
+    b"<HEAD lang='en'>",
+    b"<header>",
+    b'<meta charset="utf-8">',
+    b"<meta http-equiv='X-UA-Compatible' content='IE=edge'>",
+    b"<meta http-equiv='Content-Disposition' content='attachment; filename=x'>",
+    b"<title>title</title>",
+    b"<script>var a = 1 > 0;</script>",
+    b"</head>",
+    b"<body>",
+    b"<BODY class='body'>",
+    b"<p>text</p>",
+    b"x" * 50,
+    b"<",
+    b">",
+    b"<bo",
+    b"dy>",
+    b"</body></html>",
+)
+
+
+def scan(data, chunk_sizes, search_limit=64 * 1024):
+    scanner = HTMLInsertionScanner(lambda: TEXT, search_limit)
+
+    output = []
+    index = 0
+    while index < len(data):
+        size = next(chunk_sizes)
+        output.append(scanner.feed(data[index : index + size]))
+        index += size
+    output.append(scanner.close())
+
+    return output
+
+
+@pytest.mark.parametrize("search_limit", (64 * 1024, 200, 40))
+def test_scanner_matches_insert_html_snippet(search_limit):
+    rnd = random.Random(search_limit)
+
+    for _ in range(2000):
+        data = b"".join(rnd.choice(PARTS) for _ in range(rnd.randint(0, 30)))
+
+        expected = insert_html_snippet(data, lambda: TEXT, search_limit)
+        if expected is None:
+            expected = data
+
+        chunk_sizes = iter(lambda: rnd.randint(1, 40), None)
+        assert b"".join(scan(data, chunk_sizes, search_limit)) == expected, data
+
+
+def test_scanner_forwards_data_before_insertion_point():
+    scanner = HTMLInsertionScanner(lambda: TEXT)
+
+    assert scanner.feed(b"<!DOCTYPE html>\n<html><he") == b"<!DOCTYPE html>\n<html>"
+    assert scanner.feed(b"ad><title>title</title>") == b"<head>"
+    assert scanner.feed(b"</head><body>") == TEXT + b"<title>title</title></head><body>"
+    assert scanner.done
+    assert scanner.inserted == len(TEXT)
+    assert scanner.feed(b"</body></html>") == b"</body></html>"
+    assert scanner.close() == b""
+
+
+def test_scanner_gives_up_at_search_limit():
+    scanner = HTMLInsertionScanner(lambda: TEXT, search_limit=100)
+
+    data = b"<html><head>" + b"x" * 100
+    assert scanner.feed(data) == data
+    assert scanner.done
+    assert not scanner.inserted
+    assert scanner.feed(b"<body>") == b"<body>"
+
+
+def test_scanner_no_text_to_insert():
+    scanner = HTMLInsertionScanner(lambda: b"")
+
+    assert scanner.feed(b"<html><head>") == b"<html><head>"
+    assert scanner.feed(b"<body>") == b"<body>"
+    assert scanner.done
+    assert not scanner.inserted
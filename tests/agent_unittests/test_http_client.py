@@ -357,6 +357,55 @@ def test_http_payload_compression(server, client_cls, method, threshold):
     assert sent_payload == payload
 
 
+@pytest.mark.parametrize("method", ("gzip", "deflate"))
+@pytest.mark.parametrize("threshold", (0, 100, 1000))
+def test_http_chunked_payload_compression(monkeypatch, server, method, threshold):
+    monkeypatch.setattr(ApplicationModeClient, "COMPRESSION_BATCH_SIZE", 64)
+    chunks = [(u"%d," % i).encode("utf-8") * 5 for i in range(50)]
+    payload = b"".join(chunks)
+
+    internal_metrics = CustomMetrics()
+
+    with ApplicationModeClient(
+        "localhost",
+        server.port,
+        disable_certificate_validation=True,
+        compression_method=method,
+        compression_threshold=threshold,
+    ) as client:
+        expected_body, _ = client._compress(payload, method=method)
+        with InternalTraceContext(internal_metrics):
+            status, data = client.send_request(payload=iter(chunks), params={"method": "method1"})
+
+    assert status == 200
+    data = data.split(b"\n")
+    sent_payload = data[-1]
+    internal_metrics = dict(internal_metrics.metrics())
+
+    # The uncompressed size is recorded even though the payload was
+    # never joined together.
+    assert internal_metrics["Supportability/Python/Collector/method1/Output/Bytes"][:2] == [1, len(payload)]
+
+    if threshold < len(payload):
+        expected_content_encoding = method.encode("utf-8")
+        assert sent_payload == expected_body
+        assert internal_metrics["Supportability/Python/Collector/method1/ZLIB/Bytes"][:2] == [1, len(expected_body)]
+    else:
+        expected_content_encoding = b"Identity"
+        assert sent_payload == payload
+        assert "Supportability/Python/Collector/method1/ZLIB/Bytes" not in internal_metrics
+
+    for header in data[1:-1]:
+        if header.lower().startswith(b"content-encoding"):
+            _, content_encoding = header.split(b":", 1)
+            content_encoding = content_encoding.strip()
+            break
+    else:
+        assert False, "Missing content-encoding header"
+
+    assert content_encoding == expected_content_encoding
+
+
 def test_cert_path(server):
     with HttpClient("localhost", server.port, ca_bundle_path=SERVER_CERT) as client:
         status, data = client.send_request()
@@ -0,0 +1,143 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import base64
+import json
+import sys
+import zlib
+
+from newrelic.core.profile_sessions import (
+    ProfileSession,
+    ProfileSessionManager,
+    SessionState,
+)
+
+
+def _call_tree(session):
+    session.finish()
+    data = session.profile_data()[0][4]
+    return json.loads(zlib.decompress(base64.standard_b64decode(data)).decode("utf-8"))
+
+
+def _current_thread(category="OTHER"):
+    frame = sys._getframe(1)
+    return [(None, 1, category, frame)]
+
+
+def _methods(tree):
+    # Flattens the only path through the call tree into the function
+    # names and call counts of the nodes.
+
+    result = []
+    nodes = tree
+    while nodes:
+        assert len(nodes) == 1
+        (filename, name, line), count, _, nodes = nodes[0]
+        result.append((name.split("#")[0], count))
+    return result
+
+
+def _inner(session):
+    for _ in range(3):
+        session.sample_stacks(_current_thread())
+
+
+def _outer(session):
+    _inner(session)
+
+
+def test_sample_stacks_unchanged():
+    session = ProfileSession(1, 0)
+    _outer(session)
+
+    assert session.transaction_count == 3
+
+    methods = _methods(_call_tree(session)["OTHER"])
+    assert methods[-3:] == [("_outer", 3), ("_inner", 3), ("@_inner", 3)]
+
+
+def _generator(session):
+    while True:
+        session.sample_stacks(_current_thread())
+        yield
+
+
+def _first_caller(generator):
+    next(generator)
+
+
+def _second_caller(generator):
+    next(generator)
+
+
+def test_sample_stacks_resumed_generator():
+    session = ProfileSession(1, 0)
+    generator = _generator(session)
+
+    # The generator is sampled at the same line in both, but resumed
+    # from a different caller the second time.
+
+    _first_caller(generator)
+    _second_caller(generator)
+
+    tree = _call_tree(session)["OTHER"]
+    callers = set()
+
+    def walk(nodes):
+        for (_, name, _), count, _, children in nodes:
+            if name.startswith("_generator"):
+                assert count == 1
+            elif name.startswith(("_first_caller", "_second_caller")):
+                callers.add(name.split("#")[0])
+            walk(children)
+
+    walk(tree)
+
+    assert callers == set(["_first_caller", "_second_caller"])
+
+
+def test_sample_stacks_skip_agent_threads():
+    session = ProfileSession(1, 0)
+
+    session.sample_stacks(_current_thread("AGENT"))
+    assert session.transaction_count == 0
+
+    session.sample_stacks(_current_thread("AGENT"), include_nr_threads=True)
+    assert session.transaction_count == 1
+
+
+def test_finish_releases_frames():
+    session = ProfileSession(1, 0)
+    _outer(session)
+
+    assert session._thread_stacks
+
+    session.finish()
+
+    assert not session._thread_stacks
+    assert _methods(_call_tree(session)["OTHER"])[-1] == ("@_inner", 3)
+
+
+def test_stop_profile_session_releases_frames():
+    manager = ProfileSessionManager()
+    session = manager.full_profile_session = ProfileSession(1, 0)
+    manager.full_profile_app = "app"
+
+    _outer(session)
+    manager.stop_profile_session("app")
+
+    assert session.state == SessionState.FINISHED
+    assert not session._thread_stacks
+    assert manager.finished_sessions["app"] == [session]
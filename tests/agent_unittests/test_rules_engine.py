@@ -0,0 +1,119 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import random
+
+import pytest
+
+from newrelic.core.rules_engine import NormalizationRule, RulesEngine
+
+
+def _rule(match_expression, replacement="*", eval_order=0, **kwargs):
+    rule = dict((field, False) for field in NormalizationRule._fields)
+    rule.update(match_expression=match_expression, replacement=replacement, eval_order=eval_order)
+    rule.update(kwargs)
+    return rule
+
+
+def _reference_normalize(rules_engine, string):
+    # Apply every rule in order, without caching or fusing of rules.
+    final_string, ignore, _ = RulesEngine._apply_rules(rules_engine.rules, string, False)
+    return final_string, ignore
+
+
+def test_normalize_is_cached():
+    rules_engine = RulesEngine([_rule(r"\d+", replacement="*", replace_all=True)])
+
+    assert rules_engine.normalize("/users/123/orders/456") == ("/users/*/orders/*", False)
+    assert rules_engine.normalize("/users/123/orders/456") == ("/users/*/orders/*", False)
+    assert rules_engine.normalize(b"/users/123/orders/456") == ("/users/*/orders/*", False)
+
+    assert rules_engine.cache.stats() == (2, 1, 0)
+
+
+def test_normalize_cache_is_bounded():
+    rules_engine = RulesEngine([_rule(r"\d+", replace_all=True)], cache_size=5)
+
+    for index in range(20):
+        rules_engine.normalize("/users/%d" % index)
+
+    assert len(rules_engine.cache) == 5
+
+
+def test_normalize_without_rules_is_not_cached():
+    rules_engine = RulesEngine([])
+
+    assert rules_engine.normalize("/users/123") == ("/users/123", False)
+    assert len(rules_engine.cache) == 0
+
+
+def test_unfusible_rules_are_applied_alone():
+    rules_engine = RulesEngine(
+        [
+            _rule(r"(a)\1", replacement="b", eval_order=0),
+            _rule(r"(?P<x>c)", replacement="d", eval_order=1),
+            _rule(r"e", replacement="f", eval_order=2),
+            _rule(r"g", replacement="h", eval_order=3),
+        ]
+    )
+
+    assert rules_engine.normalize("aacegx") == ("bdfhx", False)
+
+
+def test_conditional_group_rules_are_applied_alone():
+    rules_engine = RulesEngine(
+        [
+            _rule(r"(a)", replacement="x", eval_order=0),
+            _rule(r"(b)?c(?(1)d|e)", replacement="y", eval_order=1),
+        ]
+    )
+
+    for name in ("bcd", "ce", "abcd", "bce"):
+        assert rules_engine.normalize(name) == _reference_normalize(rules_engine, name), name
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_fused_rules_match_sequential_rules(seed):
+    rng = random.Random(seed)
+
+    patterns = [r"\d+", r"^/api", r"users", r"/v[0-9]/", r"x$", r"(foo|bar)", r"^$", r"/+", r"[aeiou]{2}"]
+    replacements = ["*", "/", "", "users", "\\1", "foo"]
+
+    rules = []
+    for eval_order in range(rng.randint(1, 8)):
+        pattern = rng.choice(patterns)
+        replacement = rng.choice(replacements)
+        if replacement == "\\1" and "(" not in pattern:
+            replacement = "*"
+        rules.append(
+            _rule(
+                pattern,
+                replacement=replacement,
+                eval_order=eval_order,
+                ignore=rng.random() < 0.2,
+                terminate_chain=rng.random() < 0.3,
+                each_segment=rng.random() < 0.3,
+                replace_all=rng.random() < 0.5,
+            )
+        )
+
+    rules_engine = RulesEngine(rules)
+
+    names = ["", "/", "/api/v1/users/123", "/foo/bar/x", "/users//42", "/static/aeiou", "/api/v2/foo/999x"]
+
+    for name in names:
+        expected = _reference_normalize(rules_engine, name)
+        assert rules_engine.normalize(name) == expected, name
+        assert rules_engine.normalize(name) == expected, name
@@ -0,0 +1,123 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import random
+
+import pytest
+
+from newrelic.core.stats_engine import SampledDataSet
+
+
+def sequential_merge(data_set, other_data_set):
+    for original_priority, _, sample in other_data_set.pq:
+        data_set.add(sample, original_priority)
+
+    data_set.num_seen += other_data_set.num_seen - other_data_set.num_samples
+
+
+def filled(capacity, count, rnd):
+    data_set = SampledDataSet(capacity)
+    for i in range(count):
+        data_set.add(i, rnd.random())
+    return data_set
+
+
+def test_add_deferred_only_creates_retained_samples():
+    data_set = SampledDataSet(2)
+    created = []
+
+    def factory(value):
+        def _factory():
+            created.append(value)
+            return value
+
+        return _factory
+
+    assert data_set.add_deferred(factory("a"), priority=0.5)
+    assert data_set.add_deferred(factory("b"), priority=0.6)
+    assert not data_set.add_deferred(factory("c"), priority=0.4)
+    assert not data_set.add_deferred(factory("d"), priority=0.5)
+    assert data_set.add_deferred(factory("e"), priority=0.7)
+
+    assert created == ["a", "b", "e"]
+    assert sorted(data_set) == ["b", "e"]
+    assert data_set.num_seen == 5
+
+
+def test_add_deferred_zero_capacity():
+    data_set = SampledDataSet(0)
+
+    assert not data_set.add_deferred(lambda: pytest.fail("sample created"), priority=1.0)
+    assert data_set.num_seen == 1
+    assert data_set.num_samples == 0
+
+
+@pytest.mark.parametrize(
+    "capacity,counts",
+    (
+        (100, (10, 20)),
+        (100, (60, 60)),
+        (100, (100, 250, 250)),
+        (1000, (1000, 5, 3000)),
+        (100, (0, 500)),
+    ),
+)
+def test_merge_matches_sequential(capacity, counts):
+    rnd = random.Random(capacity + sum(counts))
+    others = [filled(capacity, count, rnd) for count in counts]
+
+    merged = SampledDataSet(capacity)
+    expected = SampledDataSet(capacity)
+
+    for other in others:
+        merged.merge(other)
+        sequential_merge(expected, other)
+
+    assert sorted(merged) == sorted(expected)
+    assert merged.num_seen == expected.num_seen
+    assert merged.heap == expected.heap
+
+    # The reservoir must still behave as a heap after the merge.
+
+    merged.add("high", 2.0)
+
+    assert "high" in list(merged)
+    assert merged.num_samples == min(capacity, expected.num_samples + 1)
+
+
+def test_merge_priority_floor():
+    data_set = SampledDataSet(10)
+    other = SampledDataSet(10)
+    other.add("a", 0.1)
+    other.add("b", 0.9)
+
+    data_set.merge(other, priority=0.5)
+
+    assert sorted(entry[0] for entry in data_set.pq) == [0.5, 0.9]
+
+
+def test_merge_num_seen_beyond_capacity_stays_bounded():
+    data_set = SampledDataSet(5)
+
+    other = SampledDataSet(5)
+    other.num_seen = 100
+    data_set.merge(other)
+
+    for i in range(20):
+        data_set.add(i, float(i))
+
+    assert data_set.num_samples == 5
+    assert sorted(data_set) == [15, 16, 17, 18, 19]
+    assert data_set.num_seen == 120
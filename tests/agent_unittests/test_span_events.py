@@ -0,0 +1,122 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sys
+
+import pytest
+from testing_support.trace_nodes import function_node
+
+from newrelic.api.function_trace import FunctionTrace
+from newrelic.api.time_trace import EMPTY_ATTRIBUTES
+from newrelic.core.config import finalize_application_settings
+
+settings = finalize_application_settings(
+    {
+        "attributes.exclude": ["excluded", "agent.excluded"],
+        "span_events.attributes.exclude": ["span.excluded"],
+    }
+)
+
+
+def test_span_events_order():
+    tree = function_node(
+        "a",
+        children=(
+            function_node("b", children=(function_node("c"), function_node("d"))),
+            function_node("e", children=(function_node("f"),)),
+        ),
+    )
+
+    events = list(tree.span_events(settings, parent_guid="parent"))
+
+    assert [(i_attrs["guid"], i_attrs["parentId"]) for i_attrs, _, _ in events] == [
+        ("a", "parent"),
+        ("b", "a"),
+        ("c", "b"),
+        ("d", "b"),
+        ("e", "a"),
+        ("f", "e"),
+    ]
+
+
+def test_span_events_deep_tree():
+    # A tree much deeper than the recursion limit can still be walked.
+    node = function_node("leaf")
+    for depth in range(sys.getrecursionlimit() * 2):
+        node = function_node("node_%d" % depth, children=(node,))
+
+    events = list(node.span_events(settings))
+
+    assert len(events) == sys.getrecursionlimit() * 2 + 1
+    assert events[-1][0]["guid"] == "leaf"
+
+
+@pytest.mark.parametrize(
+    "agent_attributes,user_attributes",
+    (
+        ({}, {}),
+        ({"agent.included": 1, "agent.excluded": 2, "agent.none": None}, {"included": 1, "excluded": 2}),
+        ({"response.status": "200", "span.excluded": 1}, {"span.excluded": 1, "none": None}),
+    ),
+)
+def test_span_event_attributes(agent_attributes, user_attributes):
+    # Attributes resolved when generating all span events for a tree must
+    # match those resolved for each node individually.
+
+    children = tuple(
+        function_node("child_%d" % index, agent_attributes=agent_attributes, user_attributes=user_attributes)
+        for index in range(3)
+    )
+    tree = function_node("root", children=children, agent_attributes=agent_attributes, user_attributes=user_attributes)
+
+    events = list(tree.span_events(settings))
+
+    for node, (_, u_attrs, a_attrs) in zip((tree,) + children, events):
+        expected = node.span_event(settings)
+        assert u_attrs == expected[1]
+        assert a_attrs == expected[2]
+
+
+class _Root(object):
+    def __init__(self):
+        self.transaction = None
+
+    def _child_exited(self, child):
+        pass
+
+
+def test_node_without_guid_or_attributes():
+    # A trace which had no guid or attributes used during the transaction
+    # creates its node without allocating them.
+
+    trace = FunctionTrace("trace", parent=_Root())
+    trace.start_time = trace.end_time = 0.0
+    trace.duration = trace.exclusive = 0.0
+    node = trace.create_node()
+
+    assert node.guid is None
+    assert node.agent_attributes is EMPTY_ATTRIBUTES
+    assert node.user_attributes is EMPTY_ATTRIBUTES
+
+    # A guid is generated for the span event, and used as the parent of
+    # the span events of the children.
+
+    tree = node._replace(children=(function_node("child"),))
+
+    (i_attrs, u_attrs, a_attrs), (child_attrs, _, _) = tree.span_events(settings)
+
+    assert len(i_attrs["guid"]) == 16
+    assert child_attrs["parentId"] == i_attrs["guid"]
+    assert u_attrs == {}
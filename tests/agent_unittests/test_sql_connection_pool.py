@@ -0,0 +1,165 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sqlite3
+
+import pytest
+from testing_support.fixtures import override_generic_settings
+
+from newrelic.core.config import global_settings
+from newrelic.core.database_utils import SQLConnectionPool, SQLConnections, SQLDatabase
+
+settings = global_settings()
+
+
+class CountingDBAPI2Module(object):
+    """Wraps the sqlite3 module, counting the connections made."""
+
+    __name__ = "counting_sqlite3"
+
+    NotSupportedError = sqlite3.NotSupportedError
+
+    def __init__(self):
+        self.connects = 0
+
+    def connect(self, *args, **kwargs):
+        self.connects += 1
+        return sqlite3.connect(*args, **kwargs)
+
+
+@pytest.fixture
+def dbapi2_module():
+    return CountingDBAPI2Module()
+
+
+@pytest.fixture
+def pool():
+    pool = SQLConnectionPool()
+    yield pool
+    pool.close()
+
+
+def harvest(pool, database, *connect_args):
+    with SQLConnections(settings.agent_limits.max_sql_connections, pool) as connections:
+        for args in connect_args:
+            connection = connections.connection(database, args, {})
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            assert cursor.fetchall() == [(1,)]
+            yield connection
+
+
+@override_generic_settings(settings, {"agent_limits.sql_connection_idle_timeout": 60.0})
+def test_connection_reused_across_harvests(pool, dbapi2_module):
+    database = SQLDatabase(dbapi2_module)
+
+    first = list(harvest(pool, database, (":memory:",)))
+    second = list(harvest(pool, database, (":memory:",)))
+
+    assert first == second
+    assert dbapi2_module.connects == 1
+    assert len(pool) == 1
+    assert pool.stats() == (1, 1, 0, 0)
+
+    # The counts are running totals, as the pool is shared by all
+    # applications, and so are not reset when read.
+
+    assert pool.stats() == (1, 1, 0, 0)
+
+
+@override_generic_settings(settings, {"agent_limits.sql_connection_idle_timeout": 60.0})
+def test_connection_keyed_on_connect_params(pool, dbapi2_module):
+    database = SQLDatabase(dbapi2_module)
+
+    list(harvest(pool, database, (":memory:",), ("",)))
+    list(harvest(pool, database, ("",), (":memory:",)))
+
+    assert dbapi2_module.connects == 2
+    assert pool.stats() == (2, 2, 0, 0)
+
+
+def test_connection_not_pooled_by_default(pool, dbapi2_module):
+    database = SQLDatabase(dbapi2_module)
+
+    (connection,) = harvest(pool, database, (":memory:",))
+    list(harvest(pool, database, (":memory:",)))
+
+    assert dbapi2_module.connects == 2
+    assert len(pool) == 0
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        connection.connection.execute("SELECT 1")
+
+
+@override_generic_settings(settings, {"agent_limits.sql_connection_idle_timeout": 60.0})
+def test_connection_idle_timeout(pool, dbapi2_module):
+    database = SQLDatabase(dbapi2_module)
+
+    (connection,) = harvest(pool, database, (":memory:",))
+
+    key, _, released = pool._idle[0]
+    pool._idle[0] = (key, connection, released - 60.0)
+
+    assert pool.stats() == (1, 0, 1, 0)
+    assert len(pool) == 0
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        connection.connection.execute("SELECT 1")
+
+
+@override_generic_settings(settings, {"agent_limits.sql_connection_idle_timeout": 60.0})
+def test_connection_unhealthy_replaced(pool, dbapi2_module):
+    database = SQLDatabase(dbapi2_module)
+
+    (connection,) = harvest(pool, database, (":memory:",))
+
+    # Closing the connection behind the pool's back causes the rollback
+    # done when checking it prior to reuse to fail.
+
+    connection.connection.close()
+
+    (replacement,) = harvest(pool, database, (":memory:",))
+
+    assert replacement is not connection
+    assert dbapi2_module.connects == 2
+    assert pool.stats() == (2, 0, 0, 1)
+
+
+@override_generic_settings(
+    settings, {"agent_limits.sql_connection_idle_timeout": 60.0, "agent_limits.max_sql_connections": 1}
+)
+def test_connection_pool_bounded(pool, dbapi2_module):
+    database = SQLDatabase(dbapi2_module)
+
+    list(harvest(pool, database, (":memory:",)))
+    list(harvest(pool, database, ("",)))
+
+    assert len(pool) == 1
+    assert pool._idle[0][0] == (database.client, ("",), {})
+
+
+@override_generic_settings(settings, {"agent_limits.sql_connection_idle_timeout": 60.0})
+def test_connection_pool_close(pool, dbapi2_module):
+    database = SQLDatabase(dbapi2_module)
+
+    (connection,) = harvest(pool, database, (":memory:",))
+
+    pool.close()
+    list(harvest(pool, database, (":memory:",)))
+
+    assert len(pool) == 0
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        connection.connection.execute("SELECT 1")
@@ -0,0 +1,99 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import os
+import random
+
+import pytest
+
+from newrelic.core.config import global_settings
+from newrelic.core.database_utils import (
+    SQLStatement,
+    _normalize_sql,
+    _normalize_sql_fused,
+    _obfuscate_sql,
+    _obfuscate_sql_fused,
+    _uncomment_sql,
+    _uncomment_sql_fused,
+)
+
+FIXTURE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "cross_agent", "fixtures", "sql_parsing.json"
+)
+
+QUOTING_STYLES = ("single", "single+double", "single+dollar", "single+oracle")
+
+FRAGMENTS = (
+    "'", '"', "''", "\\'", "$", "$$", "$a$", "$1", "q'[", "]'", "q'{", "}'", "q'<", ">'",
+    " ", "  ", "\n", "\t", "--", "#", "/*", "*/", "-", "-5", ":", ":1", ":name", "::int",
+    "%s", "%(id)s", "(", ")", "( )", ",", ";", "=", "?", "1", "1.5", ".5", "1e5", "0x1F",
+    "{", "}", "abcdef0123456789abcdef0123456789", "true", "FALSE", "Null", "nullx",
+    "select", "FROM", "into", "update", "foo", "foo1", "a.b", "`t`", "[x]",
+)
+
+
+class DummyDatabase(object):
+    def __init__(self, quoting_style):
+        self.quoting_style = quoting_style
+
+
+def load_statements():
+    with open(FIXTURE) as fh:
+        return [test["input"] for test in json.load(fh)]
+
+
+def parse(sql, database, sql_lexer):
+    settings = global_settings()
+    original = settings.debug.sql_lexer
+    settings.debug.sql_lexer = sql_lexer
+    try:
+        statement = SQLStatement(sql, database)
+        return (
+            statement.uncommented,
+            statement.obfuscated,
+            statement.normalized,
+            statement.operation,
+            statement.target,
+        )
+    finally:
+        settings.debug.sql_lexer = original
+
+
+@pytest.mark.parametrize("quoting_style", QUOTING_STYLES)
+@pytest.mark.parametrize("sql", load_statements())
+def test_fused_matches_regex(sql, quoting_style):
+    database = DummyDatabase(quoting_style)
+    assert parse(sql, database, "fused") == parse(sql, database, "regex")
+
+
+@pytest.mark.parametrize("quoting_style", QUOTING_STYLES)
+def test_fused_matches_regex_random(quoting_style):
+    database = DummyDatabase(quoting_style)
+    rnd = random.Random(quoting_style)
+
+    for _ in range(2000):
+        sql = "".join(rnd.choice(FRAGMENTS) for _ in range(rnd.randint(0, 20)))
+
+        obfuscated = _uncomment_sql(_obfuscate_sql(sql, database))
+        assert _uncomment_sql_fused(_obfuscate_sql_fused(sql, database)) == obfuscated, sql
+        assert _normalize_sql_fused(obfuscated) == _normalize_sql(obfuscated), sql
+        assert _uncomment_sql_fused(sql) == _uncomment_sql(sql), sql
+
+
+def test_fused_boolean_before_oracle_quote():
+    database = DummyDatabase("single+oracle")
+    sql = "SELECT trueq'[x]' FROM foo"
+    assert _obfuscate_sql_fused(sql, database) == _obfuscate_sql(sql, database) == "SELECT ?? FROM foo"
@@ -0,0 +1,89 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import gc
+
+import pytest
+from testing_support.fixtures import override_generic_settings
+
+from newrelic.core.config import global_settings
+from newrelic.core.database_utils import (
+    _sql_statements,
+    sql_statement,
+    sql_statement_cache_stats,
+)
+
+
+class DummyDBAPI2Module(object):
+    _nr_quoting_style = "single"
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    _sql_statements.clear()
+    yield
+    _sql_statements.clear()
+
+
+def stats_since(previous):
+    return tuple(total - last for total, last in zip(sql_statement_cache_stats(), previous))
+
+
+def test_sql_statement_retained():
+    previous = sql_statement_cache_stats()
+
+    statement = sql_statement("SELECT * FROM foo WHERE id = 1", DummyDBAPI2Module)
+    identifier = statement.identifier
+    del statement
+    gc.collect()
+
+    # The parsed statement is held by the cache rather than only for as
+    # long as something else refers to it.
+
+    statement = sql_statement("SELECT * FROM foo WHERE id = 1", DummyDBAPI2Module)
+    assert statement._identifier == identifier
+    assert statement.operation == "select"
+    assert statement.target == "foo"
+
+    # The counts are running totals, as the cache is shared by all
+    # applications, and so are not reset when read.
+
+    assert stats_since(previous) == (1, 1, 0)
+    assert stats_since(previous) == (1, 1, 0)
+
+
+def test_sql_statement_keyed_on_module():
+    class OtherDBAPI2Module(object):
+        _nr_quoting_style = "single+double"
+
+    statement = sql_statement('SELECT "a" FROM foo', DummyDBAPI2Module)
+    other = sql_statement('SELECT "a" FROM foo', OtherDBAPI2Module)
+
+    assert statement is not other
+    assert statement.obfuscated != other.obfuscated
+
+
+@override_generic_settings(global_settings(), {"agent_limits.sql_statement_cache_size": 2})
+def test_sql_statement_cache_bounded():
+    previous = sql_statement_cache_stats()
+
+    for i in range(5):
+        sql_statement("SELECT * FROM foo%d" % i, DummyDBAPI2Module)
+
+    assert len(_sql_statements) == 2
+    assert stats_since(previous) == (0, 5, 3)
+
+    sql_statement("SELECT * FROM foo4", DummyDBAPI2Module)
+    assert stats_since(previous) == (1, 5, 3)
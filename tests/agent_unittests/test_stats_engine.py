@@ -0,0 +1,80 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import pytest
+
+from newrelic.core.config import finalize_application_settings
+from newrelic.core.metric import TimeMetric
+from newrelic.core.stats_engine import StatsEngine
+
+
+@pytest.fixture
+def stats_engine():
+    stats = StatsEngine()
+    stats.reset_stats(finalize_application_settings({"agent_run_id": "1234567"}))
+    return stats
+
+
+def test_metric_data_without_normalizer(stats_engine):
+    stats_engine.record_custom_metric("Custom/a", 1)
+    stats_engine.record_custom_metric("Custom/b", 2)
+
+    metric_data = dict((key["name"], stats) for key, stats in stats_engine.metric_data())
+
+    assert metric_data["Custom/a"].call_count == 1
+    assert metric_data["Custom/b"].total_call_time == 2
+
+
+def test_metric_data_normalizer_collapses_metrics(stats_engine):
+    for name, value in (("Custom/a", 1), ("Custom/b", 2), ("Custom/c", 4), ("Other", 8)):
+        stats_engine.record_custom_metric(name, value)
+
+    normalized_names = []
+
+    def normalizer(name):
+        normalized_names.append(name)
+        return (name.startswith("Custom/") and "Custom/*" or name), False
+
+    metric_data = dict((key["name"], stats) for key, stats in stats_engine.metric_data(normalizer))
+
+    assert sorted(metric_data) == ["Custom/*", "Other"]
+    assert metric_data["Custom/*"].call_count == 3
+    assert metric_data["Custom/*"].total_call_time == 7
+    assert metric_data["Other"].total_call_time == 8
+
+    # Each unique name is only normalized once.
+    assert sorted(normalized_names) == ["Custom/a", "Custom/b", "Custom/c", "Other"]
+
+    # Metrics which collapsed together must not modify the stats table.
+    assert stats_engine.stats_table[("Custom/a", "")].call_count == 1
+    assert stats_engine.stats_table[("Custom/b", "")].call_count == 1
+    assert stats_engine.stats_table[("Custom/c", "")].call_count == 1
+
+
+def test_metric_data_normalizer_caches_names_across_scopes(stats_engine):
+    for scope in ("", "WebTransaction/a", "WebTransaction/b"):
+        stats_engine.record_time_metric(TimeMetric(name="Function/a", scope=scope, duration=1.0, exclusive=1.0))
+
+    normalized_names = []
+
+    def normalizer(name):
+        normalized_names.append(name)
+        return "Function/renamed", False
+
+    metric_data = stats_engine.metric_data(normalizer)
+
+    assert normalized_names == ["Function/a"]
+    assert sorted(key["scope"] for key, _ in metric_data) == ["", "WebTransaction/a", "WebTransaction/b"]
+    assert set(key["name"] for key, _ in metric_data) == set(["Function/renamed"])
@@ -16,7 +16,14 @@ import threading
 
 import pytest
 
-from newrelic.core.trace_cache import TraceCache
+import newrelic.core.trace_cache as trace_cache_module
+from newrelic.core.trace_cache import (
+    ContextVarTraceCache,
+    TraceCache,
+    TraceCacheActiveTraceError,
+    TraceCacheNoActiveTraceError,
+    contextvars,
+)
 
 _TEST_CONCURRENT_ITERATION_TC_SIZE = 20
 
@@ -25,6 +32,50 @@ class DummyTrace(object):
     pass
 
 
+class DummyLoop(object):
+    pass
+
+
+class DummyTask(object):
+    def __init__(self, loop):
+        self._loop = loop
+
+    def get_loop(self):
+        return self._loop
+
+
+class DummyGreenlet(object):
+    def __init__(self, parent=None):
+        self.parent = parent
+
+
+class DummyGreenletModule(object):
+    def __init__(self):
+        self.current = DummyGreenlet(parent=DummyGreenlet())
+
+    def getcurrent(self):
+        return self.current
+
+
+class DummyPatchedThreadModule(object):
+    # Stands in for the thread module once patched by gevent, where the
+    # ID of the current greenlet is returned as the thread ID.
+
+    def __init__(self, greenlet):
+        self.greenlet = greenlet
+
+    def get_ident(self):
+        return id(self.greenlet.getcurrent())
+
+
+class NestedTrace(object):
+    def __init__(self, cache, parent=None):
+        self.thread_id = cache.current_thread_id()
+        self.parent = parent
+        self.root = parent.root if parent else self
+        self.exited = False
+
+
 @pytest.fixture(scope="function")
 def trace_cache():
     return TraceCache()
@@ -127,3 +178,145 @@ def test_concurrent_iteration(iterate_trace_cache, change_weakref_dict_size):
     t2.join(timeout=1)
     assert not t1.is_alive(), "Thread failed to exit."
     assert not t2.is_alive(), "Thread failed to exit."
+
+
+skip_if_no_contextvars = pytest.mark.skipif(contextvars is None, reason="contextvars not supported")
+
+
+@skip_if_no_contextvars
+def test_context_var_trace_cache_nesting():
+    cache = ContextVarTraceCache()
+    assert cache.current_trace() is None
+
+    root = NestedTrace(cache)
+    cache.save_trace(root)
+    child = NestedTrace(cache, root)
+    cache.save_trace(child)
+
+    assert cache.current_trace() is child
+    assert cache.get(child.thread_id) is child
+
+    cache.pop_current(child)
+    assert cache.current_trace() is root
+    assert cache.get(root.thread_id) is root
+
+    cache.complete_root(root)
+    assert cache.current_trace() is None
+    assert root.thread_id not in cache
+
+    with pytest.raises(TraceCacheNoActiveTraceError):
+        cache.complete_root(root)
+
+
+@skip_if_no_contextvars
+def test_context_var_trace_cache_active_root():
+    cache = ContextVarTraceCache()
+
+    root = NestedTrace(cache)
+    cache.save_trace(root)
+
+    with pytest.raises(TraceCacheActiveTraceError):
+        cache.save_trace(NestedTrace(cache))
+
+    assert cache.current_trace() is root
+
+
+@skip_if_no_contextvars
+def test_context_var_trace_cache_threads():
+    cache = ContextVarTraceCache()
+
+    root = NestedTrace(cache)
+    cache.save_trace(root)
+
+    result = {}
+
+    def _thread():
+        result["before"] = cache.current_trace()
+
+        # Setting a trace by ID for the current thread, as is done when
+        # propagating context, makes it the current trace.
+        thread_id = cache.current_thread_id()
+        cache[thread_id] = root
+        result["during"] = cache.current_trace()
+        del cache[thread_id]
+        result["after"] = cache.current_trace()
+
+    thread = threading.Thread(target=_thread)
+    thread.start()
+    thread.join()
+
+    assert result == {"before": None, "during": root, "after": None}
+    assert cache.current_trace() is root
+
+
+@pytest.mark.parametrize("cache_type", (TraceCache, ContextVarTraceCache))
+def test_event_loop_traces(cache_type):
+    if cache_type is ContextVarTraceCache and contextvars is None:
+        pytest.skip("contextvars not supported")
+
+    cache = cache_type()
+    loops = [DummyLoop(), DummyLoop()]
+
+    def save(key, trace):
+        cache[key] = trace
+        cache._index_trace(key, trace)
+
+    traces = []
+    for i in range(4):
+        trace = DummyTrace()
+        trace._task = DummyTask(loops[i % 2])
+        traces.append(trace)
+        save(i, trace)
+
+    # Traces outside of tasks are never indexed.
+    outside = DummyTrace()
+    save(4, outside)
+
+    # The same trace can be saved under several keys, such as when a
+    # task is started from within it.
+    save(5, traces[0])
+
+    assert cache._event_loop_traces(loops[0]) == [traces[0], traces[2]]
+    assert cache._event_loop_traces(loops[1]) == [traces[1], traces[3]]
+    assert cache._event_loop_traces(None) == []
+
+    # Traces replaced or removed from the cache are no longer returned.
+    cache[2] = traces[1]
+    del cache[3]
+    cache.pop(5)
+    assert cache._event_loop_traces(loops[0]) == [traces[0]]
+    assert cache._event_loop_traces(loops[1]) == [traces[1]]
+
+    # Nor are traces whose task has completed.
+    traces[0]._task = None
+    assert cache._event_loop_traces(loops[0]) == []
+
+    # Event loops without any remaining traces are dropped when a trace
+    # is indexed for a new event loop.
+    del traces[:]
+    loop = DummyLoop()
+    trace = DummyTrace()
+    trace._task = DummyTask(loop)
+    save(0, trace)
+
+    assert list(cache._loop_traces) == [id(loop)]
+    assert cache._event_loop_traces(loop) == [trace]
+
+
+@pytest.mark.parametrize("cache_type", (TraceCache, ContextVarTraceCache))
+def test_save_trace_in_patched_greenlet(cache_type, monkeypatch):
+    if cache_type is ContextVarTraceCache and contextvars is None:
+        pytest.skip("contextvars not supported")
+
+    greenlet = DummyGreenletModule()
+    monkeypatch.setattr(trace_cache_module, "thread", DummyPatchedThreadModule(greenlet))
+
+    cache = cache_type()
+    cache.greenlet = greenlet
+
+    trace = NestedTrace(cache)
+    assert trace.thread_id == id(greenlet.current)
+
+    cache.save_trace(trace)
+
+    assert trace._greenlet() is greenlet.current
@@ -0,0 +1,165 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import base64
+import zlib
+
+import pytest
+from testing_support.trace_nodes import function_node
+
+from newrelic.common.encoding_utils import json_encode, json_encode_compressed
+from newrelic.core.config import finalize_application_settings
+from newrelic.core.external_node import ExternalNode
+from newrelic.core.root_node import RootNode
+from newrelic.core.stats_engine import _expand_trace_data
+from newrelic.core.transaction_node import TransactionNode
+
+settings = finalize_application_settings({})
+
+
+def external_node(exclusive, children=()):
+    return ExternalNode(
+        library="library",
+        url="http://example.com",
+        method="GET",
+        children=children,
+        start_time=0.0,
+        end_time=exclusive,
+        duration=exclusive,
+        exclusive=exclusive,
+        params={},
+        guid="external",
+        agent_attributes={},
+        user_attributes={},
+    )
+
+
+def transaction_node(children):
+    root = RootNode(
+        name="Function/main",
+        children=children,
+        start_time=0.0,
+        end_time=10.0,
+        exclusive=0.0,
+        duration=10.0,
+        guid="root",
+        agent_attributes={},
+        user_attributes={},
+        path="OtherTransaction/Function/main",
+        trusted_parent_span=None,
+        tracing_vendors=None,
+    )
+
+    fields = dict.fromkeys(TransactionNode._fields)
+    fields.update(
+        settings=settings,
+        root=root,
+        start_time=0.0,
+        end_time=10.0,
+        duration=10.0,
+        trace_intrinsics={},
+        agent_attributes=[],
+        user_attributes=[],
+    )
+
+    return TransactionNode(**fields)
+
+
+def trace_names(node, string_table=None):
+    # Names in the transaction trace may be references into the string
+    # table of the transaction, in the form of a backtick and an index.
+
+    name = node.name
+    if string_table and name.startswith("`"):
+        name = string_table[int(name[1:])]
+
+    names = [name]
+    for child in node.children:
+        names.extend(trace_names(child, string_table))
+    return names
+
+
+def transaction_trace_names(transaction, limit):
+    trace = transaction.transaction_trace(None, limit, None)
+    return trace_names(trace.root, list(transaction.string_table.values()))
+
+
+@pytest.fixture
+def transaction():
+    # The nodes with the greatest exclusive time are c, f and e, with c
+    # only reachable through b.
+    return transaction_node(
+        (
+            function_node("a", exclusive=1.0),
+            function_node(
+                "b",
+                children=(function_node("c", exclusive=5.0), function_node("d", exclusive=0.1)),
+                exclusive=0.5,
+            ),
+            function_node("e", children=(function_node("f", exclusive=3.0),), exclusive=2.0),
+        )
+    )
+
+
+def test_transaction_trace_within_limit(transaction):
+    assert transaction.trace_node_selection(6) is None
+
+    assert transaction_trace_names(transaction, 6) == [
+        "ROOT",
+        "OtherTransaction/Function/main",
+        "Function/a",
+        "Function/b",
+        "Function/c",
+        "Function/d",
+        "Function/e",
+        "Function/f",
+    ]
+
+
+@pytest.mark.parametrize(
+    "limit,expected",
+    (
+        (5, ["Function/a", "Function/b", "Function/c", "Function/e", "Function/f"]),
+        (4, ["Function/b", "Function/c", "Function/e", "Function/f"]),
+        (3, ["Function/b", "Function/c", "Function/e"]),
+        (1, ["Function/e"]),
+    ),
+)
+def test_transaction_trace_selects_by_exclusive_time(transaction, limit, expected):
+    # Selected nodes are kept in their original order in the tree.
+    assert transaction_trace_names(transaction, limit) == ["ROOT", "OtherTransaction/Function/main"] + expected
+
+
+def test_transaction_trace_leaf_children_not_selected():
+    # Children of nodes which are always leaves in a transaction trace
+    # must not take up any of the limit.
+    transaction = transaction_node(
+        (
+            external_node(1.0, children=(function_node("hidden", exclusive=9.0),)),
+            function_node("a", exclusive=0.5),
+            function_node("b", exclusive=0.2),
+        )
+    )
+
+    assert sorted(transaction_trace_names(transaction, 2)[2:]) == ["External/example.com/library/GET", "Function/a"]
+
+
+def test_transaction_trace_encoding(transaction):
+    trace = transaction.transaction_trace(None, 6, None)
+    data = [trace, list(transaction.string_table.values())]
+
+    expected = base64.standard_b64encode(zlib.compress(json_encode(data).encode("latin-1"), 6)).decode("latin-1")
+
+    assert json_encode_compressed(data, 6, expand=_expand_trace_data) == expected
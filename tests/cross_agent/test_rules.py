@@ -60,6 +60,9 @@ def test_rules_engine(test_group):
 
         result, ignored = rules_engine.normalize(input_str)
 
+        # A repeated call is served from the cache and must agree.
+        assert rules_engine.normalize(input_str) == (result, ignored)
+
         # When a transaction is to be ignored, the test fixture expects that
         # "expected" is None.
         if ignored:
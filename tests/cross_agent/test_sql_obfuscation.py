@@ -16,6 +16,7 @@ import json
 import os
 import pytest
 
+from newrelic.core.config import global_settings
 from newrelic.core.database_utils import SQLStatement
 
 
@@ -58,8 +59,14 @@ class DummyDB(object):
         self.quoting_style = quoting_style
 
 
+@pytest.fixture(params=['regex', 'fused'])
+def sql_lexer(request, monkeypatch):
+    monkeypatch.setattr(global_settings().debug, 'sql_lexer', request.param)
+    return request.param
+
+
 @pytest.mark.parametrize(_parameters, load_tests())
-def test_sql_obfuscation(obfuscated, dialects, sql, pathological):
+def test_sql_obfuscation(sql_lexer, obfuscated, dialects, sql, pathological):
 
     if pathological:
         pytest.skip()
@@ -22,6 +22,7 @@ from testing_support.validators.validate_log_event_count_outside_transaction imp
 
 from newrelic.api.application import application_settings
 from newrelic.api.background_task import background_task
+from newrelic.api.function_trace import FunctionTrace
 from newrelic.api.time_trace import current_trace
 from newrelic.api.transaction import current_transaction
 
@@ -82,3 +83,29 @@ def test_local_log_decoration_outside_transaction(logger):
         assert logger.caplog.records[0] == get_metadata_string("C", False)
 
     test()
+
+
+@reset_core_stats_engine()
+def test_local_log_decoration_linking_string_per_span(logger):
+    @background_task()
+    def test():
+        exercise_logging(logger)
+        logger.warning("D")
+
+        with FunctionTrace("span"):
+            guid = current_trace().guid
+            logger.warning("E")
+            current_trace().guid = "ijklmnop"
+            logger.warning("F")
+
+        current_transaction()._trace_id = "ijklmnop12345678"
+        logger.warning("G")
+
+        records = logger.caplog.records
+        assert records[0] == get_metadata_string("C", True)
+        assert records[1] == get_metadata_string("D", True)
+        assert "|abcdefgh12345678|%s|" % guid in records[2]
+        assert "|abcdefgh12345678|ijklmnop|" in records[3]
+        assert "|ijklmnop12345678|abcdefgh|" in records[4]
+
+    test()
@@ -17,7 +17,11 @@ import logging
 from newrelic.api.background_task import background_task
 from newrelic.api.time_trace import current_trace
 from newrelic.api.transaction import current_transaction
-from testing_support.fixtures import reset_core_stats_engine
+from testing_support.fixtures import (
+    core_application_record_buffered_log_events,
+    core_application_stats_engine,
+    reset_core_stats_engine,
+)
 from testing_support.validators.validate_log_event_count import validate_log_event_count
 from testing_support.validators.validate_log_event_count_outside_transaction import validate_log_event_count_outside_transaction
 from testing_support.validators.validate_log_events import validate_log_events
@@ -88,6 +92,17 @@ def test_logging_outside_transaction(logger):
     test()
 
 
+@reset_core_stats_engine()
+def test_logging_outside_transaction_buffered(logger):
+    stats = core_application_stats_engine()
+
+    exercise_logging(logger)
+    assert stats.log_events.num_seen == 0
+
+    core_application_record_buffered_log_events()
+    assert stats.log_events.num_seen == 3
+
+
 @reset_core_stats_engine()
 def test_logging_newrelic_logs_not_forwarded(logger):
     @validate_log_event_count(0)
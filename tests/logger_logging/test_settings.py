@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import logging
+
 import pytest
 
 from newrelic.packages import six
@@ -93,3 +95,27 @@ def test_log_metrics_settings(logger, feature_setting, subfeature_setting, expec
         assert len(logger.caplog.records) == 1
 
     test()
+
+
+_log_level_matrix = [
+    (logging.NOTSET, 2),
+    (logging.WARNING, 2),
+    (logging.ERROR, 1),
+    (logging.CRITICAL, 0),
+]
+
+
+@pytest.mark.parametrize("log_level,expected", _log_level_matrix)
+@reset_core_stats_engine()
+def test_log_forwarding_log_level(logger, log_level, expected):
+    @override_application_settings({
+        "application_logging.forwarding.log_level": log_level,
+    })
+    @validate_log_event_count(expected)
+    @background_task()
+    def test():
+        logger.warning("C")
+        logger.error("D")
+        assert len(logger.caplog.records) == 2
+
+    test()
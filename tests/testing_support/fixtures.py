@@ -1503,7 +1503,8 @@ def override_expected_status_codes(status_codes):
 
 
 def reset_core_stats_engine():
-    """Reset the StatsEngine and custom StatsEngine of the core application."""
+    """Reset the StatsEngine and custom StatsEngine of the core application,
+    discarding any buffered log events."""
 
     @function_wrapper
     def _reset_core_stats_engine(wrapped, instance, args, kwargs):
@@ -1517,6 +1518,8 @@ def reset_core_stats_engine():
         custom_stats = core_application._stats_custom_engine
         custom_stats.reset_stats(custom_stats.settings)
 
+        core_application._log_event_buffer.clear()
+
         return wrapped(*args, **kwargs)
 
     return _reset_core_stats_engine
@@ -1537,6 +1540,19 @@ def core_application_stats_engine(app_name=None):
     return core_application._stats_engine
 
 
+def core_application_record_buffered_log_events(app_name=None):
+    """Add the log events buffered by the core application outside of a
+    transaction to its StatsEngine, as would otherwise only be done when
+    enough have been buffered or at the next harvest.
+
+    """
+
+    api_application = application_instance(app_name)
+    api_name = api_application.name
+    core_application = api_application._agent.application(api_name)
+    core_application._record_buffered_log_events()
+
+
 def core_application_stats_engine_error(error_type, app_name=None):
     """Return a single error with the type of error_type, or None.
 
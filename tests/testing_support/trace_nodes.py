@@ -0,0 +1,40 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from newrelic.core.function_node import FunctionNode
+
+
+def function_node(name, children=(), exclusive=1.0, agent_attributes=None, user_attributes=None):
+    """Returns a function node for building trees of nodes in tests. The
+    name is also used as the guid, and the duration is the exclusive time
+    plus the durations of the children.
+
+    """
+
+    duration = exclusive + sum(child.duration for child in children)
+    return FunctionNode(
+        group="Function",
+        name=name,
+        children=children,
+        start_time=0.0,
+        end_time=duration,
+        duration=duration,
+        exclusive=exclusive,
+        label=None,
+        params=None,
+        rollup=None,
+        guid=name,
+        agent_attributes=agent_attributes or {},
+        user_attributes=user_attributes or {},
+    )
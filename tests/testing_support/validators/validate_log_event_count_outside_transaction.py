@@ -16,7 +16,8 @@ import copy
 
 from newrelic.common.object_wrapper import (transient_function_wrapper,
         function_wrapper)
-from testing_support.fixtures import catch_background_exceptions
+from testing_support.fixtures import (catch_background_exceptions,
+        core_application_record_buffered_log_events)
 
 def validate_log_event_count_outside_transaction(count=1):
     @function_wrapper
@@ -39,7 +40,13 @@ def validate_log_event_count_outside_transaction(count=1):
 
             return result
 
-        _new_wrapper = _validate_log_event_count_outside_transaction(wrapped)
+        def _record_buffered_log_events(*args, **kwargs):
+            try:
+                return wrapped(*args, **kwargs)
+            finally:
+                core_application_record_buffered_log_events()
+
+        _new_wrapper = _validate_log_event_count_outside_transaction(_record_buffered_log_events)
         val = _new_wrapper(*args, **kwargs)
         if count:
             assert record_called
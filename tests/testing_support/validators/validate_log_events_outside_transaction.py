@@ -18,7 +18,8 @@ from newrelic.packages import six
 
 from newrelic.common.object_wrapper import (transient_function_wrapper,
         function_wrapper)
-from testing_support.fixtures import catch_background_exceptions
+from testing_support.fixtures import (catch_background_exceptions,
+        core_application_record_buffered_log_events)
 
 def validate_log_events_outside_transaction(events):
     @function_wrapper
@@ -42,7 +43,13 @@ def validate_log_events_outside_transaction(events):
             return result
 
 
-        _new_wrapper = _validate_log_events_outside_transaction(wrapped)
+        def _record_buffered_log_events(*args, **kwargs):
+            try:
+                return wrapped(*args, **kwargs)
+            finally:
+                core_application_record_buffered_log_events()
+
+        _new_wrapper = _validate_log_events_outside_transaction(_record_buffered_log_events)
         val = _new_wrapper(*args, **kwargs)
         assert record_called
         logs = copy.copy(recorded_logs)